@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark element filtering: legacy per-row list filters vs. uint64 bitmask columns.
+
+Usage:
+    # Benchmark on a real index (e.g. COD)
+    python benchmark_element_filter.py --index indexes/cod_index_filled.parquet
+
+    # Benchmark on a synthetic index when no real index is available
+    python benchmark_element_filter.py --synthetic 500000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    from database_interface import ELEMENT_SYMBOLS, StructureDatabaseIndex, add_element_masks
+except ImportError:
+    from scripts.database_interface import ELEMENT_SYMBOLS, StructureDatabaseIndex, add_element_masks
+
+
+QUERIES = [
+    {'required': ['Fe', 'O']},
+    {'required': ['O'], 'optional': ['Zn', 'Ge'], 'exclude': ['Pb']},
+    {'allowed': ['Ge', 'Zn', 'O']},
+    {'allowed': ['Li', 'Fe', 'P', 'O'], 'exclude': ['Fe']},
+]
+
+
+def legacy_filter(
+    df: pd.DataFrame,
+    required: list[str] | None = None,
+    optional: list[str] | None = None,
+    exclude: list[str] | None = None,
+    allowed: list[str] | None = None
+) -> pd.DataFrame:
+    """Reference implementation of the original list-based filter_by_elements."""
+    df = df.copy()
+    df['elements'] = df['elements'].apply(
+        lambda x: list(x) if isinstance(x, (list, np.ndarray)) else (
+            json.loads(x) if isinstance(x, str) and x.startswith('[') else []
+        )
+    )
+    if allowed:
+        allowed_set = set(allowed)
+        df = df[df['elements'].apply(lambda x: set(x).issubset(allowed_set) if len(x) > 0 else False)]
+    else:
+        if required:
+            df = df[df['elements'].apply(lambda x: all(e in x for e in required))]
+        if optional:
+            df = df[df['elements'].apply(lambda x: any(e in x for e in optional))]
+    if exclude:
+        df = df[df['elements'].apply(lambda x: not any(e in x for e in exclude))]
+    return df
+
+
+def make_synthetic_index(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """Build a random index with COD-like element counts (1-6 elements, biased to light elements)."""
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / np.arange(1, 95)
+    weights /= weights.sum()
+    symbols = np.array(ELEMENT_SYMBOLS[:94])
+    counts = rng.integers(1, 7, size=n_rows)
+    elements = [sorted(set(rng.choice(symbols, size=k, p=weights))) for k in counts]
+    return pd.DataFrame({
+        'source': 'SYNTHETIC',
+        'formula': [''.join(e) for e in elements],
+        'elements': elements,
+    })
+
+
+def _time(fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--index', type=Path, help='Index file to benchmark (parquet/sqlite/json.gz)')
+    group.add_argument('--synthetic', type=int, help='Number of rows for a synthetic index')
+    parser.add_argument('--repeat', type=int, default=3, help='Repetitions per query (best time reported)')
+    args = parser.parse_args()
+
+    index_path = args.index
+    if args.synthetic:
+        index_path = Path(tempfile.mkdtemp()) / 'synthetic_index.parquet'
+        add_element_masks(make_synthetic_index(args.synthetic)).to_parquet(index_path, index=False)
+
+    start = time.perf_counter()
+    db = StructureDatabaseIndex(index_path)
+    print(f"Loaded {len(db.df):,} rows in {time.perf_counter() - start:.2f}s")
+
+    print(f"\n{'query':<70} {'rows':>8} {'legacy (s)':>11} {'bitmask (s)':>12} {'speedup':>8}")
+    for query in QUERIES:
+        expected = legacy_filter(db.df, **query)
+        actual = db.filter_by_elements(**query)
+        if not expected.index.equals(actual.index):
+            raise AssertionError(f"Bitmask filter disagrees with legacy filter for {query}")
+
+        t_legacy = _time(lambda: legacy_filter(db.df, **query), args.repeat)
+        t_mask = _time(lambda: db.filter_by_elements(**query), args.repeat)
+        print(f"{str(query):<70} {len(actual):>8,} {t_legacy:>11.4f} {t_mask:>12.4f} {t_legacy / t_mask:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Benchmark the BGMN output parsers: legacy per-field regex scans vs. the single-pass parsers.
+
+Every .lst/.par file found is parsed by both implementations, the results are checked
+for equality, and the parse throughput of each is reported.
+
+Usage:
+    # The refinement outputs in tests/test_data/refinement
+    python benchmark_result_parsing.py
+
+    # A corpus of BGMN outputs (searched recursively; phase names are read from the .sav files)
+    python benchmark_result_parsing.py path/to/refinements --repeat 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import re
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from dara.eflech_worker import EflechWorker
+from dara.result import LstResult, parse_lst, parse_par
+from dara.utils import angular_correction, get_wavelength, intensity_correction
+
+TEST_DATA_DIR = Path(__file__).resolve().parents[1] / 'tests' / 'test_data' / 'refinement'
+RTOL = 1e-12
+
+
+def legacy_parse_lst(lst_path: Path, phase_names: list[str]) -> LstResult:
+    """Reference implementation of the original regex-per-field parse_lst."""
+
+    def parse_values(v_: str) -> float | tuple[float, float] | None | str | int:
+        try:
+            v_ = v_.strip('%')
+            if v_ == 'ERROR' or v_ == 'UNDEF':
+                return None
+            if '+-' in v_:
+                v_ = (float(v_.split('+-')[0]), float(v_.split('+-')[1]))
+            else:
+                v_ = float(v_)
+                if v_.is_integer():
+                    v_ = int(v_)
+        except ValueError:
+            pass
+        return v_
+
+    def parse_section(text: str) -> dict:
+        section = dict(re.findall(r'^(\w+)=(.+?)$', text, re.MULTILINE))
+        return {k: parse_values(v) for k, v in section.items()}
+
+    texts = lst_path.read_text()
+    pattern_name = re.search(r'Rietveld refinement to file\(s\) (.+?)\n', texts).group(1)
+    result = {'raw_lst': texts, 'pattern_name': pattern_name}
+    result['num_steps'] = int(re.search(r'(\d+) iteration steps', texts).group(1))
+    for var in ['Rp', 'Rpb', 'R', 'Rwp', 'Rexp']:
+        result[var] = float(re.search(rf'{var}=(\d+(\.\d+)?)%', texts).group(1))
+    result['d'] = float(d.group(1)) if (d := re.search(r'Durbin-Watson d=(\d+(\.\d+)?)', texts)) else None
+    result['1-rho'] = float(rho.group(1)) if (rho := re.search(r'1-rho=(\d+(\.\d+)?)%', texts)) else None
+
+    global_parameters_text = re.search(r'Global parameters and GOALs\n(.*?)\n(?:\n|\Z)', texts, re.DOTALL)
+    if global_parameters_text:
+        result.update(parse_section(global_parameters_text.group(1)))
+
+    phases_results = re.findall(
+        r'Local parameters and GOALs for phase .+?\n(.*?)\n(?:\n|\Z)', texts, re.DOTALL
+    )
+    result['phases_results'] = {
+        phase_name: parse_section(phase_result) for phase_name, phase_result in zip(phase_names, phases_results)
+    }
+    for phase_name, phase_result in zip(phase_names, phases_results):
+        atom_section = re.search(r'Atomic positions for phase .+?\n(-+)\n(.*?)$', phase_result, re.DOTALL).group(2)
+        result['phases_results'][phase_name]['atom_positions_string'] = atom_section
+    return LstResult(**result)
+
+
+def legacy_parse_par(par_file: Path, phase_names: list[str]) -> pd.DataFrame:
+    """Reference implementation of the original line-by-line regex parse_par."""
+    columns = {
+        '2theta': float, 'intensity': float, 'b1': float, 'b2': float,
+        'h': int, 'k': int, 'l': int, 'phase': str, 'phase_idx': int,
+    }
+
+    def _make_dataframe(peak_list) -> pd.DataFrame:
+        return pd.DataFrame(peak_list, columns=list(columns)).astype(columns)
+
+    content = par_file.read_text().split('\n')
+    peak_list = []
+    if len(content) < 2:
+        return _make_dataframe(peak_list)
+    peak_num = re.search(r'PEAKZAHL=(\d+)', content[0])
+    if not peak_num:
+        return _make_dataframe(peak_list)
+
+    eps1 = re.search(r'EPS1=(\d+(\.\d+)?)', content[0])
+    eps2 = re.search(r'EPS2=([+-]?\d+(\.\d+)?)', content[0])
+    pol = re.search(r'POL=(\d+(\.\d+)?)', content[0])
+    wavelength = re.search(r'LAMBDA=(\S+)', content[0]) or re.search(r'SYNCHROTRON=(\S+)', content[0])
+    eps1 = float(eps1.group(1)) if eps1 else 0.0
+    eps2 = float(eps2.group(1)) if eps2 else 0.0
+    pol = float(pol.group(1)) if pol else 1.0
+    wavelength = get_wavelength(wavelength.group(1))
+    peak_num = int(peak_num.group(1))
+
+    peak_phase_names = list(dict.fromkeys(re.findall(r'PHASE=(\w+)', '\n'.join(content))))
+    phase_names_mapping = {
+        peak_phase_name: (phase_name, i)
+        for i, (peak_phase_name, phase_name) in enumerate(zip(peak_phase_names, phase_names))
+    }
+
+    for i in range(1, peak_num + 1):
+        if i >= len(content):
+            break
+        numbers = re.split(r'\s+', content[i])
+        rp = int(numbers[0])
+        d_inv = float(numbers[2])
+        gsum = re.search(r'GSUM=(\d+(\.\d+)?)', content[i])
+        gsum = float(gsum.group(1)) if gsum is not None else 1.0
+        intensity = intensity_correction(
+            intensity=float(numbers[1]), d_inv=d_inv, gsum=gsum, wavelength=wavelength, pol=pol
+        )
+        b1 = float(numbers[3]) if rp in (3, 4) else 0
+        b2 = float(numbers[4]) ** 2 if rp == 4 else 0
+        phase, idx = phase_names_mapping[re.search(r'PHASE=(\w+)', content[i]).group(1)]
+        if intensity > 0:
+            peak_list.append([d_inv, intensity, b1, b2, int(numbers[-3]), int(numbers[-2]), int(numbers[-1]), phase, idx])
+
+    two_theta = np.arcsin(wavelength * np.array([p[0] for p in peak_list]) / 2) * 180 / np.pi * 2
+    two_theta += angular_correction(two_theta, eps1, eps2)
+    return _make_dataframe([[two_theta[i]] + peak_list[i][1:] for i in range(len(peak_list))])
+
+
+def legacy_parse_par_file(par_file: Path, wavelength: float) -> list[list[float]]:
+    """Reference implementation of the original EflechWorker.parse_par_file."""
+    content = par_file.read_text().split('\n')
+    peak_list = []
+    if len(content) < 2:
+        return peak_list
+    peak_num = re.search(r'PEAKZAHL=(\d+)', content[0])
+    pol = re.search(r'POL=(\d+(\.\d+)?)', content[0])
+    pol = float(pol.group(1)) if pol else 1.0
+    if not peak_num:
+        return peak_list
+    for i in range(1, int(peak_num.group(1)) + 1):
+        if i >= len(content):
+            break
+        numbers = re.split(r'\s+', content[i])
+        rp = int(numbers[0])
+        d_inv = float(numbers[2])
+        gsum = re.search('GSUM=(\\d+(\\.\\d+)?)', content[i])
+        gsum = float(gsum.group(1)) if gsum is not None else 1.0
+        intensity = intensity_correction(
+            intensity=float(numbers[1]), d_inv=d_inv, gsum=gsum, wavelength=wavelength, pol=pol
+        )
+        b1 = float(numbers[3]) if rp in (3, 4) else 0
+        b2 = float(numbers[4]) ** 2 if rp == 4 else 0
+        if intensity > 0:
+            peak_list.append([d_inv, intensity, b1, b2])
+    return peak_list
+
+
+def get_phase_names(output_path: Path) -> list[str]:
+    """Read the phase names from the control file next to a .lst/.par file."""
+    sav_path = output_path.with_suffix('.sav')
+    if sav_path.exists():
+        return re.findall(r'STRUC\[\d+]=(.+?)\.str', sav_path.read_text())
+    # no control file: use the phase names of the file itself
+    text = output_path.read_text()
+    return list(dict.fromkeys(
+        re.findall(r'Local parameters and GOALs for phase (\S+)', text) + re.findall(r'PHASE=(\w+)', text)
+    ))
+
+
+def _time(fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def validate(lst_paths: list[Path], par_paths: list[Path]) -> tuple[list[Path], list[Path]]:
+    """Check the single-pass parsers agree with the legacy ones on every file.
+
+    Files the legacy parsers cannot read (e.g. the truncated output of a failed refinement)
+    are skipped. The peak intensities are corrected in one vectorized step, so they may differ
+    from the per-peak scalar arithmetic in the last bit; they are compared with rtol=RTOL.
+
+    Returns:
+        the .lst and .par files that were validated
+    """
+    wavelength = get_wavelength('Cu')
+    valid_lst, valid_par = [], []
+    for path in lst_paths:
+        phase_names = get_phase_names(path)
+        try:
+            expected = legacy_parse_lst(path, phase_names).model_dump()
+        except Exception as e:
+            print(f"Skipping {path}: the legacy parser fails ({e!r})")
+            continue
+        if parse_lst(path, phase_names).model_dump() != expected:
+            raise AssertionError(f'parse_lst disagrees with the legacy parser for {path}')
+        valid_lst.append(path)
+
+    for path in par_paths:
+        phase_names = get_phase_names(path) if 'PHASE=' in path.read_text() else None
+        try:
+            expected_peaks = legacy_parse_par_file(path, wavelength)
+            expected = legacy_parse_par(path, phase_names) if phase_names is not None else None
+        except Exception as e:
+            print(f"Skipping {path}: the legacy parser fails ({e!r})")
+            continue
+        np.testing.assert_allclose(
+            np.reshape(EflechWorker.parse_par_file(path, wavelength), (-1, 4)),
+            np.reshape(expected_peaks, (-1, 4)),
+            rtol=RTOL,
+        )
+        if expected is not None:
+            pd.testing.assert_frame_equal(parse_par(path, phase_names), expected, check_exact=False, rtol=RTOL)
+        valid_par.append(path)
+    return valid_lst, valid_par
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('corpus', nargs='*', type=Path, help=f'Folders with BGMN outputs (default: {TEST_DATA_DIR})')
+    parser.add_argument('--repeat', type=int, default=10, help='Repetitions per parser (best time reported)')
+    args = parser.parse_args()
+
+    folders = args.corpus or [TEST_DATA_DIR]
+    lst_paths = sorted(p for folder in folders for p in folder.rglob('*.lst'))
+    par_paths = sorted(p for folder in folders for p in folder.rglob('*.par'))
+    if not lst_paths and not par_paths:
+        parser.error('No .lst or .par files found')
+
+    lst_paths, par_paths = validate(lst_paths, par_paths)
+    print(f"Validated {len(lst_paths)} .lst and {len(par_paths)} .par files against the legacy parsers")
+
+    lst_names = {p: get_phase_names(p) for p in lst_paths}
+    par_names = {p: get_phase_names(p) for p in par_paths if 'PHASE=' in p.read_text()}
+    wavelength = get_wavelength('Cu')
+    benchmarks = [
+        ('parse_lst', lst_paths, lambda: [legacy_parse_lst(p, n) for p, n in lst_names.items()],
+         lambda: [parse_lst(p, n) for p, n in lst_names.items()]),
+        ('parse_par', list(par_names), lambda: [legacy_parse_par(p, n) for p, n in par_names.items()],
+         lambda: [parse_par(p, n) for p, n in par_names.items()]),
+        ('parse_par_file', par_paths, lambda: [legacy_parse_par_file(p, wavelength) for p in par_paths],
+         lambda: [EflechWorker.parse_par_file(p, wavelength) for p in par_paths]),
+    ]
+
+    print(f"\n{'parser':<16} {'files':>6} {'MB':>7} {'legacy (MB/s)':>14} {'single-pass (MB/s)':>19} {'speedup':>8}")
+    for name, paths, legacy, single_pass in benchmarks:
+        if not paths:
+            continue
+        size = sum(p.stat().st_size for p in paths) / 1e6
+        t_legacy = _time(legacy, args.repeat)
+        t_single_pass = _time(single_pass, args.repeat)
+        print(
+            f"{name:<16} {len(paths):>6} {size:>7.2f} {size / t_legacy:>14.1f} "
+            f"{size / t_single_pass:>19.1f} {t_legacy / t_single_pass:>7.1f}x"
+        )
+
+
+if __name__ == '__main__':
+    main()
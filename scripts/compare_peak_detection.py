@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Compare the in-process SciPy peak detector against BGMN's eflech.
+
+Both detectors run on every pattern; eflech's peak list is the reference.
+
+Usage:
+    # All patterns in tests/test_data
+    python compare_peak_detection.py
+
+    # Specific patterns
+    python compare_peak_detection.py path/to/a.xy path/to/b.xrdml --wavelength Cu
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from dara.peak_detection import detect_peaks
+from dara.scipy_peak_detection import compare_peak_lists
+
+TEST_DATA_DIR = Path(__file__).resolve().parents[1] / 'tests' / 'test_data'
+PATTERN_SUFFIXES = {'.xy', '.xye', '.xrdml', '.raw'}
+
+
+def compare_pattern(
+    pattern: Path,
+    wavelength: str | float = 'Cu',
+    instrument_profile: str = 'Aeris-fds-Pixcel1d-Medipix3',
+    tolerance: float = 0.05
+) -> dict:
+    """Run both detectors on one pattern.
+
+    Args:
+        pattern: path to the pattern file
+        wavelength: anode name or wavelength in nm
+        instrument_profile: instrument profile passed to eflech
+        tolerance: 2theta tolerance (deg) for matching peaks
+
+    Returns:
+        the comparison metrics and the runtime of both detectors
+    """
+    start = time.perf_counter()
+    reference = detect_peaks(pattern, wavelength=wavelength, instrument_profile=instrument_profile)
+    t_eflech = time.perf_counter() - start
+
+    start = time.perf_counter()
+    peaks = detect_peaks(pattern, wavelength=wavelength, method='scipy')
+    t_scipy = time.perf_counter() - start
+
+    metrics = compare_peak_lists(reference, peaks, tolerance=tolerance)
+    return {'pattern': pattern.name, **metrics, 'eflech_s': t_eflech, 'scipy_s': t_scipy}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('patterns', nargs='*', type=Path, help=f'Pattern files (default: {TEST_DATA_DIR})')
+    parser.add_argument('--wavelength', default='Cu', help='Anode name or wavelength in nm')
+    parser.add_argument('--instrument-profile', default='Aeris-fds-Pixcel1d-Medipix3')
+    parser.add_argument('--tolerance', type=float, default=0.05, help='2theta tolerance (deg) for matching peaks')
+    parser.add_argument('--output', type=Path, help='Write the comparison table to this CSV file')
+    args = parser.parse_args()
+
+    patterns = args.patterns or sorted(p for p in TEST_DATA_DIR.iterdir() if p.suffix.lower() in PATTERN_SUFFIXES)
+    if not patterns:
+        parser.error('No patterns to compare')
+
+    rows = []
+    for pattern in patterns:
+        print(f"Comparing {pattern.name}...")
+        rows.append(compare_pattern(pattern, args.wavelength, args.instrument_profile, args.tolerance))
+
+    table = pd.DataFrame(rows)
+    with pd.option_context('display.width', 200, 'display.float_format', '{:.3f}'.format):
+        print(table.to_string(index=False))
+    if args.output:
+        table.to_csv(args.output, index=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -32,12 +32,14 @@ def prepare_phases_for_dara(
     max_e_above_hull: float | None = None,
     max_phases: int | None = None,
     use_chemical_system: bool = True,
+    order_by: str | None = None,
+    db: StructureDatabaseIndex | None = None,
 ) -> list[str]:
     """
     Filter database index and return CIF paths for DARA PhaseSearchMaker.
     
     Args:
-        index_path: Path to .parquet/.sqlite/.json.gz index file
+        index_path: Path to .parquet/.sqlite/.json.gz index file or partitioned dataset directory
         required_elements: Elements defining the chemical system (Ge-Zn-O).
                           When use_chemical_system=True (default), this includes all
                           subsystems: unary (Ge, Zn, O), binary (GeZn, ZnO, GeO), 
@@ -56,6 +58,10 @@ def prepare_phases_for_dara(
         use_chemical_system: If True (default), required_elements defines a chemical system
                             and includes all subsystems (Ge, Zn, O → Ge, Zn, O, GeZn, ZnO, GeO, GeZnO).
                             If False, uses old exact-match behavior (must contain ALL required_elements).
+        order_by: Column to sort candidates by before max_phases is applied
+                  (e.g. 'energy_above_hull'); default keeps index order
+        db: Already-loaded index to filter instead of reading index_path (e.g. from a
+            long-lived cache); index_path is then only informational.
     
     Returns:
         List of CIF file paths
@@ -81,84 +87,69 @@ def prepare_phases_for_dara(
         ...     max_phases=500
         ... )
     """
-    db = StructureDatabaseIndex(index_path)
+    if db is None:
+        # Partitioned datasets only read the partitions of the chemical system's subsystems
+        chemical_system = required_elements if use_chemical_system else None
+        db = StructureDatabaseIndex(index_path, chemical_system=chemical_system)
     
-    # Apply filters
-    filtered = db.df
+    # Build the query; all filters are combined and evaluated in a single pass
+    query = db.query()
     
     # Element filtering: chemical system (new default) vs exact match (old behavior)
     if use_chemical_system and required_elements:
         # Chemical system filter: include all subsystems
-        filtered = db.filter_by_elements(allowed=required_elements)
+        query = query.elements(allowed=required_elements)
     elif required_elements or optional_elements:
         # Old exact-match behavior
-        filtered = db.filter_by_elements(
-            required=required_elements,
-            optional=optional_elements,
-            exclude=None  # Apply exclude separately below
-        )
+        query = query.elements(required=required_elements, optional=optional_elements)
     
     # Apply exclude filter (always applied, regardless of mode)
     if exclude_elements:
-        filtered = db.filter_by_elements(exclude=exclude_elements)
+        query = query.elements(exclude=exclude_elements)
     
     if formula_pattern:
-        filtered = db.filter_by_formula(formula_pattern)
+        query = query.formula(formula_pattern)
     
     if density_range:
         min_d, max_d = density_range
-        filtered = db.filter_by_density(min_val=min_d, max_val=max_d)
+        query = query.density(min_val=min_d, max_val=max_d)
     
     if sources:
-        filtered = db.filter_by_source(sources)
-    
-    # Filter by experimental status (MP only)
-    if experimental_only:
-        filtered = filtered[filtered['experimental_status'] == 'experimental'] if 'experimental_status' in filtered.columns else filtered
-    elif include_theoretical:
-        # Include both experimental and theoretical
-        pass
-    else:
-        # Default: for MP data, include only experimental; for ICSD/COD, include all
-        if 'experimental_status' in filtered.columns:
-            filtered = filtered[filtered['experimental_status'] == 'experimental']
-    
-    # Filter by stability (MP only)
-    if max_e_above_hull is not None and 'energy_above_hull' in filtered.columns:
-        has_energy = filtered['energy_above_hull'].notna()
-        stable = filtered[has_energy & (filtered['energy_above_hull'] <= max_e_above_hull)]
-        # Keep non-MP data (no energy data)
-        no_energy = filtered[~has_energy]
-        filtered = pd.concat([stable, no_energy], ignore_index=True)
-    
-    # Get CIF paths
-    if 'id' in filtered.columns:
-        ids = filtered['id'].tolist()
-    elif 'raw_db_id' in filtered.columns:
-        ids = filtered['raw_db_id'].tolist()
-    else:
-        ids = None
-    
-    paths = db.get_cif_paths(ids)
+        query = query.source(sources)
+    
+    # Filter by experimental status (MP only). Default: for MP data, include only
+    # experimental; include_theoretical keeps both. ICSD/COD (no status column) pass.
+    if experimental_only or not include_theoretical:
+        query = query.experimental_status('experimental')
+    
+    # Filter by stability (MP only); non-MP data (no energy data) is kept
+    if max_e_above_hull is not None:
+        query = query.stability(max_e_above_hull)
+    
+    if order_by:
+        query = query.order_by(order_by)
+    
+    if 'path' not in db.df.columns:
+        return []
+    paths = query.execute(columns=['path'])['path']
     
     # Convert to absolute paths (critical for jobflow worker processes)
-    # Worker processes may have different working directories
+    # Worker processes may have different working directories.
+    # Stop as soon as max_phases existing files are found.
     repo_root = Path(__file__).parent.parent.resolve()
     absolute_paths = []
     for p in paths:
-        if not p or p == 'None':
+        if max_phases and len(absolute_paths) >= max_phases:
+            break
+        if p is None or pd.isna(p) or str(p) == 'None' or not str(p):
             continue
-        path_obj = Path(p)
+        path_obj = Path(str(p))
         if not path_obj.is_absolute():
             # Convert relative path to absolute using repo root
             path_obj = repo_root / path_obj
         if path_obj.exists():
             absolute_paths.append(str(path_obj))
     
-    # Limit number of phases
-    if max_phases and len(absolute_paths) > max_phases:
-        absolute_paths = absolute_paths[:max_phases]
-    
     return absolute_paths
 
 
@@ -210,25 +201,24 @@ def export_filtered_phases(
     """
     db = StructureDatabaseIndex(index_path)
     
-    # Apply filters (reuse filter logic)
-    filtered = db.df
-    
-    if filter_kwargs.get('required_elements') or filter_kwargs.get('optional_elements') or filter_kwargs.get('exclude_elements'):
-        filtered = db.filter_by_elements(
-            required=filter_kwargs.get('required_elements'),
-            optional=filter_kwargs.get('optional_elements'),
-            exclude=filter_kwargs.get('exclude_elements')
-        )
+    # Apply filters (combined into one query)
+    query = db.query().elements(
+        required=filter_kwargs.get('required_elements'),
+        optional=filter_kwargs.get('optional_elements'),
+        exclude=filter_kwargs.get('exclude_elements')
+    )
     
     if filter_kwargs.get('formula_pattern'):
-        filtered = db.filter_by_formula(filter_kwargs['formula_pattern'])
+        query = query.formula(filter_kwargs['formula_pattern'])
     
     if filter_kwargs.get('density_range'):
         min_d, max_d = filter_kwargs['density_range']
-        filtered = db.filter_by_density(min_val=min_d, max_val=max_d)
+        query = query.density(min_val=min_d, max_val=max_d)
     
     if filter_kwargs.get('sources'):
-        filtered = db.filter_by_source(filter_kwargs['sources'])
+        query = query.source(filter_kwargs['sources'])
+    
+    filtered = query.execute()
     
     # Export
     db.export_filtered(filtered, output_path, format=format)
@@ -8,35 +8,536 @@ from __future__ import annotations
 
 import json
 import gzip
+import os
+from itertools import combinations
 from pathlib import Path
-from typing import Any, Literal
+from typing import Any, Callable, Iterable, Literal
+from urllib.parse import quote
 
+import numpy as np
 import pandas as pd
 
 
+# Periodic table ordered by atomic number; bit (Z - 1) of the 128-bit element mask
+# marks the presence of that element. Bit 127 flags symbols outside this table.
+ELEMENT_SYMBOLS = (
+    'H', 'He', 'Li', 'Be', 'B', 'C', 'N', 'O', 'F', 'Ne', 'Na', 'Mg', 'Al', 'Si', 'P', 'S',
+    'Cl', 'Ar', 'K', 'Ca', 'Sc', 'Ti', 'V', 'Cr', 'Mn', 'Fe', 'Co', 'Ni', 'Cu', 'Zn', 'Ga',
+    'Ge', 'As', 'Se', 'Br', 'Kr', 'Rb', 'Sr', 'Y', 'Zr', 'Nb', 'Mo', 'Tc', 'Ru', 'Rh', 'Pd',
+    'Ag', 'Cd', 'In', 'Sn', 'Sb', 'Te', 'I', 'Xe', 'Cs', 'Ba', 'La', 'Ce', 'Pr', 'Nd', 'Pm',
+    'Sm', 'Eu', 'Gd', 'Tb', 'Dy', 'Ho', 'Er', 'Tm', 'Yb', 'Lu', 'Hf', 'Ta', 'W', 'Re', 'Os',
+    'Ir', 'Pt', 'Au', 'Hg', 'Tl', 'Pb', 'Bi', 'Po', 'At', 'Rn', 'Fr', 'Ra', 'Ac', 'Th', 'Pa',
+    'U', 'Np', 'Pu', 'Am', 'Cm', 'Bk', 'Cf', 'Es', 'Fm', 'Md', 'No', 'Lr', 'Rf', 'Db', 'Sg',
+    'Bh', 'Hs', 'Mt', 'Ds', 'Rg', 'Cn', 'Nh', 'Fl', 'Mc', 'Lv', 'Ts', 'Og',
+)
+ELEMENT_BITS = {symbol: i for i, symbol in enumerate(ELEMENT_SYMBOLS)}
+UNKNOWN_ELEMENT_BIT = 127
+
+ELEMENT_MASK_LO = 'elements_mask_lo'
+ELEMENT_MASK_HI = 'elements_mask_hi'
+ELEMENT_MASK_COLUMNS = [ELEMENT_MASK_LO, ELEMENT_MASK_HI]
+
+# Hive partition keys of partitioned index datasets (see write_partitioned_index)
+PARTITION_COLUMNS = ['nelements', 'chemsys']
+PARTITION_FILE = 'part-0.parquet'
+
+# Above this many elements, enumerating subsystem partitions costs more than a full scan
+MAX_PRUNED_ELEMENTS = 12
+
+
+def normalize_elements(x: Any) -> list[str]:
+    """Normalize an ``elements`` cell (list, numpy array or JSON string) to a list."""
+    if isinstance(x, (list, tuple, np.ndarray)):
+        return [str(e) for e in x]
+    if isinstance(x, str) and x.startswith('['):
+        try:
+            return json.loads(x)
+        except ValueError:
+            return []
+    return []
+
+
+def element_bitmask(elements: Iterable[str]) -> tuple[int, int, list[str]]:
+    """
+    Encode element symbols as a 128-bit mask split into two 64-bit halves.
+    
+    Args:
+        elements: Element symbols (e.g., ['Fe', 'O'])
+    
+    Returns:
+        (low 64 bits, high 64 bits, symbols not found in the periodic table)
+    """
+    lo = hi = 0
+    unknown = []
+    for element in elements:
+        bit = ELEMENT_BITS.get(element)
+        if bit is None:
+            unknown.append(element)
+            bit = UNKNOWN_ELEMENT_BIT
+        if bit < 64:
+            lo |= 1 << bit
+        else:
+            hi |= 1 << (bit - 64)
+    return lo, hi, unknown
+
+
+def compute_element_masks(elements: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Compute the element bitmask columns for an ``elements`` column.
+    
+    Args:
+        elements: Series of element lists (lists, numpy arrays or JSON strings)
+    
+    Returns:
+        Two uint64 arrays (low and high 64 bits of each row's element mask)
+    """
+    exploded = elements.reset_index(drop=True).map(normalize_elements).explode().dropna()
+    rows = exploded.index.to_numpy(dtype=np.int64)
+    bits = exploded.map(ELEMENT_BITS).fillna(UNKNOWN_ELEMENT_BIT).to_numpy(dtype=np.uint64)
+    
+    lo = np.zeros(len(elements), dtype=np.uint64)
+    hi = np.zeros(len(elements), dtype=np.uint64)
+    is_lo = bits < 64
+    np.bitwise_or.at(lo, rows[is_lo], np.left_shift(np.uint64(1), bits[is_lo]))
+    np.bitwise_or.at(hi, rows[~is_lo], np.left_shift(np.uint64(1), bits[~is_lo] - np.uint64(64)))
+    return lo, hi
+
+
+def add_element_masks(df: pd.DataFrame) -> pd.DataFrame:
+    """Add (or refresh) the uint64 element bitmask columns of an index DataFrame in place."""
+    if 'elements' in df.columns:
+        df[ELEMENT_MASK_LO], df[ELEMENT_MASK_HI] = compute_element_masks(df['elements'])
+    return df
+
+
+def _known_element_bitmask(elements: Iterable[str]) -> tuple[int, int]:
+    """Bitmask of the recognised symbols in ``elements`` (unknown symbols are dropped)."""
+    lo, hi, _ = element_bitmask(e for e in elements if e in ELEMENT_BITS)
+    return lo, hi
+
+
+def _has_unknown_symbols(*queries: list[str] | None) -> bool:
+    """Whether any of the query element lists names a symbol outside the periodic table."""
+    return any(e not in ELEMENT_BITS for query in queries if query for e in query)
+
+
+def _elements_match(
+    elements: Any,
+    required: list[str] | None = None,
+    optional: list[str] | None = None,
+    exclude: list[str] | None = None,
+    allowed: list[str] | None = None
+) -> bool:
+    """List-based ``filter_by_elements`` predicate for a single ``elements`` cell."""
+    present = set(normalize_elements(elements))
+    if allowed:
+        keep = bool(present) and present.issubset(allowed)
+    else:
+        keep = present.issuperset(required or ()) and (not optional or not present.isdisjoint(optional))
+    return keep and present.isdisjoint(exclude or ())
+
+
+def element_mask(
+    df: pd.DataFrame,
+    required: list[str] | None = None,
+    optional: list[str] | None = None,
+    exclude: list[str] | None = None,
+    allowed: list[str] | None = None
+) -> np.ndarray:
+    """
+    Boolean row mask implementing ``StructureDatabaseIndex.filter_by_elements``.
+    
+    The bitmasks decide every row exactly, except rows flagged with the unknown-symbol
+    bit when the query itself names symbols outside the periodic table: bit 127 only
+    says that *some* unknown symbol is present, so those rows are checked against
+    their ``elements`` lists instead.
+    
+    Args:
+        df: Index records with the bitmask columns
+        required: Must contain ALL these elements
+        optional: May contain ANY of these (in addition to required)
+        exclude: Must NOT contain any of these
+        allowed: ALL phase elements must be subset of this list
+    
+    Returns:
+        Boolean numpy array, one entry per row of ``df``
+    """
+    lo = df[ELEMENT_MASK_LO].to_numpy(dtype=np.uint64)
+    hi = df[ELEMENT_MASK_HI].to_numpy(dtype=np.uint64)
+    keep = np.ones(len(df), dtype=bool)
+    
+    # Chemical system filter: all phase elements must be subset of allowed
+    if allowed:
+        # An unknown symbol in allowed sets bit 127, admitting rows with unknown symbols
+        allowed_lo, allowed_hi, _ = element_bitmask(allowed)
+        keep &= (lo & np.uint64(~allowed_lo & 0xFFFFFFFFFFFFFFFF)) == 0
+        keep &= (hi & np.uint64(~allowed_hi & 0xFFFFFFFFFFFFFFFF)) == 0
+        keep &= (lo | hi) != 0
+    else:
+        # Original behavior
+        if required:
+            # An unknown symbol in required sets bit 127, so only rows with unknown symbols remain
+            required_lo, required_hi, _ = element_bitmask(required)
+            keep &= (lo & np.uint64(required_lo)) == required_lo
+            keep &= (hi & np.uint64(required_hi)) == required_hi
+        
+        if optional:
+            # Must contain at least one optional element (in addition to required)
+            optional_lo, optional_hi = _known_element_bitmask(optional)
+            keep &= ((lo & np.uint64(optional_lo)) | (hi & np.uint64(optional_hi))) != 0
+    
+    if exclude:
+        exclude_lo, exclude_hi = _known_element_bitmask(exclude)
+        keep &= ((lo & np.uint64(exclude_lo)) | (hi & np.uint64(exclude_hi))) == 0
+    
+    if _has_unknown_symbols(required, optional, exclude, allowed) and 'elements' in df.columns:
+        unknown_rows = np.flatnonzero(hi >> np.uint64(UNKNOWN_ELEMENT_BIT - 64))
+        elements = df['elements'].to_numpy()
+        keep[unknown_rows] = [
+            _elements_match(elements[row], required, optional, exclude, allowed) for row in unknown_rows
+        ]
+    
+    return keep
+
+
+def element_filter_expression(
+    required: list[str] | None = None,
+    optional: list[str] | None = None,
+    exclude: list[str] | None = None,
+    allowed: list[str] | None = None
+):
+    """
+    Build a pyarrow compute expression equivalent to ``filter_by_elements``.
+    
+    The expression only references the bitmask columns, so it can be pushed
+    down into Arrow table filters and dataset scans. Queries naming symbols
+    outside the periodic table also read the (list-typed) ``elements`` column,
+    which decides the rows flagged with the unknown-symbol bit, as in ``element_mask``.
+    
+    Args:
+        required: Must contain ALL these elements
+        optional: May contain ANY of these (in addition to required)
+        exclude: Must NOT contain any of these
+        allowed: ALL phase elements must be subset of this list
+    
+    Returns:
+        pyarrow.compute.Expression
+    """
+    import re
+    
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    
+    lo = pc.field(ELEMENT_MASK_LO)
+    hi = pc.field(ELEMENT_MASK_HI)
+    
+    def u64(value: int):
+        return pa.scalar(value & 0xFFFFFFFFFFFFFFFF, pa.uint64())
+    
+    def contains_none(mask_lo: int, mask_hi: int):
+        return (pc.bit_wise_and(lo, u64(mask_lo)) == u64(0)) & (pc.bit_wise_and(hi, u64(mask_hi)) == u64(0))
+    
+    # Rows with unknown symbols are matched on their '|'-joined element lists
+    has_unknown = ~contains_none(0, 1 << (UNKNOWN_ELEMENT_BIT - 64))
+    joined = pc.binary_join(pc.field('elements'), '|')
+    
+    def unknown_symbol(symbol: str):
+        return has_unknown & pc.match_substring_regex(joined, rf'(^|\|){re.escape(symbol)}(\||$)')
+    
+    def unknown_symbols(symbols: list[str]) -> list[str]:
+        return sorted({e for e in symbols if e not in ELEMENT_BITS})
+    
+    expr = pc.scalar(True)
+    if allowed:
+        allowed_lo, allowed_hi, unknown = element_bitmask(allowed)
+        expr = contains_none(~allowed_lo, ~allowed_hi) & (pc.bit_wise_or(lo, hi) != u64(0))
+        if unknown:
+            symbols = '|'.join(re.escape(e) for e in sorted(set(allowed)))
+            expr = expr & (~has_unknown | pc.match_substring_regex(joined, rf'^({symbols})(\|({symbols}))*$'))
+    else:
+        if required:
+            required_lo, required_hi, unknown = element_bitmask(required)
+            expr = expr & (pc.bit_wise_and(lo, u64(required_lo)) == u64(required_lo))
+            expr = expr & (pc.bit_wise_and(hi, u64(required_hi)) == u64(required_hi))
+            for symbol in unknown_symbols(unknown):
+                expr = expr & unknown_symbol(symbol)
+        if optional:
+            any_optional = ~contains_none(*_known_element_bitmask(optional))
+            for symbol in unknown_symbols(optional):
+                any_optional = any_optional | unknown_symbol(symbol)
+            expr = expr & any_optional
+    
+    if exclude:
+        expr = expr & contains_none(*_known_element_bitmask(exclude))
+        for symbol in unknown_symbols(exclude):
+            expr = expr & ~unknown_symbol(symbol)
+    return expr
+
+
+def chemsys_key(elements: Iterable[str]) -> str | None:
+    """Sorted, dash-joined chemical system string (e.g. ['Zn', 'O', 'Ge'] -> 'Ge-O-Zn')."""
+    unique = sorted(set(elements))
+    return '-'.join(unique) if unique else None
+
+
+def chemical_subsystems(elements: Iterable[str]) -> list[tuple[str, ...]]:
+    """
+    All non-empty subsystems of a chemical system.
+    
+    Args:
+        elements: Elements of the chemical system (e.g., ['Ge', 'Zn', 'O'])
+    
+    Returns:
+        Sorted element tuples, e.g. ('Ge',), ('O',), ('Zn',), ('Ge', 'O'), ..., ('Ge', 'O', 'Zn')
+    """
+    unique = sorted(set(elements))
+    return [combo for n in range(1, len(unique) + 1) for combo in combinations(unique, n)]
+
+
+def partition_dir(root: str | Path, nelements: int, chemsys: str | None) -> Path:
+    """Directory of one partition in a Hive-partitioned index dataset."""
+    value = quote(chemsys, safe='-') if chemsys else '__HIVE_DEFAULT_PARTITION__'
+    return Path(root) / f'nelements={nelements}' / f'chemsys={value}'
+
+
+def add_partition_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Add (or refresh) the nelements/chemsys partition key columns in place."""
+    elements = df['elements'].map(normalize_elements)
+    df['chemsys'] = elements.map(chemsys_key)
+    df['nelements'] = elements.map(lambda x: len(set(x))).astype('int32')
+    return df
+
+
+def write_partitioned_index(
+    df: pd.DataFrame,
+    root: str | Path,
+    row_group_size: int = 8192,
+    replace: bool = True
+) -> int:
+    """
+    Write an index as a Hive-partitioned Parquet dataset.
+    
+    Layout is ``root/nelements=<n>/chemsys=<A-B-C>/part-0.parquet``. Rows in each
+    partition are sorted by density then spacegroup, so the row-group min/max
+    statistics on those columns let readers skip row groups for range filters.
+    Every partition file is written to a temporary name and swapped in with
+    ``os.replace``, so readers never see a half-written partition.
+    
+    Args:
+        df: Index records (must have an 'elements' column)
+        root: Dataset directory
+        row_group_size: Rows per Parquet row group
+        replace: Remove partitions under ``root`` that are not present in ``df``
+    
+    Returns:
+        Number of partitions written
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    root = Path(root)
+    df = df.copy()
+    if not all(col in df.columns for col in ELEMENT_MASK_COLUMNS):
+        add_element_masks(df)
+    add_partition_columns(df)
+    
+    sort_cols = PARTITION_COLUMNS + [col for col in ['density', 'spacegroup'] if col in df.columns]
+    if 'spacegroup' in df.columns:
+        # Mixed int/str spacegroups (COD vs MP) must share one Arrow type
+        df['spacegroup'] = df['spacegroup'].map(lambda x: None if pd.isna(x) else str(x))
+    df = df.sort_values(sort_cols, kind='stable', na_position='last').reset_index(drop=True)
+    
+    # One Arrow schema for every partition, so the dataset can be read as a whole
+    table = pa.Table.from_pandas(df.drop(columns=PARTITION_COLUMNS), preserve_index=False)
+    keys = df[PARTITION_COLUMNS].fillna('')
+    bounds = np.flatnonzero(keys.ne(keys.shift()).any(axis=1).to_numpy())
+    bounds = np.append(bounds, len(df))
+    
+    written = set()
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        nelements, chemsys = keys.iloc[start]
+        target_dir = partition_dir(root, int(nelements), chemsys)
+        target_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = target_dir / f'.{PARTITION_FILE}.{os.getpid()}.tmp'
+        pq.write_table(table.slice(start, stop - start), tmp_path, row_group_size=row_group_size)
+        os.replace(tmp_path, target_dir / PARTITION_FILE)
+        written.add(target_dir)
+    
+    if replace:
+        for stale in root.glob(f'nelements=*/chemsys=*/{PARTITION_FILE}'):
+            if stale.parent not in written:
+                stale.unlink()
+    return len(written)
+
+
+def update_partitioned_index(
+    df: pd.DataFrame,
+    root: str | Path,
+    partitions: Iterable[tuple[int, str | None]],
+    row_group_size: int = 8192
+) -> int:
+    """
+    Rewrite only some partitions of a partitioned index dataset.
+    
+    Used for incremental re-indexing: each touched partition is rebuilt from
+    ``df`` and swapped in atomically; partitions left without records are removed.
+    
+    Args:
+        df: Complete, up-to-date index records
+        root: Dataset directory written by ``write_partitioned_index``
+        partitions: (nelements, chemsys) keys whose records changed
+        row_group_size: Rows per Parquet row group
+    
+    Returns:
+        Number of partitions rewritten or removed
+    """
+    wanted = {f'{int(n)}/{c or ""}' for n, c in partitions}
+    if not wanted:
+        return 0
+    
+    keys = add_partition_columns(df[['elements']].copy())
+    key_str = keys['nelements'].astype(str) + '/' + keys['chemsys'].fillna('')
+    in_scope = key_str.isin(wanted).to_numpy()
+    if in_scope.any():
+        write_partitioned_index(df[in_scope], root, row_group_size=row_group_size, replace=False)
+    
+    for key in wanted - set(key_str[in_scope]):
+        n, chemsys = key.split('/', 1)
+        stale = partition_dir(root, int(n), chemsys or None) / PARTITION_FILE
+        if stale.exists():
+            stale.unlink()
+    return len(wanted)
+
+
+def read_partitioned_index(
+    root: str | Path,
+    chemical_system: list[str] | None = None,
+    columns: list[str] | None = None,
+    filters: Any = None
+) -> pd.DataFrame:
+    """
+    Read a Hive-partitioned index dataset.
+    
+    Args:
+        root: Dataset directory written by ``write_partitioned_index``
+        chemical_system: Only read partitions of this system's subsystems
+                         (e.g. ['Ge', 'Zn', 'O'] reads 7 partitions)
+        columns: Columns to read (default: all)
+        filters: pyarrow filter expression or DNF list, pushed down to row groups
+    
+    Returns:
+        DataFrame including the nelements/chemsys partition columns
+    
+    Note:
+        Without ``chemical_system`` every partition file is opened. Fine-grained
+        datasets have tens of thousands of partitions, so keep the monolithic
+        parquet index for full-table scans.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    
+    root = Path(root)
+    if chemical_system and len(set(chemical_system)) <= MAX_PRUNED_ELEMENTS:
+        data_columns = None if columns is None else [c for c in columns if c not in PARTITION_COLUMNS]
+        tables = []
+        for subsystem in chemical_subsystems(chemical_system):
+            key = chemsys_key(subsystem)
+            path = partition_dir(root, len(subsystem), key) / PARTITION_FILE
+            if not path.exists():
+                continue
+            table = pq.read_table(path, columns=data_columns, filters=filters)
+            table = table.append_column('nelements', pa.array([len(subsystem)] * table.num_rows, pa.int32()))
+            table = table.append_column('chemsys', pa.array([key] * table.num_rows, pa.string()))
+            tables.append(table)
+        if tables:
+            return pa.concat_tables(tables, promote_options='default').to_pandas()
+        # Nothing in this chemical system: empty frame with the dataset's columns
+        any_partition = next(root.glob(f'nelements=*/chemsys=*/{PARTITION_FILE}'), None)
+        if any_partition is None:
+            return pd.DataFrame(columns=['elements'] + PARTITION_COLUMNS)
+        return add_partition_columns(pq.read_schema(any_partition).empty_table().to_pandas())
+    
+    dataset = ds.dataset(root, format='parquet', partitioning='hive', exclude_invalid_files=True)
+    if filters is not None and not isinstance(filters, ds.Expression):
+        filters = pq.filters_to_expression(filters)
+    df = dataset.to_table(columns=columns, filter=filters).to_pandas()
+    if chemical_system:
+        if not all(col in df.columns for col in ELEMENT_MASK_COLUMNS):
+            add_element_masks(df)
+        df = df[element_mask(df, allowed=chemical_system)]
+    return df
+
+
 class StructureDatabaseIndex:
     """Unified structure database index interface."""
     
-    def __init__(self, index_path: str | Path):
+    def __init__(
+        self,
+        index_path: str | Path,
+        chemical_system: list[str] | None = None,
+        filters: Any = None
+    ):
         """
         Initialize from index file.
         
         Args:
-            index_path: Path to .parquet, .sqlite, or .json.gz index file
+            index_path: Path to .parquet, .sqlite, or .json.gz index file, or a
+                        partitioned dataset directory (see write_partitioned_index)
+            chemical_system: Only load records whose elements are a non-empty subset
+                             of these (e.g. ['Ge', 'Zn', 'O']). Partitioned datasets
+                             read only the matching partitions.
+            filters: pyarrow filter expression or DNF list (parquet/datasets only),
+                     e.g. [('density', '>=', 3.0)]
         """
         self.index_path = Path(index_path)
         if not self.index_path.exists():
             raise FileNotFoundError(f"Index file not found: {self.index_path}")
         
+        self.chemical_system = chemical_system
+        self.filters = filters
         self.df = self._load_index()
         self._validate_schema()
+        self._ensure_element_masks()
+        
+        if chemical_system and not self.index_path.is_dir():
+            self.df = self.df[element_mask(self.df, allowed=chemical_system)]
+    
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, index_path: str | Path) -> 'StructureDatabaseIndex':
+        """
+        Wrap an already-loaded index DataFrame (e.g. a filtered slice of a cached index).
+        
+        Args:
+            df: Index records
+            index_path: File the records were loaded from (informational)
+        
+        Returns:
+            StructureDatabaseIndex backed by ``df``
+        """
+        db = cls.__new__(cls)
+        db.index_path = Path(index_path)
+        db.chemical_system = None
+        db.filters = None
+        db.df = df
+        db._validate_schema()
+        db._ensure_element_masks()
+        return db
+    
+    def _ensure_element_masks(self):
+        """Older index files predate the bitmask columns; compute them once on load."""
+        if not all(col in self.df.columns for col in ELEMENT_MASK_COLUMNS):
+            add_element_masks(self.df)
     
     def _load_index(self) -> pd.DataFrame:
         """Load index from file."""
         suffix = self.index_path.suffix.lower()
         
+        if self.index_path.is_dir():
+            return read_partitioned_index(self.index_path, self.chemical_system, filters=self.filters)
+        
         if suffix == '.parquet':
-            return pd.read_parquet(self.index_path, engine='pyarrow')
+            return pd.read_parquet(self.index_path, engine='pyarrow', filters=self.filters)
         
         elif suffix == '.sqlite':
             import sqlite3
@@ -73,6 +574,24 @@ class StructureDatabaseIndex:
         if missing:
             raise ValueError(f"Index missing required columns: {missing}")
     
+    def query(self) -> 'IndexQuery':
+        """
+        Start a lazy, composable query over this index.
+        
+        Returns:
+            Empty IndexQuery (matches every record)
+        
+        Example:
+            >>> db = StructureDatabaseIndex('indexes/merged_index.parquet')
+            >>> df = (db.query()
+            ...       .elements(allowed=['Ge', 'Zn', 'O'])
+            ...       .elements(exclude=['Pb'])
+            ...       .density(3.0, 8.0)
+            ...       .limit(500)
+            ...       .execute())
+        """
+        return IndexQuery(self)
+    
     def filter_by_elements(
         self,
         required: list[str] | None = None,
@@ -103,36 +622,12 @@ class StructureDatabaseIndex:
             >>> # Chemical system: include all subsystems (Ge, Zn, O, GeZn, ZnO, GeO, GeZnO)
             >>> ge_zn_o_system = db.filter_by_elements(allowed=['Ge', 'Zn', 'O'])
         """
-        df = self.df.copy()
-        
-        # Ensure elements column is list type (handle numpy arrays from parquet)
-        if 'elements' in df.columns:
-            import numpy as np
-            df['elements'] = df['elements'].apply(
-                lambda x: list(x) if isinstance(x, (list, np.ndarray)) and x is not None else (
-                    json.loads(x) if isinstance(x, str) and x.startswith('[') else []
-                )
-            )
-        
-        # Chemical system filter: all phase elements must be subset of allowed
-        if allowed:
-            allowed_set = set(allowed)
-            df = df[df['elements'].apply(
-                lambda x: set(x).issubset(allowed_set) if isinstance(x, list) and len(x) > 0 else False
-            )]
-        else:
-            # Original behavior
-            if required:
-                df = df[df['elements'].apply(lambda x: all(e in x for e in required) if isinstance(x, list) else False)]
-            
-            if optional:
-                # Must contain at least one optional element (in addition to required)
-                df = df[df['elements'].apply(lambda x: any(e in x for e in optional) if isinstance(x, list) else False)]
-        
-        if exclude:
-            df = df[df['elements'].apply(lambda x: not any(e in x for e in exclude) if isinstance(x, list) else True)]
+        result = self.query().elements(required, optional, exclude, allowed).execute()
         
-        return df
+        # Return element lists, as before (parquet yields numpy arrays)
+        if 'elements' in result.columns:
+            result = result.assign(elements=result['elements'].map(normalize_elements))
+        return result
     
     def filter_by_formula(self, pattern: str, case_sensitive: bool = False) -> pd.DataFrame:
         """
@@ -145,15 +640,7 @@ class StructureDatabaseIndex:
         Returns:
             Filtered DataFrame
         """
-        df = self.df.copy()
-        if 'formula' not in df.columns:
-            return df
-        
-        formula_col = df['formula'].fillna('')
-        if not case_sensitive:
-            return df[formula_col.str.lower().str.contains(pattern.lower(), na=False)]
-        else:
-            return df[formula_col.str.contains(pattern, na=False)]
+        return self.query().formula(pattern, case_sensitive).execute()
     
     def filter_by_density(self, min_val: float | None = None, max_val: float | None = None) -> pd.DataFrame:
         """
@@ -166,16 +653,7 @@ class StructureDatabaseIndex:
         Returns:
             Filtered DataFrame
         """
-        df = self.df.copy()
-        if 'density' not in df.columns:
-            return df
-        
-        if min_val is not None:
-            df = df[df['density'] >= min_val]
-        if max_val is not None:
-            df = df[df['density'] <= max_val]
-        
-        return df
+        return self.query().density(min_val, max_val).execute()
     
     def filter_by_spacegroup(self, spacegroups: list[str | int]) -> pd.DataFrame:
         """
@@ -187,13 +665,7 @@ class StructureDatabaseIndex:
         Returns:
             Filtered DataFrame
         """
-        df = self.df.copy()
-        if 'spacegroup' not in df.columns:
-            return df
-        
-        # Convert all to strings for comparison
-        sg_strs = [str(sg) for sg in spacegroups]
-        return df[df['spacegroup'].astype(str).isin(sg_strs)]
+        return self.query().spacegroup(spacegroups).execute()
     
     def filter_by_source(self, sources: list[str]) -> pd.DataFrame:
         """
@@ -205,7 +677,7 @@ class StructureDatabaseIndex:
         Returns:
             Filtered DataFrame
         """
-        return self.df[self.df['source'].isin(sources)]
+        return self.query().source(sources).execute()
     
     def filter_by_experimental_status(
         self, 
@@ -228,20 +700,7 @@ class StructureDatabaseIndex:
             >>> exp_only = db.filter_by_experimental_status('experimental')
             >>> print(f"Experimental structures: {len(exp_only)}")
         """
-        if status == 'all':
-            return self.df
-        
-        # For MP data, filter by experimental_status
-        if 'experimental_status' in self.df.columns:
-            filtered = self.df[self.df['experimental_status'] == status].copy()
-        else:
-            # ICSD/COD are all experimental
-            if status == 'experimental':
-                filtered = self.df.copy()
-            else:
-                filtered = pd.DataFrame(columns=self.df.columns)
-        
-        return filtered
+        return self.query().experimental_status(status).execute()
     
     def filter_by_stability(self, max_e_above_hull: float = 0.1) -> pd.DataFrame:
         """
@@ -261,24 +720,7 @@ class StructureDatabaseIndex:
             >>> stable = db.filter_by_stability(max_e_above_hull=0.05)
             >>> print(f"Stable structures: {len(stable)}")
         """
-        if 'energy_above_hull' not in self.df.columns:
-            # No stability data, return all
-            return self.df
-        
-        # Filter rows with energy data
-        has_energy = self.df['energy_above_hull'].notna()
-        no_energy = ~has_energy
-        
-        # Apply filter to rows with energy data
-        stable = self.df[has_energy & (self.df['energy_above_hull'] <= max_e_above_hull)]
-        
-        # Keep rows without energy data (ICSD/COD)
-        no_energy_rows = self.df[no_energy]
-        
-        # Combine
-        filtered = pd.concat([stable, no_energy_rows], ignore_index=True)
-        
-        return filtered
+        return self.query().stability(max_e_above_hull).execute()
     
     def get_cif_paths(self, ids: list[str | int] | None = None) -> list[str]:
         """
@@ -378,6 +820,161 @@ class StructureDatabaseIndex:
         )
 
 
+class IndexQuery:
+    """
+    Lazy query over a StructureDatabaseIndex.
+    
+    Every method returns a new query with one more predicate (queries are immutable
+    and can be shared or extended). Nothing is evaluated until ``execute()``, which
+    combines all predicates into a single boolean mask, slices the table once, then
+    applies ordering and the row limit.
+    """
+    
+    def __init__(
+        self,
+        db: StructureDatabaseIndex,
+        predicates: tuple[Callable[[pd.DataFrame], Any], ...] = (),
+        order: tuple[str, bool] | None = None,
+        limit: int | None = None
+    ):
+        self.db = db
+        self.predicates = predicates
+        self.order = order
+        self.row_limit = limit
+    
+    def _replace(self, **changes: Any) -> 'IndexQuery':
+        state = {'predicates': self.predicates, 'order': self.order, 'limit': self.row_limit}
+        state.update(changes)
+        return IndexQuery(self.db, **state)
+    
+    def where(self, predicate: Callable[[pd.DataFrame], Any]) -> 'IndexQuery':
+        """
+        Add a custom predicate.
+        
+        Args:
+            predicate: Function mapping the index DataFrame to a boolean mask
+        
+        Returns:
+            New IndexQuery
+        """
+        return self._replace(predicates=self.predicates + (predicate,))
+    
+    def elements(
+        self,
+        required: list[str] | None = None,
+        optional: list[str] | None = None,
+        exclude: list[str] | None = None,
+        allowed: list[str] | None = None
+    ) -> 'IndexQuery':
+        """Element composition predicate; see ``StructureDatabaseIndex.filter_by_elements``."""
+        if not (required or optional or exclude or allowed):
+            return self
+        return self.where(lambda df: element_mask(df, required, optional, exclude, allowed))
+    
+    def formula(self, pattern: str, case_sensitive: bool = False) -> 'IndexQuery':
+        """Formula substring predicate (no-op if the index has no formula column)."""
+        def predicate(df: pd.DataFrame):
+            if 'formula' not in df.columns:
+                return True
+            return df['formula'].fillna('').str.contains(pattern, case=case_sensitive, na=False)
+        return self.where(predicate)
+    
+    def density(self, min_val: float | None = None, max_val: float | None = None) -> 'IndexQuery':
+        """Density range predicate in g/cm³ (no-op if the index has no density column)."""
+        def predicate(df: pd.DataFrame):
+            if 'density' not in df.columns:
+                return True
+            keep = np.ones(len(df), dtype=bool)
+            if min_val is not None:
+                keep &= (df['density'] >= min_val).to_numpy()
+            if max_val is not None:
+                keep &= (df['density'] <= max_val).to_numpy()
+            return keep
+        return self.where(predicate)
+    
+    def spacegroup(self, spacegroups: list[str | int]) -> 'IndexQuery':
+        """Space group predicate, matching symbols or numbers as strings."""
+        sg_strs = [str(sg) for sg in spacegroups]
+        return self.where(
+            lambda df: df['spacegroup'].astype(str).isin(sg_strs) if 'spacegroup' in df.columns else True
+        )
+    
+    def source(self, sources: list[str]) -> 'IndexQuery':
+        """Database source predicate ('ICSD', 'COD', 'MP')."""
+        return self.where(lambda df: df['source'].isin(sources))
+    
+    def experimental_status(self, status: Literal['experimental', 'theoretical', 'all'] = 'all') -> 'IndexQuery':
+        """
+        Experimental status predicate (MP only).
+        
+        Indexes without an experimental_status column (ICSD/COD) count as experimental.
+        """
+        if status == 'all':
+            return self
+        return self.where(
+            lambda df: df['experimental_status'] == status
+            if 'experimental_status' in df.columns else status == 'experimental'
+        )
+    
+    def stability(self, max_e_above_hull: float = 0.1) -> 'IndexQuery':
+        """Energy above hull predicate (MP only); records without energy data are kept."""
+        def predicate(df: pd.DataFrame):
+            if 'energy_above_hull' not in df.columns:
+                return True
+            energy = df['energy_above_hull']
+            return energy.isna() | (energy <= max_e_above_hull)
+        return self.where(predicate)
+    
+    def order_by(self, column: str, ascending: bool = True) -> 'IndexQuery':
+        """Sort the result by ``column`` (stable, missing values last)."""
+        return self._replace(order=(column, ascending))
+    
+    def limit(self, n: int | None) -> 'IndexQuery':
+        """Keep at most ``n`` records (after ordering)."""
+        return self._replace(limit=n)
+    
+    def mask(self) -> np.ndarray:
+        """
+        Evaluate all predicates in one pass.
+        
+        Returns:
+            Boolean numpy array over the rows of the underlying index
+        """
+        df = self.db.df
+        keep = np.ones(len(df), dtype=bool)
+        for predicate in self.predicates:
+            keep &= np.asarray(predicate(df), dtype=bool)
+        return keep
+    
+    def execute(self, columns: list[str] | None = None) -> pd.DataFrame:
+        """
+        Run the query.
+        
+        Args:
+            columns: Columns to return (default: all)
+        
+        Returns:
+            Filtered DataFrame
+        """
+        df = self.db.df
+        rows = np.flatnonzero(self.mask())
+        if self.order is not None:
+            column, ascending = self.order
+            values = pd.Series(df[column].to_numpy()[rows])
+            rows = rows[values.sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()]
+        if self.row_limit is not None:
+            rows = rows[:self.row_limit]
+        
+        # Materialise only the surviving rows (and requested columns), once
+        if columns is not None:
+            return df.iloc[rows, [df.columns.get_loc(col) for col in columns]]
+        return df.iloc[rows]
+    
+    def count(self) -> int:
+        """Number of matching records (ignores ordering and limit)."""
+        return int(self.mask().sum())
+
+
 def main():
     """CLI for quick testing."""
     import argparse
@@ -401,21 +998,16 @@ def main():
         print(json.dumps(db.stats(), indent=2, ensure_ascii=False))
         return
     
-    # Apply filters
-    df = db.df
-    
-    if args.elements_required or args.elements_exclude:
-        df = db.filter_by_elements(
-            required=args.elements_required,
-            exclude=args.elements_exclude
-        )
+    # Combine the filters in one query, evaluated in a single pass
+    query = db.query().elements(required=args.elements_required, exclude=args.elements_exclude)
     
     if args.formula:
-        df = db.filter_by_formula(args.formula)
+        query = query.formula(args.formula)
     
     if args.source:
-        df = db.filter_by_source(args.source)
+        query = query.source(args.source)
     
+    df = query.execute()
     print(f"Filtered results: {len(df):,} records")
     
     if len(df) > 0:
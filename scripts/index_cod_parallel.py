@@ -4,26 +4,59 @@
 Usage:
   python scripts/index_cod_parallel.py --cod-dir <extracted_cod_dir> --out-parquet indexes/cod_index.parquet --workers 12 --chunk-size 500
 
+  # After an rsync: re-parse only new/changed CIFs and drop removed ones
+  python scripts/index_cod_parallel.py --cod-dir <extracted_cod_dir> \
+      --out-parquet indexes/cod_index.parquet --incremental
+
 This script walks the COD directory for .cif files, parses them in parallel using
 pymatgen, writes per-shard parquet files and merges them into a final parquet and
 optionally a sqlite database. Designed to be robust for large datasets.
+
+Every run records a manifest (path, size, mtime, sha1) next to the parquet index.
+With --incremental, files whose size/mtime are unchanged are skipped, touched files
+are re-hashed and only re-parsed if their content changed, and the existing index
+(and partitioned dataset, if given) is updated in place with atomic file swaps.
 """
 from __future__ import annotations
 
 import argparse
+import hashlib
+import os
 import tempfile
 from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
 
 import pandas as pd
 from pymatgen.core import Structure
 from tqdm import tqdm
 
+try:
+    from database_interface import (
+        ELEMENT_MASK_COLUMNS,
+        add_element_masks,
+        add_partition_columns,
+        update_partitioned_index,
+        write_partitioned_index,
+    )
+except ImportError:
+    from scripts.database_interface import (
+        ELEMENT_MASK_COLUMNS,
+        add_element_masks,
+        add_partition_columns,
+        update_partitioned_index,
+        write_partitioned_index,
+    )
+
+MANIFEST_COLUMNS = ["path", "size", "mtime_ns", "sha1"]
 
-def parse_cif(path: str) -> Dict[str, Any]:
+
+def parse_cif(path: str, data: bytes | None = None) -> Dict[str, Any]:
     try:
-        s = Structure.from_file(path)
+        if data is None:
+            s = Structure.from_file(path)
+        else:
+            s = Structure.from_str(data.decode("utf-8", errors="replace"), fmt="cif")
         lat = s.lattice
         elems = sorted([str(e) for e in s.composition.elements])
         return {
@@ -51,13 +84,27 @@ def parse_cif(path: str) -> Dict[str, Any]:
         return {"id": Path(path).stem, "source": "COD", "path": str(path), "error": str(e)}
 
 
-def worker_parse(paths: List[str], out_parquet: str) -> str:
+def file_fingerprint(path: str, data: bytes | None = None) -> Dict[str, Any]:
+    st = os.stat(path)
+    if data is None:
+        with open(path, "rb") as fh:
+            data = fh.read()
+    digest = hashlib.sha1(data).hexdigest()
+    return {"path": str(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha1": digest}
+
+
+def worker_parse(paths: List[str], out_parquet: str) -> Tuple[str, List[Dict[str, Any]]]:
     rows = []
+    manifest = []
     for p in paths:
-        rows.append(parse_cif(p))
+        # Read each CIF once; the same bytes are parsed and hashed
+        with open(p, "rb") as fh:
+            data = fh.read()
+        rows.append(parse_cif(p, data))
+        manifest.append(file_fingerprint(p, data))
     df = pd.DataFrame(rows)
     df.to_parquet(out_parquet, index=False)
-    return out_parquet
+    return out_parquet, manifest
 
 
 def chunked(it: List[str], n: int):
@@ -65,14 +112,105 @@ def chunked(it: List[str], n: int):
         yield it[i : i + n]
 
 
+def parse_files(
+    files: List[str], workers: int, chunk_size: int
+) -> Tuple[pd.DataFrame, pd.DataFrame, List[str]]:
+    """Parse CIFs in a process pool; return (index rows, manifest rows, paths of failed shards)."""
+    tmpdir = Path(tempfile.mkdtemp(prefix="cod_index_"))
+    shards: List[str] = []
+    manifest: List[Dict[str, Any]] = []
+    failed: List[str] = []
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        futures = []
+        for i, chunk in enumerate(chunked(files, chunk_size)):
+            out_shard = tmpdir / f"shard_{i}.parquet"
+            futures.append((chunk, ex.submit(worker_parse, chunk, str(out_shard))))
+        for chunk, fut in tqdm(futures, desc="parsing shards"):
+            try:
+                shard, shard_manifest = fut.result()
+                shards.append(shard)
+                manifest.extend(shard_manifest)
+            except Exception as e:
+                print("Shard failed:", e)
+                failed.extend(chunk)
+
+    # merge shards
+    dfs = [pd.read_parquet(s) for s in shards]
+    combined = pd.concat(dfs, ignore_index=True, sort=False) if dfs else pd.DataFrame(columns=["path", "elements"])
+    return combined, pd.DataFrame(manifest, columns=MANIFEST_COLUMNS), failed
+
+
+def default_manifest_path(out_parquet: Path) -> Path:
+    return out_parquet.with_name(out_parquet.stem + ".manifest.parquet")
+
+
+def write_parquet_atomic(df: pd.DataFrame, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def plan_incremental(files: List[str], manifest: pd.DataFrame) -> Tuple[List[str], List[str], pd.DataFrame]:
+    """Compare the directory against the manifest.
+
+    Returns:
+        (paths to parse, paths removed from disk, manifest rows of unchanged files)
+    """
+    known = {row["path"]: row for row in manifest[MANIFEST_COLUMNS].to_dict(orient="records")}
+    on_disk = set(files)
+    removed = [p for p in known if p not in on_disk]
+
+    to_parse: List[str] = []
+    unchanged: List[Dict[str, Any]] = []
+    for path in files:
+        entry = known.get(path)
+        if entry is not None:
+            st = os.stat(path)
+            if entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+                unchanged.append(entry)
+                continue
+            # Touched (e.g. by rsync) but maybe not modified: compare content hashes
+            fingerprint = file_fingerprint(path)
+            if fingerprint["sha1"] == entry["sha1"]:
+                unchanged.append(fingerprint)
+                continue
+        to_parse.append(path)
+    return to_parse, removed, pd.DataFrame(unchanged, columns=MANIFEST_COLUMNS)
+
+
+def partition_keys(df: pd.DataFrame) -> set:
+    if df.empty:
+        return set()
+    keys = add_partition_columns(df[["elements"]].copy())
+    return set(zip(keys["nelements"].astype(int), keys["chemsys"]))
+
+
 def main() -> None:
     p = argparse.ArgumentParser()
     p.add_argument("--cod-dir", type=Path, required=True)
     p.add_argument("--out-parquet", type=Path, required=True)
     p.add_argument("--out-sqlite", type=Path, required=False)
+    p.add_argument(
+        "--out-dataset",
+        type=Path,
+        required=False,
+        help="Also write a Hive-partitioned dataset (nelements/chemsys) to this directory",
+    )
     p.add_argument("--workers", type=int, default=8)
     p.add_argument("--chunk-size", type=int, default=1000)
     p.add_argument("--dry-run", action="store_true", help="Parse only first chunk and exit")
+    p.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only parse new/changed CIFs and update the existing index (full run if no manifest exists)",
+    )
+    p.add_argument(
+        "--manifest",
+        type=Path,
+        required=False,
+        help="Manifest path (default: <out-parquet>.manifest.parquet)",
+    )
     args = p.parse_args()
 
     files = [str(p) for p in args.cod_dir.rglob("*.cif")]
@@ -80,39 +218,65 @@ def main() -> None:
         print("No CIF files found in", args.cod_dir)
         return
 
-    if args.dry_run:
-        files = files[: args.chunk_size]
+    manifest_path = args.manifest or default_manifest_path(args.out_parquet)
+    incremental = args.incremental and manifest_path.exists() and args.out_parquet.exists()
+    if args.incremental and not incremental:
+        print("No previous index/manifest found; running a full index build")
 
-    tmpdir = Path(tempfile.mkdtemp(prefix="cod_index_"))
-    shards: List[str] = []
-    with ProcessPoolExecutor(max_workers=args.workers) as ex:
-        futures = []
-        for i, chunk in enumerate(chunked(files, args.chunk_size)):
-            out_shard = tmpdir / f"shard_{i}.parquet"
-            futures.append(ex.submit(worker_parse, chunk, str(out_shard)))
-        for fut in tqdm(futures, desc="parsing shards"):
-            try:
-                shard = fut.result()
-                shards.append(shard)
-            except Exception as e:
-                print("Shard failed:", e)
+    if incremental:
+        # Plan against every file on disk; a dry run only limits what is parsed
+        previous_manifest = pd.read_parquet(manifest_path)
+        to_parse, removed, manifest = plan_incremental(files, previous_manifest)
+        print(f"Incremental: {len(to_parse)} new/changed, {len(removed)} removed, {len(manifest)} unchanged")
+        if not to_parse and not removed:
+            write_parquet_atomic(manifest, manifest_path)
+            print("Index is up to date")
+            return
+        if args.dry_run:
+            to_parse = to_parse[: args.chunk_size]
 
-    # merge shards
-    dfs = [pd.read_parquet(s) for s in shards]
-    combined = pd.concat(dfs, ignore_index=True, sort=False)
-    args.out_parquet.parent.mkdir(parents=True, exist_ok=True)
-    combined.to_parquet(args.out_parquet, index=False)
+        parsed, parsed_manifest, failed = parse_files(to_parse, args.workers, args.chunk_size)
+        # Files of failed shards keep their previous rows and manifest entries (if any),
+        # so they are neither lost from the index nor skipped by the next run
+        failed_manifest = previous_manifest[previous_manifest["path"].isin(set(failed))]
+        manifest = pd.concat([manifest, parsed_manifest, failed_manifest[MANIFEST_COLUMNS]], ignore_index=True)
+
+        existing = pd.read_parquet(args.out_parquet)
+        stale = existing["path"].isin(set(removed) | (set(to_parse) - set(failed)))
+        affected = partition_keys(existing[stale]) | partition_keys(parsed)
+        combined = pd.concat([existing[~stale], parsed], ignore_index=True, sort=False)
+    else:
+        if args.dry_run:
+            files = files[: args.chunk_size]
+        combined, manifest, _ = parse_files(files, args.workers, args.chunk_size)
+        affected = None
+
+    add_element_masks(combined)
+    # Index first, manifest last: an interrupted run re-parses the same files next time
+    write_parquet_atomic(combined, args.out_parquet)
     print("Wrote parquet:", args.out_parquet)
 
+    if args.out_dataset:
+        if affected is not None and args.out_dataset.exists():
+            n_parts = update_partitioned_index(combined, args.out_dataset, affected)
+            print(f"Updated partitioned dataset ({n_parts} partitions):", args.out_dataset)
+        else:
+            n_parts = write_partitioned_index(combined, args.out_dataset)
+            print(f"Wrote partitioned dataset ({n_parts} partitions):", args.out_dataset)
+
     if args.out_sqlite:
         import sqlite3
 
         args.out_sqlite.parent.mkdir(parents=True, exist_ok=True)
         conn = sqlite3.connect(str(args.out_sqlite))
-        combined.to_sql("cod_index", conn, if_exists="replace", index=False)
+        # uint64 masks overflow SQLite INTEGER; the loader recomputes them
+        combined.drop(columns=ELEMENT_MASK_COLUMNS).to_sql("cod_index", conn, if_exists="replace", index=False)
         conn.close()
         print("Wrote sqlite:", args.out_sqlite)
 
+    write_parquet_atomic(manifest, manifest_path)
+    print("Wrote manifest:", manifest_path)
+
 
 if __name__ == "__main__":
     main()
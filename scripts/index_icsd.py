@@ -18,6 +18,11 @@ from pymatgen.core import Composition, Structure
 from pymatgen.io.cif import CifParser
 from tqdm import tqdm
 
+try:
+    from database_interface import ELEMENT_MASK_COLUMNS, add_element_masks
+except ImportError:
+    from scripts.database_interface import ELEMENT_MASK_COLUMNS, add_element_masks
+
 
 COMMON_FORMULA_COLS = ["formula", "chemical_formula", "pretty_formula", "formula_pretty", "SumFormula", "SumFormula"]
 
@@ -109,6 +114,7 @@ def main() -> None:
         rows.append(rec)
 
     df_out = pd.DataFrame(rows)
+    add_element_masks(df_out)
     args.out_parquet.parent.mkdir(parents=True, exist_ok=True)
     # try to write parquet, fall back to gzipped JSON if pyarrow/fastparquet not available
     try:
@@ -119,7 +125,7 @@ def main() -> None:
         out_json = args.out_parquet.with_suffix(".json.gz")
         out_json.parent.mkdir(parents=True, exist_ok=True)
         with gzip.open(out_json, "wt", encoding="utf-8") as fp:
-            json.dump(df_out.to_dict(orient="records"), fp, ensure_ascii=False, separators=(",", ":"))
+            json.dump(df_out.drop(columns=ELEMENT_MASK_COLUMNS, errors="ignore").to_dict(orient="records"), fp, ensure_ascii=False, separators=(",", ":"))
         print("Wrote gzipped json fallback:", out_json)
 
     if args.out_sqlite:
@@ -127,7 +133,8 @@ def main() -> None:
 
         args.out_sqlite.parent.mkdir(parents=True, exist_ok=True)
         # sqlite doesn't accept Python lists; serialize list/complex columns to JSON strings
-        df_sql = df_out.copy()
+        # uint64 masks overflow SQLite INTEGER; the loader recomputes them
+        df_sql = df_out.drop(columns=ELEMENT_MASK_COLUMNS, errors="ignore")
         def _serialize(x):
             import pandas as _pd
             # handle NaN-like
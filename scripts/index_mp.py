@@ -28,6 +28,11 @@ from pathlib import Path
 from tqdm import tqdm
 import warnings
 
+try:
+    from database_interface import ELEMENT_MASK_COLUMNS, add_element_masks
+except ImportError:
+    from scripts.database_interface import ELEMENT_MASK_COLUMNS, add_element_masks
+
 # Suppress pymatgen warnings
 warnings.filterwarnings('ignore')
 
@@ -312,6 +317,7 @@ def main():
     output_path.parent.mkdir(parents=True, exist_ok=True)
     
     print(f"\n� Writing index to {output_path}...")
+    add_element_masks(df_index)
     df_index.to_parquet(output_path, index=False)
     print(f"   ✅ Wrote {len(df_index):,} records")
     
@@ -320,7 +326,8 @@ def main():
         print(f"\n💾 Writing SQLite to {args.out_sqlite}...")
         import sqlite3
         conn = sqlite3.connect(args.out_sqlite)
-        df_index.to_sql('mp_index', conn, if_exists='replace', index=False)
+        # uint64 masks overflow SQLite INTEGER; the loader recomputes them
+        df_index.drop(columns=ELEMENT_MASK_COLUMNS).to_sql('mp_index', conn, if_exists='replace', index=False)
         conn.close()
         print(f"   ✅ SQLite export complete")
     
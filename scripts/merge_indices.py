@@ -9,6 +9,11 @@ from pathlib import Path
 
 import pandas as pd
 
+try:
+    from database_interface import ELEMENT_MASK_COLUMNS, add_element_masks, write_partitioned_index
+except ImportError:
+    from scripts.database_interface import ELEMENT_MASK_COLUMNS, add_element_masks, write_partitioned_index
+
 
 def main() -> None:
     p = argparse.ArgumentParser()
@@ -16,6 +21,12 @@ def main() -> None:
     p.add_argument("--out-parquet", type=Path, required=True)
     p.add_argument("--out-json", type=Path, required=False)
     p.add_argument("--out-sqlite", type=Path, required=False)
+    p.add_argument(
+        "--out-dataset",
+        type=Path,
+        required=False,
+        help="Also write a Hive-partitioned dataset (nelements/chemsys) to this directory",
+    )
     args = p.parse_args()
 
     dfs = [pd.read_parquet(pq) for pq in args.parquets]
@@ -51,13 +62,18 @@ def main() -> None:
         merged['elements'] = merged['elements'].apply(
             lambda x: list(x) if isinstance(x, np.ndarray) else (x if isinstance(x, list) else [])
         )
+    add_element_masks(merged)
     
     args.out_parquet.parent.mkdir(parents=True, exist_ok=True)
     merged.to_parquet(args.out_parquet, index=False)
     print("Wrote merged parquet:", args.out_parquet)
 
+    if args.out_dataset:
+        n_parts = write_partitioned_index(merged, args.out_dataset)
+        print(f"Wrote merged partitioned dataset ({n_parts} partitions):", args.out_dataset)
+
     if args.out_json:
-        recs = merged.to_dict(orient="records")
+        recs = merged.drop(columns=ELEMENT_MASK_COLUMNS, errors="ignore").to_dict(orient="records")
         args.out_json.parent.mkdir(parents=True, exist_ok=True)
         with gzip.open(args.out_json, "wt", encoding="utf-8") as fp:
             json.dump(recs, fp, ensure_ascii=False, separators=(",", ":"))
@@ -70,7 +86,8 @@ def main() -> None:
         conn = sqlite3.connect(str(args.out_sqlite))
         
         # Prepare for SQLite: serialize list/dict columns to JSON strings
-        merged_sql = merged.copy()
+        # uint64 masks overflow SQLite INTEGER; the loader recomputes them
+        merged_sql = merged.drop(columns=ELEMENT_MASK_COLUMNS, errors="ignore")
         for col in merged_sql.columns:
             if merged_sql[col].apply(lambda x: isinstance(x, (list, dict))).any():
                 merged_sql[col] = merged_sql[col].apply(
@@ -10,7 +10,13 @@ from pathlib import Path
 # Add scripts directory to path
 sys.path.insert(0, str(Path(__file__).parent))
 
-from database_interface import StructureDatabaseIndex
+from database_interface import (
+    StructureDatabaseIndex,
+    ELEMENT_MASK_COLUMNS,
+    element_bitmask,
+    element_filter_expression,
+    write_partitioned_index,
+)
 from dara_adapter import prepare_phases_for_dara, get_index_stats
 
 
@@ -305,6 +311,318 @@ class TestDataIntegrity:
         assert coverage == 1.0
 
 
+# ============================================================================
+# Test Element Bitmask Filtering (synthetic index, no database files needed)
+# ============================================================================
+
+@pytest.fixture
+def db_synthetic(tmp_path):
+    """Small synthetic index without precomputed mask columns"""
+    import pandas as pd
+    df = pd.DataFrame({
+        'source': ['COD'] * 7,
+        'formula': ['ZnO', 'GeO2', 'Zn2GeO4', 'Fe2O3', 'PbO', 'Og', 'XxO'],
+        'elements': [['O', 'Zn'], ['Ge', 'O'], ['Ge', 'O', 'Zn'], ['Fe', 'O'], ['O', 'Pb'], ['Og'], ['O', 'Xx']],
+    })
+    path = tmp_path / 'synthetic_index.parquet'
+    df.to_parquet(path, index=False)
+    return StructureDatabaseIndex(path)
+
+
+class TestElementBitmask:
+    """Test bitmask-based element filtering"""
+    
+    def test_masks_computed_on_load(self, db_synthetic):
+        """Test mask columns are added to indexes that predate them"""
+        for col in ELEMENT_MASK_COLUMNS:
+            assert str(db_synthetic.df[col].dtype) == 'uint64'
+        lo, hi, unknown = element_bitmask(['Og'])
+        assert (lo, hi, unknown) == (0, 1 << (117 - 64), [])
+        assert int(db_synthetic.df[ELEMENT_MASK_COLUMNS[1]].iloc[5]) == hi
+    
+    def test_required_and_exclude(self, db_synthetic):
+        """Test required/exclude semantics"""
+        result = db_synthetic.filter_by_elements(required=['O'], exclude=['Pb', 'Fe'])
+        assert list(result['formula']) == ['ZnO', 'GeO2', 'Zn2GeO4', 'XxO']
+        assert len(db_synthetic.filter_by_elements(required=['Unobtanium'])) == 0
+    
+    def test_optional(self, db_synthetic):
+        """Test optional requires at least one of the listed elements"""
+        result = db_synthetic.filter_by_elements(required=['O'], optional=['Zn', 'Fe'])
+        assert list(result['formula']) == ['ZnO', 'Zn2GeO4', 'Fe2O3']
+    
+    def test_allowed_chemical_system(self, db_synthetic):
+        """Test allowed selects all subsystems and rejects unknown symbols"""
+        result = db_synthetic.filter_by_elements(allowed=['Ge', 'Zn', 'O'])
+        assert list(result['formula']) == ['ZnO', 'GeO2', 'Zn2GeO4']
+        assert len(db_synthetic.filter_by_elements(allowed=['O'])) == 0
+    
+    def test_unknown_symbols(self, db_synthetic):
+        """Test symbols outside the periodic table match the element lists exactly"""
+        assert list(db_synthetic.filter_by_elements(required=['Xx'])['formula']) == ['XxO']
+        assert list(db_synthetic.filter_by_elements(required=['O', 'Yy'])['formula']) == []
+        assert list(db_synthetic.filter_by_elements(optional=['Xx', 'Pb'])['formula']) == ['PbO', 'XxO']
+        assert list(db_synthetic.filter_by_elements(allowed=['Xx', 'O'])['formula']) == ['XxO']
+        assert list(db_synthetic.filter_by_elements(allowed=['Yy', 'O'])['formula']) == []
+        assert 'XxO' in list(db_synthetic.filter_by_elements(exclude=['Yy'])['formula'])
+        assert 'XxO' not in list(db_synthetic.filter_by_elements(exclude=['Xx'])['formula'])
+    
+    def test_elements_returned_as_lists(self, db_synthetic):
+        """Test filter_by_elements returns the elements column as lists"""
+        result = db_synthetic.filter_by_elements(required=['O'])
+        assert all(isinstance(x, list) for x in result['elements'])
+        assert result['elements'].iloc[0] == ['O', 'Zn']
+    
+    @pytest.mark.parametrize('query', [
+        {'required': ['O'], 'exclude': ['Pb', 'Fe']},
+        {'required': ['O'], 'optional': ['Zn', 'Fe']},
+        {'required': ['Unobtanium']},
+        {'required': ['Xx']},
+        {'optional': ['Xx', 'Pb']},
+        {'allowed': ['Xx', 'O']},
+        {'allowed': ['Yy', 'O']},
+        {'exclude': ['Xx']},
+        {'allowed': ['Ge', 'Zn', 'O'], 'exclude': ['Ge']},
+        {},
+    ])
+    def test_arrow_expression_matches(self, db_synthetic, query):
+        """Test the pushdown expression selects the same rows as filter_by_elements"""
+        import pyarrow as pa
+        table = pa.Table.from_pandas(db_synthetic.df, preserve_index=False)
+        expected = list(db_synthetic.filter_by_elements(**query)['formula'])
+        assert table.filter(element_filter_expression(**query))['formula'].to_pylist() == expected
+
+
+# ============================================================================
+# Test Lazy Query Plan (synthetic index, no database files needed)
+# ============================================================================
+
+@pytest.fixture
+def db_with_cifs(tmp_path):
+    """Synthetic mixed-source index whose paths point at real (empty) CIF files"""
+    import pandas as pd
+    formulas = ['ZnO', 'GeO2', 'Zn2GeO4', 'PbZnO2', 'ZnO2', 'Ge']
+    for f in formulas:
+        (tmp_path / f'{f}.cif').touch()
+    df = pd.DataFrame({
+        'id': range(len(formulas)),
+        'source': ['COD', 'COD', 'ICSD', 'COD', 'MP', 'MP'],
+        'formula': formulas,
+        'elements': [['O', 'Zn'], ['Ge', 'O'], ['Ge', 'O', 'Zn'], ['O', 'Pb', 'Zn'], ['O', 'Zn'], ['Ge']],
+        'density': [5.6, 4.2, 4.8, 7.0, 5.0, 5.3],
+        'experimental_status': [None, None, None, None, 'theoretical', 'experimental'],
+        'energy_above_hull': [None, None, None, None, 0.05, 0.0],
+        'path': [str(tmp_path / f'{f}.cif') for f in formulas],
+    })
+    path = tmp_path / 'index.parquet'
+    df.to_parquet(path, index=False)
+    return StructureDatabaseIndex(path)
+
+
+class TestIndexQuery:
+    """Test composable query plan and filter chaining in dara_adapter"""
+    
+    def test_query_is_lazy_and_immutable(self, db_with_cifs):
+        """Test extending a query does not modify the original"""
+        base = db_with_cifs.query().elements(allowed=['Ge', 'Zn', 'O'])
+        narrowed = base.density(max_val=5.0)
+        assert base.count() == 5
+        assert list(narrowed.execute()['formula']) == ['GeO2', 'Zn2GeO4', 'ZnO2']
+    
+    def test_order_and_limit(self, db_with_cifs):
+        """Test ordering happens before the limit"""
+        result = db_with_cifs.query().order_by('density', ascending=False).limit(2).execute(columns=['formula'])
+        assert list(result.columns) == ['formula']
+        assert list(result['formula']) == ['PbZnO2', 'ZnO']
+    
+    def test_filters_are_chained(self, db_with_cifs):
+        """Test later filters narrow earlier ones instead of restarting from the full index"""
+        phases = prepare_phases_for_dara(
+            index_path=db_with_cifs.index_path,
+            required_elements=['Ge', 'Zn', 'O'],
+            exclude_elements=['Ge'],
+            density_range=(5.0, 8.0),
+            include_theoretical=True,
+        )
+        assert [Path(p).stem for p in phases] == ['ZnO', 'ZnO2']
+    
+    def test_cli_filters_are_chained(self, db_with_cifs, monkeypatch, capsys):
+        """Test the CLI narrows each filter by the previous ones"""
+        from database_interface import main
+        argv = ['database_interface.py', str(db_with_cifs.index_path), '--formula', 'ZnO', '--source', 'MP']
+        monkeypatch.setattr(sys, 'argv', argv)
+        main()
+        assert 'Filtered results: 1 records' in capsys.readouterr().out
+    
+    def test_experimental_default_and_max_phases(self, db_with_cifs):
+        """Test MP theoretical records are dropped by default and max_phases is honored"""
+        phases = prepare_phases_for_dara(index_path=db_with_cifs.index_path, required_elements=['Ge', 'Zn', 'O'])
+        assert 'ZnO2' not in [Path(p).stem for p in phases]
+        limited = prepare_phases_for_dara(
+            index_path=db_with_cifs.index_path,
+            required_elements=['Ge', 'Zn', 'O'],
+            include_theoretical=True,
+            order_by='density',
+            max_phases=2,
+        )
+        assert [Path(p).stem for p in limited] == ['GeO2', 'Zn2GeO4']
+
+
+# ============================================================================
+# Test Partitioned Dataset Layout (synthetic index, no database files needed)
+# ============================================================================
+
+class TestPartitionedIndex:
+    """Test Hive-partitioned index datasets"""
+    
+    @pytest.fixture
+    def dataset(self, db_with_cifs, tmp_path):
+        root = tmp_path / 'dataset'
+        write_partitioned_index(db_with_cifs.df, root, row_group_size=2)
+        return root
+    
+    def test_layout(self, dataset):
+        """Test one partition per (nelements, chemsys)"""
+        parts = sorted(str(p.relative_to(dataset).parent) for p in dataset.rglob('*.parquet'))
+        assert parts == [
+            'nelements=1/chemsys=Ge',
+            'nelements=2/chemsys=Ge-O',
+            'nelements=2/chemsys=O-Zn',
+            'nelements=3/chemsys=Ge-O-Zn',
+            'nelements=3/chemsys=O-Pb-Zn',
+        ]
+    
+    def test_full_read(self, db_with_cifs, dataset):
+        """Test reading the whole dataset returns every record"""
+        db = StructureDatabaseIndex(dataset)
+        assert sorted(db.df['formula']) == sorted(db_with_cifs.df['formula'])
+        assert set(db.df['chemsys']) == {'Ge', 'Ge-O', 'O-Zn', 'Ge-O-Zn', 'O-Pb-Zn'}
+    
+    def test_chemical_system_pruning(self, db_with_cifs, dataset):
+        """Test partition pruning matches the chemical system filter on the monolithic index"""
+        db = StructureDatabaseIndex(dataset, chemical_system=['Zn', 'O'])
+        expected = db_with_cifs.filter_by_elements(allowed=['Zn', 'O'])
+        assert sorted(db.df['formula']) == sorted(expected['formula'])
+        assert len(StructureDatabaseIndex(dataset, chemical_system=['Unobtanium']).df) == 0
+    
+    def test_row_group_filters(self, dataset):
+        """Test density filters are pushed down to the partition files"""
+        db = StructureDatabaseIndex(dataset, chemical_system=['Ge', 'Zn', 'O'], filters=[('density', '>=', 5.0)])
+        assert sorted(db.df['formula']) == ['Ge', 'ZnO', 'ZnO2']
+    
+    def test_rewrite_drops_stale_partitions(self, db_with_cifs, dataset):
+        """Test rewriting with fewer records removes partitions that disappeared"""
+        write_partitioned_index(db_with_cifs.df[db_with_cifs.df['formula'] != 'PbZnO2'], dataset)
+        assert not list(dataset.glob('nelements=3/chemsys=O-Pb-Zn/*.parquet'))
+    
+    def test_prepare_phases_from_dataset(self, db_with_cifs, dataset):
+        """Test dara_adapter reads partitioned datasets"""
+        phases = prepare_phases_for_dara(dataset, required_elements=['Zn', 'O'], include_theoretical=True)
+        assert sorted(Path(p).stem for p in phases) == ['ZnO', 'ZnO2']
+
+
+# ============================================================================
+# Test Incremental Re-indexing (synthetic files, no database files needed)
+# ============================================================================
+
+class TestIncrementalIndexing:
+    """Test manifest-based change detection and partial dataset updates"""
+    
+    def test_plan_incremental(self, tmp_path):
+        """Test only new or content-changed files are scheduled for parsing"""
+        import os
+        import pandas as pd
+        from index_cod_parallel import file_fingerprint, plan_incremental
+        
+        files = {name: tmp_path / f'{name}.cif' for name in ['same', 'touched', 'edited', 'gone']}
+        for name, path in files.items():
+            path.write_text(f'data_{name}\n')
+        manifest = pd.DataFrame([file_fingerprint(str(path)) for path in files.values()])
+        
+        os.utime(files['touched'], ns=(0, 12345))
+        files['edited'].write_text('data_edited_v2\n')
+        files['gone'].unlink()
+        (tmp_path / 'new.cif').write_text('data_new\n')
+        
+        on_disk = sorted(str(path) for path in tmp_path.glob('*.cif'))
+        to_parse, removed, unchanged = plan_incremental(on_disk, manifest)
+        assert sorted(Path(p).stem for p in to_parse) == ['edited', 'new']
+        assert [Path(p).stem for p in removed] == ['gone']
+        assert sorted(Path(p).stem for p in unchanged['path']) == ['same', 'touched']
+        assert unchanged.set_index('path').loc[str(files['touched']), 'mtime_ns'] == 12345
+    
+    @staticmethod
+    def _write_cifs(cod_dir, names):
+        from pymatgen.core import Lattice, Structure
+        cod_dir.mkdir(exist_ok=True)
+        for i, name in enumerate(names):
+            structure = Structure(Lattice.cubic(4.0 + 0.1 * i), ['Na', 'Cl'], [[0, 0, 0], [0.5, 0.5, 0.5]])
+            structure.to(filename=str(cod_dir / f'{name}.cif'))
+    
+    @staticmethod
+    def _run_indexer(monkeypatch, cod_dir, out_parquet, *flags):
+        import index_cod_parallel
+        argv = ['index_cod_parallel.py', '--cod-dir', str(cod_dir), '--out-parquet', str(out_parquet),
+                '--workers', '1', *flags]
+        monkeypatch.setattr(sys, 'argv', argv)
+        index_cod_parallel.main()
+    
+    def test_incremental_dry_run(self, tmp_path, monkeypatch):
+        """Test an incremental dry run plans against every file and only limits what is parsed"""
+        import pandas as pd
+        from index_cod_parallel import default_manifest_path
+        
+        cod_dir, out_parquet = tmp_path / 'cod', tmp_path / 'cod_index.parquet'
+        self._write_cifs(cod_dir, ['a', 'b', 'c'])
+        self._run_indexer(monkeypatch, cod_dir, out_parquet)
+        self._write_cifs(cod_dir, ['a', 'b', 'c', 'd', 'e'])
+        self._run_indexer(monkeypatch, cod_dir, out_parquet, '--incremental', '--dry-run', '--chunk-size', '1')
+        
+        indexed = sorted(pd.read_parquet(out_parquet)['id'])
+        assert indexed[:3] == ['a', 'b', 'c'] and len(indexed) == 4
+        manifest = pd.read_parquet(default_manifest_path(out_parquet))
+        assert sorted(Path(p).stem for p in manifest['path']) == indexed
+    
+    def test_incremental_failed_shard(self, tmp_path, monkeypatch):
+        """Test the files of a failed shard keep their previous rows and manifest entries"""
+        import pandas as pd
+        import index_cod_parallel
+        
+        cod_dir, out_parquet = tmp_path / 'cod', tmp_path / 'cod_index.parquet'
+        self._write_cifs(cod_dir, ['a', 'b'])
+        self._run_indexer(monkeypatch, cod_dir, out_parquet)
+        manifest_path = index_cod_parallel.default_manifest_path(out_parquet)
+        before = pd.read_parquet(manifest_path)
+        
+        (cod_dir / 'a.cif').write_text((cod_dir / 'a.cif').read_text() + '\n')
+        def failed_parse(files, workers, chunk_size):
+            empty_manifest = pd.DataFrame(columns=index_cod_parallel.MANIFEST_COLUMNS)
+            return pd.DataFrame(columns=['path', 'elements']), empty_manifest, list(files)
+        
+        monkeypatch.setattr(index_cod_parallel, 'parse_files', failed_parse)
+        self._run_indexer(monkeypatch, cod_dir, out_parquet, '--incremental')
+        
+        assert sorted(pd.read_parquet(out_parquet)['id']) == ['a', 'b']
+        after = pd.read_parquet(manifest_path).sort_values('path', ignore_index=True)
+        pd.testing.assert_frame_equal(after, before.sort_values('path', ignore_index=True), check_dtype=False)
+    
+    def test_update_partitioned_index(self, db_with_cifs, tmp_path):
+        """Test only affected partitions are rewritten and emptied ones removed"""
+        from database_interface import update_partitioned_index
+        
+        root = tmp_path / 'dataset'
+        df = db_with_cifs.df
+        write_partitioned_index(df, root)
+        untouched = root / 'nelements=2' / 'chemsys=Ge-O' / 'part-0.parquet'
+        before = untouched.stat().st_mtime_ns
+        
+        updated = df[df['formula'] != 'PbZnO2']
+        update_partitioned_index(updated, root, [(3, 'O-Pb-Zn'), (2, 'O-Zn')])
+        assert not (root / 'nelements=3' / 'chemsys=O-Pb-Zn' / 'part-0.parquet').exists()
+        assert untouched.stat().st_mtime_ns == before
+        assert sorted(StructureDatabaseIndex(root).df['formula']) == sorted(updated['formula'])
+
+
 if __name__ == "__main__":
     pytest.main([__file__, '-v', '--tb=short'])
 
@@ -5,6 +5,7 @@ import re
 import subprocess
 import tempfile
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Literal
 
@@ -14,13 +15,12 @@ import pybaselines as pb
 from sklearn.cluster import AgglomerativeClustering
 
 from dara.bgmn.download_bgmn import download_bgmn
-from dara.generate_control_file import (
-    copy_instrument_files,
-    copy_xy_pattern,
-    trim_pattern,
-)
-from dara.utils import get_logger, get_wavelength, intensity_correction
-from dara.xrd import raw2xy, xrdml2xy
+from dara.generate_control_file import copy_instrument_files, trim_pattern
+from dara.utils import get_logger, get_par_peaks, get_wavelength, read_par_file
+from dara.xrd import default_pattern_cache_dir, load_pattern
+
+_PAR_WMIN2_PATTERN = re.compile(r"WMIN2=(\S+)")
+_PAR_WMAX2_PATTERN = re.compile(r"WMAX2=(\S+)")
 
 logger = get_logger(__name__)
 
@@ -57,32 +57,60 @@ class EflechWorker:
         possible_changes: str = None,
         nthreads: int = 8,
         timeout: int = 1800,
+        pattern_cache_dir: Path | None = None,
+        n_workers: int | None = None,
     ) -> pd.DataFrame:
+        """
+        Detect peaks in a pattern with BGMN's teil and eflech.
+
+        Pattern files are converted once into a binary cache (see dara.xrd.load_pattern)
+        and memory-mapped on later calls; the .xy file eflech reads is written only
+        into the temporary working directory.
+
+        The angular ranges computed by teil are refined by independent eflech runs,
+        ``n_workers`` at a time, and their peak lists are merged (see
+        parse_segment_peak_lists).
+
+        Args:
+            pattern: path to the pattern file or an (n, 2) array of 2theta and intensity
+            wavelength: the wavelength (name of the anode or in angstrom)
+            instrument_profile: name or path of the instrument profile
+            show_progress: whether to show eflech's output
+            wmin: the minimum 2theta
+            wmax: the maximum 2theta
+            epsilon: eflech's EPSILON
+            possible_changes: eflech's TEST
+            nthreads: number of threads for eflech
+            timeout: timeout of each BGMN call in seconds
+            pattern_cache_dir: directory of the converted-pattern cache, defaults to
+                dara.xrd.default_pattern_cache_dir()
+            n_workers: number of concurrent eflech runs, defaults to one per CPU (at
+                most one per angular range); 1 runs a single eflech over all ranges
+
+        Returns
+        -------
+            the peak list with columns 2theta, intensity, b1 and b2
+        """
+        if pattern_cache_dir is None:
+            pattern_cache_dir = default_pattern_cache_dir()
+
         with tempfile.TemporaryDirectory() as temp_dir:
             temp_dir = Path(temp_dir)
 
             instrument_name = copy_instrument_files(instrument_profile, temp_dir)
             if isinstance(pattern, np.ndarray):
                 pattern_path_temp = temp_dir / "temp.xy"
-                np.savetxt(pattern_path_temp.as_posix(), pattern, fmt="%.6f")
+                xy_content = np.array(pattern, dtype=float)
             else:
-                if isinstance(pattern, str):
-                    pattern = Path(pattern)
-                if (
-                    pattern.suffix == ".xy"
-                    or pattern.suffix == ".txt"
-                    or pattern.suffix == ".xye"
-                    or pattern.suffix == ".scn"
-                ):
-                    pattern_path_temp = copy_xy_pattern(pattern, temp_dir)
-                elif pattern.suffix == ".xrdml":
-                    pattern_path_temp = xrdml2xy(pattern, temp_dir)
-                elif pattern.suffix == ".raw":
-                    pattern_path_temp = raw2xy(pattern, temp_dir)
-                else:
-                    raise ValueError(f"Unknown pattern file type: {pattern.suffix}")
-
-            xy_content = np.loadtxt(pattern_path_temp, dtype=float)
+                pattern = Path(pattern)
+                pattern_path_temp = temp_dir / pattern.with_suffix(".xy").name
+                data = load_pattern(pattern, cache_dir=pattern_cache_dir)
+                columns = [data.angles, data.intensities]
+                if data.errors is not None:
+                    columns.append(data.errors)
+                xy_content = np.column_stack(columns)
+
+            # the only text copy of the pattern is the one eflech reads
             xy_content = trim_pattern(xy_content)
             np.savetxt(pattern_path_temp, xy_content, fmt="%.6f")
 
@@ -134,15 +162,29 @@ class EflechWorker:
                 )
                 self.patch_control_file_after_teil(control_file_path, ru, xy_content)
 
-            self.run_eflech(
-                control_file_path,
-                mode="eflech",
+            segment_control_files = self.split_control_file(control_file_path)
+            if n_workers is None:
+                n_workers = min(os.cpu_count() or 1, len(segment_control_files))
+
+            if n_workers <= 1 or len(segment_control_files) <= 1:
+                self.run_eflech(
+                    control_file_path,
+                    mode="eflech",
+                    working_dir=temp_dir,
+                    show_progress=show_progress,
+                    timeout=timeout,
+                )
+                return self.parse_peak_list(temp_dir, wavelength=wavelength)
+
+            self.run_eflech_segments(
+                segment_control_files,
                 working_dir=temp_dir,
+                n_workers=n_workers,
+                nthreads=nthreads,
                 show_progress=show_progress,
                 timeout=timeout,
             )
-
-            return self.parse_peak_list(temp_dir, wavelength=wavelength)
+            return self.parse_segment_peak_lists(temp_dir, wavelength=wavelength)
 
     @staticmethod
     def generate_control_file(
@@ -218,6 +260,160 @@ class EflechWorker:
             return cp.stdout.decode()
         return None
 
+    @staticmethod
+    def split_control_file(control_file_path: Path) -> list[Path]:
+        """
+        Write one control file per angular range computed by teil (or dara-teil).
+
+        Each file keeps the global settings and a single range, renumbered to 1, whose
+        OUTPUT (output-<original number>) is unchanged, so all runs can share the
+        working directory.
+
+        Args:
+            control_file_path: the control file patched by teil
+
+        Returns
+        -------
+            the control files, ordered from the widest to the narrowest range
+        """
+        content = control_file_path.read_text()
+        header_end = re.search(
+            r"^%\s*(dara-)?teil has computed", content, flags=re.MULTILINE
+        )
+        constants_start = content.find(
+            "%these constants have been notated by TEIL for internal use"
+        )
+        if header_end is None or constants_start == -1:
+            return []
+
+        header = content[: header_end.start()]
+        constants = re.sub(
+            r"TEILZAHL==\S+", "TEILZAHL==1", content[constants_start:]
+        )
+        segments: dict[int, list[str]] = {}
+        for match in re.finditer(
+            r"^(\w+)\[(\d+)(,\d+)?](==?.*)$",
+            content[header_end.start() : constants_start],
+            flags=re.MULTILINE,
+        ):
+            name, index, value_index, value = match.groups()
+            segments.setdefault(int(index), []).append(
+                f"{name}[1{value_index or ''}]{value}"
+            )
+
+        def width(lines: list[str]) -> float:
+            text = "\n".join(lines)
+            wmin = re.search(r"^WMIN\[1]==(\S+)", text, flags=re.MULTILINE)
+            wmax = re.search(r"^WMAX\[1]==(\S+)", text, flags=re.MULTILINE)
+            return float(wmax.group(1)) - float(wmin.group(1)) if wmin and wmax else 0.0
+
+        paths = []
+        for index, lines in sorted(
+            segments.items(), key=lambda item: width(item[1]), reverse=True
+        ):
+            path = control_file_path.with_name(f"control-{index}.sav")
+            path.write_text(
+                f"{header}% Teil {index}\n" + "\n".join(lines) + f"\n{constants}"
+            )
+            paths.append(path)
+        return paths
+
+    def run_eflech_segments(
+        self,
+        control_file_paths: list[Path],
+        working_dir: Path,
+        n_workers: int,
+        nthreads: int = 8,
+        show_progress: bool = False,
+        timeout: int = 1800,
+    ) -> None:
+        """
+        Run eflech on each angular range's control file, ``n_workers`` at a time.
+
+        The runs are independent subprocesses, so threads are enough to keep
+        ``n_workers`` of them busy. The ``nthreads`` budget is shared between them.
+        """
+        threads_per_run = max(1, nthreads // n_workers)
+        for path in control_file_paths:
+            path.write_text(
+                re.sub(r"NTHREADS=\d+", f"NTHREADS={threads_per_run}", path.read_text())
+            )
+
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            futures = [
+                executor.submit(
+                    self.run_eflech,
+                    path,
+                    mode="eflech",
+                    working_dir=working_dir,
+                    show_progress=show_progress,
+                    timeout=timeout,
+                )
+                for path in control_file_paths
+            ]
+            for future in futures:
+                future.result()
+
+    def parse_segment_peak_lists(
+        self,
+        par_folder: Path,
+        wavelength: Literal["Cu", "Co", "Cr", "Fe", "Mo"] | float,
+        tolerance: float = 0.005,
+    ) -> pd.DataFrame:
+        """
+        Merge the peak lists of separately refined angular ranges.
+
+        Neighbouring ranges overlap (WMIN..WMAX), but each owns only its core range
+        WMIN2..WMAX2, so peaks outside the core are dropped. Peaks that still appear
+        twice at a shared edge (within ``tolerance`` degrees) are kept once, from the
+        range in which they are more intense.
+
+        Args:
+            par_folder: the folder with the output-*.par files
+            wavelength: the wavelength
+            tolerance: the 2theta distance below which peaks of two ranges are the same
+
+        Returns
+        -------
+            the merged peak list with columns 2theta, intensity, b1 and b2
+        """
+        wavelength_float = get_wavelength(wavelength)
+        peak_lists = []
+        for segment, par_file in enumerate(par_folder.glob("output-*.par")):
+            par = read_par_file(par_file)
+            if par is None:
+                continue
+            header, peak_lines = par
+            peaks = get_par_peaks(header, peak_lines, wavelength=wavelength_float)
+            peaks = peaks[peaks[:, 1] > 0]
+            two_theta = np.arcsin(wavelength_float * peaks[:, 0] / 2) * 180 / np.pi * 2
+            peaks = np.column_stack((two_theta, peaks[:, 1:], np.full(len(peaks), segment)))
+
+            wmin2 = _PAR_WMIN2_PATTERN.search(header)
+            wmax2 = _PAR_WMAX2_PATTERN.search(header)
+            if wmin2 is not None and wmax2 is not None:
+                in_core = (peaks[:, 0] >= float(wmin2.group(1)) - tolerance) & (
+                    peaks[:, 0] <= float(wmax2.group(1)) + tolerance
+                )
+                peaks = peaks[in_core]
+            peak_lists.append(peaks)
+
+        peaks = np.vstack(peak_lists) if peak_lists else np.empty((0, 5))
+        peaks = peaks[peaks[:, 0].argsort()]
+
+        # a peak on a shared edge is reported by both ranges; keep the more intense one
+        duplicate = (np.diff(peaks[:, 0]) < tolerance) & (
+            peaks[1:, 4] != peaks[:-1, 4]
+        )
+        first = np.flatnonzero(duplicate)
+        weaker = np.where(peaks[first, 1] >= peaks[first + 1, 1], first + 1, first)
+        keep = np.ones(len(peaks), dtype=bool)
+        keep[weaker] = False
+
+        return pd.DataFrame(
+            peaks[keep, :4], columns=["2theta", "intensity", "b1", "b2"]
+        ).astype(float)
+
     def parse_peak_list(
         self,
         par_folder: Path,
@@ -247,65 +443,13 @@ class EflechWorker:
 
     @staticmethod
     def parse_par_file(par_file: Path, wavelength: float) -> list[list[float]]:
-        content = par_file.read_text().split("\n")
-        peak_list = []
-
-        if len(content) < 2:
-            return peak_list
-
-        peak_num = re.search(r"PEAKZAHL=(\d+)", content[0])
-        pol = re.search(r"POL=(\d+(\.\d+)?)", content[0])
-        pol = float(pol.group(1)) if pol else 1.0
-
-        if not peak_num:
-            return peak_list
-
-        peak_num = int(peak_num.group(1))
-
-        if peak_num == 0:
-            return peak_list
-
-        for i in range(1, peak_num + 1):
-            if i >= len(content):
-                break
-
-            numbers = re.split(r"\s+", content[i])
-
-            if numbers:
-                rp = int(numbers[0])
-                intensity = float(numbers[1])
-                d_inv = float(numbers[2])
-                gsum = (
-                    1.0
-                    if (gsum := re.search("GSUM=(\\d+(\\.\\d+)?)", content[i])) is None
-                    else float(gsum.group(1))
-                )
-                intensity = intensity_correction(
-                    intensity=intensity,
-                    d_inv=d_inv,
-                    gsum=gsum,
-                    wavelength=wavelength,
-                    pol=pol,
-                )
+        par = read_par_file(par_file)
+        if par is None:
+            return []
 
-                if rp == 2:
-                    b1 = 0
-                    b2 = 0
-                elif rp == 3:
-                    b1 = float(numbers[3])
-                    b2 = 0
-                elif rp == 4:
-                    b1 = float(numbers[3])
-                    b2 = float(numbers[4]) ** 2
-                else:
-                    b1 = 0
-                    b2 = 0
-
-                # Only add peaks with intensity > 0
-                if intensity > 0:
-                    peak_list.append([d_inv, intensity, b1, b2])
-
-        return peak_list
+        peaks = get_par_peaks(*par, wavelength=wavelength)
+        # Only add peaks with intensity > 0
+        return peaks[peaks[:, 1] > 0].tolist()
 
     def patch_control_file_after_teil(
         self, control_file_path: Path, ru: int, xy_content: np.ndarray
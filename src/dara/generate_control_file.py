@@ -24,6 +24,22 @@ def copy_instrument_files(instrument_profile: str | Path, working_dir: Path) ->
     -------
         The name of the instrument
     """
+    instrument_path = find_instrument_file(instrument_profile)
+    shutil.copy(instrument_path, working_dir)
+    return instrument_path.stem
+
+
+def find_instrument_file(instrument_profile: str | Path) -> Path:
+    """
+    Find the instrument file (.geq), either at the given path or among the default devices.
+
+    Args:
+        instrument_profile: the name of the instrument or the path to its .geq file
+
+    Returns
+    -------
+        The path to the instrument file
+    """
     default_instrument_path = (
         Path(__file__).parent / "data" / "BGMN-Templates" / "Devices"
     )
@@ -37,9 +53,7 @@ def copy_instrument_files(instrument_profile: str | Path, working_dir: Path) ->
             f"Could not find the instrument file ({instrument_profile} in both "
             f"the provided path and the default path ({default_instrument_path})."
         )
-
-    shutil.copy(instrument_path, working_dir)
-    return instrument_path.stem
+    return instrument_path
 
 
 def copy_xy_pattern(pattern_path: Path, working_dir: Path) -> Path:
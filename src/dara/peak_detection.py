@@ -1,14 +1,95 @@
+"""Detect the peaks in a pattern, with a persistent cache of the results."""
+
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Literal
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Literal
+
+import numpy as np
+import pandas as pd
 
 from dara.eflech_worker import EflechWorker
+from dara.generate_control_file import find_instrument_file
+from dara.scipy_peak_detection import detect_peaks_scipy
+from dara.settings import DaraSettings
+from dara.utils import get_logger
+from dara.xrd import XYFile, default_pattern_cache_dir, load_pattern
+
+logger = get_logger(__name__)
+
+PEAK_LIST_COLUMNS = ["2theta", "intensity", "b1", "b2"]
+
+
+class PeakListCache:
+    """
+    Persistent LRU cache of detect_peaks results.
+
+    Each peak list is stored as ``<key>.npy`` in ``cache_dir``. A hit refreshes the
+    file's modification time, and once more than ``max_entries`` lists are stored
+    the least recently used ones are deleted. Writes are atomic, so several
+    processes can share one cache directory.
+    """
+
+    def __init__(self, cache_dir: Path | None = None, max_entries: int | None = None):
+        settings = DaraSettings()
+        self.cache_dir = Path(cache_dir or settings.PEAK_CACHE_DIR)
+        self.max_entries = max_entries or settings.PEAK_CACHE_MAX_ENTRIES
+
+    @staticmethod
+    def make_key(pattern_hash: str, **params) -> str:
+        """
+        Key of a peak list.
 
-if TYPE_CHECKING:
-    from pathlib import Path
+        Args:
+            pattern_hash: the content hash of the pattern (XRDData.content_hash)
+            params: the detection settings that change the result
 
-    import numpy as np
-    import pandas as pd
+        Returns
+        -------
+            the hex digest identifying the pattern and settings
+        """
+        payload = json.dumps(
+            {"pattern": pattern_hash, **params}, sort_keys=True, default=str
+        )
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> pd.DataFrame | None:
+        path = self.cache_dir / f"{key}.npy"
+        try:
+            peaks = np.load(path)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return pd.DataFrame(peaks, columns=PEAK_LIST_COLUMNS)
+
+    def put(self, key: str, peak_list: pd.DataFrame) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self.cache_dir / f"{key}.npy"
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, peak_list[PEAK_LIST_COLUMNS].to_numpy(dtype=float))
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def clear(self) -> None:
+        for path in self.cache_dir.glob("*.npy"):
+            path.unlink(missing_ok=True)
+
+    def _evict(self) -> None:
+        entries = []
+        for path in self.cache_dir.glob("*.npy"):
+            try:
+                entries.append((path.stat().st_mtime_ns, path))
+            except FileNotFoundError:  # evicted by another process
+                continue
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort()
+        for _, path in entries[: len(entries) - self.max_entries]:
+            path.unlink(missing_ok=True)
 
 
 def detect_peaks(
@@ -22,7 +103,109 @@ def detect_peaks(
     show_progress: bool = False,
     nthreads: int = 8,
     timeout: int = 1800,
+    pattern_cache_dir: Path | None = None,
+    method: Literal["eflech", "scipy"] = "eflech",
+    n_workers: int | None = None,
+    cache: PeakListCache | bool = True,
+) -> pd.DataFrame:
+    """
+    Detect the peaks in a pattern.
+
+    Args:
+        pattern: path to the pattern file or an (n, 2) array of 2theta and intensity
+        wavelength: the wavelength (name of the anode or in nm)
+        instrument_profile: name or path of the instrument profile (eflech only)
+        wmin: the minimum 2theta
+        wmax: the maximum 2theta
+        epsilon: eflech's EPSILON (eflech only)
+        possible_changes: eflech's TEST (eflech only)
+        show_progress: whether to show eflech's output (eflech only)
+        nthreads: number of threads for eflech (eflech only)
+        timeout: timeout of each BGMN call in seconds (eflech only)
+        pattern_cache_dir: directory of the converted-pattern cache
+        method: "eflech" runs BGMN's teil and eflech; "scipy" uses the in-process
+            detector in dara.scipy_peak_detection, which is much faster but does not
+            use the instrument function
+        n_workers: number of concurrent eflech runs over teil's angular ranges,
+            defaults to one per CPU (eflech only)
+        cache: the PeakListCache to look the result up in and store it to; True uses
+            the default cache (DaraSettings.PEAK_CACHE_DIR), False disables caching
+
+    Returns
+    -------
+        the peak list with columns 2theta, intensity, b1 and b2
+    """
+    if pattern_cache_dir is None:
+        pattern_cache_dir = default_pattern_cache_dir()
+    if cache is True:
+        cache = PeakListCache()
+
+    if cache:
+        if isinstance(pattern, np.ndarray):
+            pattern_hash = XYFile(pattern[:, 0], pattern[:, 1]).content_hash
+        else:
+            pattern_hash = load_pattern(pattern, cache_dir=pattern_cache_dir).content_hash
+        key = PeakListCache.make_key(
+            pattern_hash,
+            method=method,
+            wavelength=wavelength,
+            instrument=_instrument_fingerprint(instrument_profile),
+            wmin=wmin,
+            wmax=wmax,
+            epsilon=epsilon,
+            possible_changes=possible_changes,
+        )
+        peak_list = cache.get(key)
+        if peak_list is not None:
+            logger.info("Using cached peak list %s.", key)
+            return peak_list
+
+    peak_list = _detect_peaks(
+        pattern,
+        wavelength=wavelength,
+        instrument_profile=instrument_profile,
+        wmin=wmin,
+        wmax=wmax,
+        epsilon=epsilon,
+        possible_changes=possible_changes,
+        show_progress=show_progress,
+        nthreads=nthreads,
+        timeout=timeout,
+        pattern_cache_dir=pattern_cache_dir,
+        method=method,
+        n_workers=n_workers,
+    )
+    if cache:
+        cache.put(key, peak_list)
+    return peak_list
+
+
+def _detect_peaks(
+    pattern: Path | np.ndarray,
+    wavelength: Literal["Cu", "Co", "Cr", "Fe", "Mo"] | float,
+    instrument_profile: str | Path,
+    wmin: float | None,
+    wmax: float | None,
+    epsilon: float | None,
+    possible_changes: str | None,
+    show_progress: bool,
+    nthreads: int,
+    timeout: int,
+    pattern_cache_dir: Path,
+    method: Literal["eflech", "scipy"],
+    n_workers: int | None,
 ) -> pd.DataFrame:
+    if method == "scipy":
+        return detect_peaks_scipy(
+            pattern,
+            wavelength=wavelength,
+            wmin=wmin,
+            wmax=wmax,
+            pattern_cache_dir=pattern_cache_dir,
+        )
+    if method != "eflech":
+        raise ValueError(f"Unknown peak detection method: {method}")
+
     eflech_worker = EflechWorker()
     return eflech_worker.run_peak_detection(
         pattern=pattern,
@@ -35,4 +218,16 @@ def detect_peaks(
         possible_changes=possible_changes,
         nthreads=nthreads,
         timeout=timeout,
+        pattern_cache_dir=pattern_cache_dir,
+        n_workers=n_workers,
     )
+
+
+def _instrument_fingerprint(instrument_profile: str | Path) -> str:
+    """Name and content hash of the instrument file, so editing a .geq invalidates the cache."""
+    try:
+        instrument_path = find_instrument_file(instrument_profile)
+    except FileNotFoundError:
+        return str(instrument_profile)
+    digest = hashlib.sha1(instrument_path.read_bytes()).hexdigest()
+    return f"{instrument_path.stem}:{digest}"
@@ -74,8 +74,13 @@ def do_refinement(
     phase_params: dict | None = None,
     refinement_params: dict | None = None,
     show_progress: bool = False,
+    slim: bool = False,
 ) -> RefinementResult:
-    """Refine the structure using BGMN."""
+    """Refine the structure using BGMN.
+
+    With ``slim=True`` the raw .lst text and atomic positions are not kept in the
+    result, see :func:`dara.result.get_result`.
+    """
     pattern_path = Path(pattern_path)
     working_dir = (
         Path(working_dir)
@@ -123,7 +128,7 @@ def do_refinement(
 
     bgmn_worker = BGMNWorker()
     bgmn_worker.run_refinement_cmd(control_file_path, show_progress=show_progress)
-    return get_result(control_file_path)
+    return get_result(control_file_path, slim=slim)
 
 
 def do_refinement_no_saving(
@@ -134,6 +139,7 @@ def do_refinement_no_saving(
     phase_params: dict | None = None,
     refinement_params: dict | None = None,
     show_progress: bool = False,
+    slim: bool = False,
 ) -> RefinementResult:
     """Refine the structure using BGMN in a temporary directory without saving."""
     with tempfile.TemporaryDirectory() as tmpdir:
@@ -148,4 +154,5 @@ def do_refinement_no_saving(
             phase_params=phase_params,
             refinement_params=refinement_params,
             show_progress=show_progress,
+            slim=slim,
         )
@@ -2,12 +2,24 @@
 
 from __future__ import annotations
 
+import hashlib
 import re
-from typing import TYPE_CHECKING, Any, Optional, Union
+import threading
+import weakref
+from typing import TYPE_CHECKING, Annotated, Any, Optional, Union
 
 import numpy as np
 import pandas as pd
-from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
+from pydantic import (
+    AfterValidator,
+    BaseModel,
+    BeforeValidator,
+    ConfigDict,
+    Field,
+    PlainSerializer,
+    field_validator,
+    model_validator,
+)
 from pymatgen.core import Composition, Lattice, Structure, get_el_sp
 from pymatgen.symmetry.groups import SpaceGroup
 
@@ -15,13 +27,29 @@ from dara.plot import visualize
 from dara.utils import (
     angular_correction,
     get_number,
+    get_par_peaks,
     get_wavelength,
-    intensity_correction,
+    read_par_file,
 )
 
 if TYPE_CHECKING:
     from pathlib import Path
 
+# .lst header lines and sections
+_LST_PATTERN_NAME = re.compile(r"Rietveld refinement to file\(s\) (.+)")
+_LST_NUM_STEPS = re.compile(r"(\d+) iteration steps")
+_LST_R_VALUE = re.compile(r"([\w-]+)=(\d+(?:\.\d+)?)%")
+_LST_DURBIN_WATSON = re.compile(r"Durbin-Watson d=(\d+(\.\d+)?)")
+_LST_PHASE_SECTION = re.compile(r"Local parameters and GOALs for phase .")
+_LST_PARAMETER = re.compile(r"(\w+)=(.+)")
+
+# .par header and peak fields
+_PAR_EPS1 = re.compile(r"EPS1=(\d+(\.\d+)?)")
+_PAR_EPS2 = re.compile(r"EPS2=([+-]?\d+(\.\d+)?)")
+_PAR_LAMBDA = re.compile(r"LAMBDA=(\S+)")
+_PAR_SYNCHROTRON = re.compile(r"SYNCHROTRON=(\S+)")
+_PAR_PHASE = re.compile(r"PHASE=(\w+)")
+
 
 class PhaseResult(BaseModel):
     """The result for each phase."""
@@ -71,7 +99,8 @@ class PhaseResult(BaseModel):
         if not self.atom_positions_string:
             raise ValueError(
                 "Cannot find the atomic positions from the phase result. "
-                "Please make sure the result is refined using dara >= 0.9.1"
+                "Please make sure the result is refined using dara >= 0.9.1 "
+                "and was not parsed in slim mode."
             )
         # get lattice
         lattice_data = {
@@ -130,11 +159,16 @@ class PhaseResult(BaseModel):
 
 
 class LstResult(BaseModel):
-    """Refinement result parsed from the .lst file."""
+    """
+    Refinement result parsed from the .lst file.
+
+    ``raw_lst`` (and the atomic positions of each phase) is None for results parsed
+    in slim mode.
+    """
 
     model_config = ConfigDict(populate_by_name=True, extra="allow")
 
-    raw_lst: str
+    raw_lst: Optional[str] = None
     pattern_name: str
 
     num_steps: int
@@ -148,16 +182,71 @@ class LstResult(BaseModel):
     phases_results: dict[str, PhaseResult]
 
 
+_SHARED_CURVES: weakref.WeakValueDictionary[str, np.ndarray] = (
+    weakref.WeakValueDictionary()
+)
+_SHARED_CURVES_LOCK = threading.Lock()
+
+
+def to_curve(values) -> np.ndarray:
+    """Convert a curve to a read-only, contiguous float32 array that owns its data."""
+    if (
+        isinstance(values, np.ndarray)
+        and values.dtype == np.float32
+        and values.flags.c_contiguous
+        and not values.flags.writeable
+    ):
+        return values
+    curve = np.array(values, dtype=np.float32)
+    curve.flags.writeable = False
+    return curve
+
+
+def share_curve(curve: np.ndarray) -> np.ndarray:
+    """
+    Return a single shared instance of ``curve``.
+
+    Every refinement of the same pattern has the same x and y_obs, so identical
+    curves are interned (keyed by their content) and only kept once in memory for
+    as long as any result refers to them.
+    """
+    key = hashlib.sha1(curve.tobytes()).hexdigest()
+    with _SHARED_CURVES_LOCK:
+        shared = _SHARED_CURVES.get(key)
+        if shared is None or shared.shape != curve.shape:
+            _SHARED_CURVES[key] = shared = curve
+    return shared
+
+
+Curve = Annotated[
+    np.ndarray,
+    BeforeValidator(to_curve),
+    PlainSerializer(lambda curve: curve.tolist(), return_type=list[float]),
+]
+SharedCurve = Annotated[Curve, AfterValidator(share_curve)]
+
+
 class DiaResult(BaseModel):
-    """Refinement result parsed from the .dia file. Mainly some x-y data for plotting."""
+    """
+    Refinement result parsed from the .dia file. Mainly some x-y data for plotting.
+
+    The curves are stored as read-only float32 arrays; x and y_obs are shared between
+    all results of the same pattern. They are still serialized as lists of floats.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True, populate_by_name=True)
 
-    model_config = ConfigDict(populate_by_name=True)
+    x: SharedCurve
+    y_obs: SharedCurve
+    y_calc: Curve
+    y_bkg: Curve
+    structs: dict[str, Curve]
 
-    x: list[float]
-    y_obs: list[float]
-    y_calc: list[float]
-    y_bkg: list[float]
-    structs: dict[str, list[float]]
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        super().__setstate__(state)
+        # results unpickled from other processes (e.g. ray workers) share x/y_obs too
+        for name in ("x", "y_obs"):
+            self.__dict__[name] = share_curve(to_curve(self.__dict__[name]))
 
 
 class RefinementResult(BaseModel):
@@ -175,6 +264,11 @@ class RefinementResult(BaseModel):
         """Create pandas dataframe from peak data dict."""
         return pd.DataFrame(data)
 
+    @property
+    def is_slim(self) -> bool:
+        """Whether the result was parsed in slim mode, without the raw .lst text."""
+        return self.lst_data.raw_lst is None
+
     def visualize(self, diff_offset=False):
         return visualize(self, diff_offset=diff_offset)
 
@@ -215,11 +309,13 @@ class ParseError(Exception):
     """Error when parsing the result."""
 
 
-def get_result(control_file: Path) -> RefinementResult:
+def get_result(control_file: Path, slim: bool = False) -> RefinementResult:
     """
     Get the result from the refinement.
 
     :param control_file: the path to the control file (.sav)
+    :param slim: whether to drop the raw .lst text and the atomic positions, keeping
+        only the numbers (used for the intermediate results of the phase search)
     """
     # get phase names from sav file first
     # example
@@ -235,7 +331,7 @@ def get_result(control_file: Path) -> RefinementResult:
         par_path = control_file.parent / f"{control_file.stem}.par"
 
         result = {
-            "lst_data": parse_lst(lst_path, phase_names=phase_names),
+            "lst_data": parse_lst(lst_path, phase_names=phase_names, slim=slim),
             "plot_data": parse_dia(dia_path, phase_names=phase_names),
             "peak_data": parse_par(par_path, phase_names=phase_names),
         }
@@ -245,7 +341,9 @@ def get_result(control_file: Path) -> RefinementResult:
         raise ParseError(f"Error in parsing the result from {control_file}") from e
 
 
-def parse_lst(lst_path: Path, phase_names: list[str]) -> LstResult:
+def parse_lst(
+    lst_path: Path, phase_names: list[str], slim: bool = False
+) -> LstResult:
     """
     Get results from the .lst file. This file mainly contains some numbers for the refinement.
 
@@ -307,7 +405,9 @@ def parse_lst(lst_path: Path, phase_names: list[str]) -> LstResult:
           4     0.5000  0.5000  0.5000     E=(O-2(1.0000))
 
     Args:
-        lst_path:
+        lst_path: the path to the .lst file
+        phase_names: the names of the phases, in the order of the control file
+        slim: whether to leave out the raw text and the atomic positions
 
     Returns
     -------
@@ -315,83 +415,102 @@ def parse_lst(lst_path: Path, phase_names: list[str]) -> LstResult:
 
     """
 
-    def parse_values(v_: str) -> float | tuple[float, float] | None | str | int:
-        try:
-            v_ = v_.strip("%")
-            if v_ == "ERROR" or v_ == "UNDEF":
-                return None
-            if "+-" in v_:
-                v_ = (float(v_.split("+-")[0]), float(v_.split("+-")[1]))
-            else:
-                v_ = float(v_)
-                if v_.is_integer():
-                    v_ = int(v_)
-        except ValueError:
-            pass
-        return v_
-
-    def parse_section(text: str) -> dict[str, Any]:
-        section = dict(re.findall(r"^(\w+)=(.+?)$", text, re.MULTILINE))
-        return {k: parse_values(v) for k, v in section.items()}
-
     if not lst_path.exists():
         raise FileNotFoundError(f"Cannot find the .lst file from {lst_path}")
 
     with lst_path.open() as f:
         texts = f.read()
 
-    pattern_name = re.search(r"Rietveld refinement to file\(s\) (.+?)\n", texts).group(
-        1
-    )
-    result = {"raw_lst": texts, "pattern_name": pattern_name}
-
-    num_steps = int(re.search(r"(\d+) iteration steps", texts).group(1))
-    result["num_steps"] = num_steps
-
+    header = {}
+    r_values = {}
+    global_section = None
+    phase_sections = []
+    section = None
+
+    # single pass: the header lines come first, then sections that end at a blank line
+    for line in texts.split("\n"):
+        if section is not None:
+            if line:
+                section.append(line)
+            else:
+                section = None
+        elif _LST_PHASE_SECTION.search(line):
+            section = []
+            phase_sections.append(section)
+        elif global_section is None and line.endswith("Global parameters and GOALs"):
+            section = global_section = []
+        # the pattern file name may contain "=", so the header is matched first
+        elif "pattern_name" not in header and (
+            match := _LST_PATTERN_NAME.search(line)
+        ):
+            header["pattern_name"] = match.group(1)
+        elif "num_steps" not in header and (match := _LST_NUM_STEPS.search(line)):
+            header["num_steps"] = int(match.group(1))
+        elif "=" in line:
+            for key, value in _LST_R_VALUE.findall(line):
+                r_values.setdefault(key, value)
+            if "d" not in header and (match := _LST_DURBIN_WATSON.search(line)):
+                header["d"] = float(match.group(1))
+
+    result = {
+        "raw_lst": None if slim else texts,
+        "pattern_name": header["pattern_name"],
+        "num_steps": header["num_steps"],
+    }
     for var in ["Rp", "Rpb", "R", "Rwp", "Rexp"]:
-        result[var] = float(re.search(rf"{var}=(\d+(\.\d+)?)%", texts).group(1))
-    result["d"] = (
-        float(d.group(1))
-        if (d := re.search(r"Durbin-Watson d=(\d+(\.\d+)?)", texts))
-        else None
-    )
-    result["1-rho"] = (
-        float(rho.group(1))
-        if (rho := re.search(r"1-rho=(\d+(\.\d+)?)%", texts))
-        else None
-    )
+        result[var] = float(r_values[var])
+    result["d"] = header.get("d")
+    result["1-rho"] = float(r_values["1-rho"]) if "1-rho" in r_values else None
 
     # global goals
-    global_parameters_text = re.search(
-        r"Global parameters and GOALs\n(.*?)\n(?:\n|\Z)", texts, re.DOTALL
-    )
-    if global_parameters_text:
-        global_parameters_text = global_parameters_text.group(1)
-        global_parameters = parse_section(global_parameters_text)
-        result.update(global_parameters)
-
-    phases_results = re.findall(
-        r"Local parameters and GOALs for phase .+?\n(.*?)\n(?:\n|\Z)",
-        texts,
-        re.DOTALL,
-    )
+    if global_section is not None:
+        result.update(_parse_lst_section(global_section))
 
-    result["phases_results"] = {
-        phase_name: parse_section(phase_result)
-        for phase_name, phase_result in zip(phase_names, phases_results)
-    }
+    result["phases_results"] = {}
+    for phase_name, phase_section in zip(phase_names, phase_sections):
+        phase_result = _parse_lst_section(phase_section)
+        if not slim:
+            phase_result["atom_positions_string"] = _get_atom_positions(phase_section)
+        result["phases_results"][phase_name] = phase_result
 
-    # add atomic positions
-    for phase_name, phase_result in zip(phase_names, phases_results):
-        atom_section = re.search(
-            r"Atomic positions for phase .+?\n(-+)\n(.*?)$",
-            phase_result,
-            re.DOTALL,
-        ).group(2)
-        result["phases_results"][phase_name]["atom_positions_string"] = atom_section
     return LstResult(**result)
 
 
+def _parse_lst_value(v_: str) -> float | tuple[float, float] | None | str | int:
+    try:
+        v_ = v_.strip("%")
+        if v_ == "ERROR" or v_ == "UNDEF":
+            return None
+        if "+-" in v_:
+            v_ = (float(v_.split("+-")[0]), float(v_.split("+-")[1]))
+        else:
+            v_ = float(v_)
+            if v_.is_integer():
+                v_ = int(v_)
+    except ValueError:
+        pass
+    return v_
+
+
+def _parse_lst_section(lines: list[str]) -> dict[str, Any]:
+    section = {}
+    for line in lines:
+        if match := _LST_PARAMETER.match(line):
+            section[match.group(1)] = match.group(2)
+    return {k: _parse_lst_value(v) for k, v in section.items()}
+
+
+def _get_atom_positions(lines: list[str]) -> str | None:
+    """The lines after the "Atomic positions for phase" heading and its underline."""
+    for i in range(len(lines) - 2):
+        if (
+            lines[i].startswith("Atomic positions for phase ")
+            and lines[i + 1].strip("-") == ""
+        ):
+            return "\n".join(lines[i + 2 :])
+    return None
+
+
 def parse_dia(dia_path: Path, phase_names: list[str]) -> DiaResult:
     """
     Get the results from the .dia file. This file mainly contains curves for the refinement.
@@ -409,15 +528,13 @@ def parse_dia(dia_path: Path, phase_names: list[str]) -> DiaResult:
     # read first line to get the keys
     dia_text = dia_path.read_text().split("\n")
 
-    raw_data = np.loadtxt(dia_text[1:])
+    raw_data = np.loadtxt(dia_text[1:], dtype=np.float32, ndmin=2)
     data = {
-        "x": raw_data[:, 0].tolist(),
-        "y_obs": raw_data[:, 1].tolist(),
-        "y_calc": raw_data[:, 2].tolist(),
-        "y_bkg": raw_data[:, 3].tolist(),
-        "structs": {
-            name: raw_data[:, i + 4].tolist() for i, name in enumerate(phase_names)
-        },
+        "x": raw_data[:, 0],
+        "y_obs": raw_data[:, 1],
+        "y_calc": raw_data[:, 2],
+        "y_bkg": raw_data[:, 3],
+        "structs": {name: raw_data[:, i + 4] for i, name in enumerate(phase_names)},
     }
     return DiaResult(**data)
 
@@ -428,126 +545,76 @@ def parse_par(par_file: Path, phase_names: list[str]) -> pd.DataFrame:
 
     Only work for Cu K alpha!!!
     """
+    columns = {
+        "2theta": float,
+        "intensity": float,
+        "b1": float,
+        "b2": float,
+        "h": int,
+        "k": int,
+        "l": int,
+        "phase": str,
+        "phase_idx": int,
+    }
 
-    def _make_dataframe(peak_list) -> pd.DataFrame:
-        return pd.DataFrame(
-            peak_list,
-            columns=[
-                "2theta",
-                "intensity",
-                "b1",
-                "b2",
-                "h",
-                "k",
-                "l",
-                "phase",
-                "phase_idx",
-            ],
-        ).astype(
-            {
-                "2theta": float,
-                "intensity": float,
-                "b1": float,
-                "b2": float,
-                "h": int,
-                "k": int,
-                "l": int,
-                "phase": str,
-                "phase_idx": int,
-            }
-        )
-
-    content = par_file.read_text().split("\n")
-    peak_list = []
-
-    if len(content) < 2:
-        return _make_dataframe(peak_list)
-
-    peak_num = re.search(r"PEAKZAHL=(\d+)", content[0])
-
-    if not peak_num:
-        return _make_dataframe(peak_list)
+    par = read_par_file(par_file)
+    if par is None:
+        return pd.DataFrame(columns=list(columns)).astype(columns)
+    header, peak_lines = par
 
     # parse some global parameters
-    eps1 = re.search(r"EPS1=(\d+(\.\d+)?)", content[0])
-    eps2 = re.search(r"EPS2=([+-]?\d+(\.\d+)?)", content[0])
-    pol = re.search(r"POL=(\d+(\.\d+)?)", content[0])
-    wavelength = re.search(r"LAMBDA=(\S+)", content[0])
-    if not wavelength:
-        wavelength = re.search(r"SYNCHROTRON=(\S+)", content[0])
+    eps1 = _PAR_EPS1.search(header)
+    eps2 = _PAR_EPS2.search(header)
+    wavelength = _PAR_LAMBDA.search(header) or _PAR_SYNCHROTRON.search(header)
     if not wavelength:
         raise ValueError("Cannot find the wavelength from the .par file")
 
     eps1 = float(eps1.group(1)) if eps1 else 0.0
     eps2 = float(eps2.group(1)) if eps2 else 0.0
-    pol = float(pol.group(1)) if pol else 1.0
     wavelength = get_wavelength(wavelength.group(1))
-    peak_num = int(peak_num.group(1))
+
+    peaks = get_par_peaks(header, peak_lines, wavelength=wavelength)
+    hkl = np.array(
+        [line.rsplit(None, 3)[-3:] for line in peak_lines], dtype=int
+    ).reshape(-1, 3)
+    peak_phases = [_PAR_PHASE.search(line).group(1) for line in peak_lines]
 
     # get the mapping between the peak's phase name to the actual phase name
-    all_peak_phase_names = re.findall(r"PHASE=(\w+)", "\n".join(content))
-    peak_phase_names = list(dict.fromkeys(all_peak_phase_names))
     phase_names_mapping = {
         peak_phase_name: (phase_name, i)
         for i, (peak_phase_name, phase_name) in enumerate(
-            zip(peak_phase_names, phase_names)
+            zip(dict.fromkeys(peak_phases), phase_names)
         )
     }
 
-    for i in range(1, peak_num + 1):
-        if i >= len(content):
-            break
-
-        numbers = re.split(r"\s+", content[i])
-
-        if numbers:
-            rp = int(numbers[0])
-            intensity = float(numbers[1])
-            d_inv = float(numbers[2])
-            gsum = re.search(r"GSUM=(\d+(\.\d+)?)", content[i])
-            gsum = float(gsum.group(1)) if gsum is not None else 1.0
-            intensity = intensity_correction(
-                intensity=intensity,
-                d_inv=d_inv,
-                gsum=gsum,
-                wavelength=wavelength,
-                pol=pol,
-            )
-            if rp == 2:
-                b1 = 0
-                b2 = 0
-            elif rp == 3:
-                b1 = float(numbers[3])
-                b2 = 0
-            elif rp == 4:
-                b1 = float(numbers[3])
-                b2 = float(numbers[4]) ** 2
-            else:
-                b1 = 0
-                b2 = 0
-
-            h = int(numbers[-3])
-            k = int(numbers[-2])
-            l = int(numbers[-1])  # noqa: E741
-
-            phase = re.search(r"PHASE=(\w+)", content[i]).group(1)
-            phase, idx = phase_names_mapping[phase]
-
-            if intensity > 0:
-                peak_list.append([d_inv, intensity, b1, b2, h, k, l, phase, idx])
+    positive = peaks[:, 1] > 0
+    peaks = peaks[positive]
+    hkl = hkl[positive]
+    peak_phases = [
+        phase_names_mapping[phase]
+        for phase, keep in zip(peak_phases, positive)
+        if keep
+    ]
 
     # from d_inv to two theta
-    two_theta = (
-        np.arcsin(wavelength * np.array([p[0] for p in peak_list]) / 2)
-        * 180
-        / np.pi
-        * 2
-    )
+    two_theta = np.arcsin(wavelength * peaks[:, 0] / 2) * 180 / np.pi * 2
 
     # apply eps1 and eps2
     two_theta += angular_correction(two_theta, eps1, eps2)
-    peak_list = [
-        [two_theta[i]] + peak_list[i][1:] for i in range(len(peak_list))  # noqa: RUF005
-    ]
 
-    return _make_dataframe(peak_list)
+    if not len(peaks):
+        return pd.DataFrame(columns=list(columns)).astype(columns)
+    return pd.DataFrame(
+        {
+            "2theta": two_theta,
+            "intensity": peaks[:, 1],
+            "b1": peaks[:, 2],
+            "b2": peaks[:, 3],
+            "h": hkl[:, 0],
+            "k": hkl[:, 1],
+            "l": hkl[:, 2],
+            "phase": pd.array([phase for phase, _ in peak_phases], dtype=str),
+            "phase_idx": np.array([idx for _, idx in peak_phases], dtype=int),
+        }
+    )
+
@@ -0,0 +1,435 @@
+"""Peak detection in NumPy/SciPy, a fast alternative to BGMN's teil/eflech."""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Literal
+
+import numpy as np
+import pandas as pd
+import pybaselines as pb
+from scipy import optimize, signal
+
+from dara.generate_control_file import trim_pattern
+from dara.utils import get_kalpha2_wavelength, get_wavelength
+from dara.xrd import load_pattern
+
+# Kalpha2 / Kalpha1 intensity ratio of a tube source
+KALPHA2_RATIO = 0.5
+
+# profiles are truncated this far (deg) from the peak center
+_MAX_HALF_WINDOW = 1.0
+
+# 4 ln(2), used by the Gaussian part of the pseudo-Voigt profile
+_FOUR_LN2 = 4 * np.log(2)
+
+
+def detect_peaks_scipy(
+    pattern: Path | np.ndarray | str,
+    wavelength: Literal["Cu", "Co", "Cr", "Fe", "Mo"] | float = "Cu",
+    wmin: float = None,
+    wmax: float = None,
+    *,
+    min_snr: float = 3.0,
+    background_window: float = 1.0,
+    refit_rounds: int = 1,
+    pattern_cache_dir: Path | None = None,
+) -> pd.DataFrame:
+    """
+    Detect peaks by background subtraction and a joint pseudo-Voigt fit of all peaks.
+
+    The steps are:
+
+    1. SNIP background with a ``background_window`` (deg) half window;
+    2. candidate peaks from the smoothed, background-subtracted pattern whose
+       prominence exceeds ``min_snr`` times the Poisson noise of the background;
+       candidates at the Kalpha2 position of a stronger peak are dropped;
+    3. a least-squares fit of all peaks, each a Kalpha1/Kalpha2 pseudo-Voigt
+       doublet (a singlet for a numeric wavelength) evaluated only within its own
+       window, with analytic derivatives;
+    4. up to ``refit_rounds`` rounds of adding peaks found in the fit residual
+       (shoulders and overlapped reflections) and refitting.
+
+    The returned table follows ``EflechWorker.parse_peak_list``: Kalpha1 positions,
+    integrated intensities and the Lorentzian broadening ``b1`` in 1/nm (``b2`` is
+    always 0). Unlike eflech, no instrument function is deconvoluted, so ``b1`` is
+    measured relative to the sharpest peaks of the pattern.
+
+    Args:
+        pattern: path to the pattern file or an (n, 2) array of 2theta and intensity
+        wavelength: the wavelength (name of the anode or in nm)
+        wmin: the minimum 2theta
+        wmax: the maximum 2theta
+        min_snr: the minimum peak prominence in units of the background noise
+        background_window: the half window of the SNIP background in degrees
+        refit_rounds: the number of rounds of searching the residual for missed peaks
+        pattern_cache_dir: directory of the converted-pattern cache (see
+            dara.xrd.load_pattern)
+
+    Returns
+    -------
+        the peak list with columns 2theta, intensity, b1 and b2
+    """
+    if isinstance(pattern, np.ndarray):
+        xy_content = np.array(pattern[:, :2], dtype=float)
+    else:
+        data = load_pattern(pattern, cache_dir=pattern_cache_dir)
+        xy_content = np.column_stack((data.angles, data.intensities))
+    xy_content = trim_pattern(xy_content)
+    if wmin is not None:
+        xy_content = xy_content[xy_content[:, 0] >= wmin]
+    if wmax is not None:
+        xy_content = xy_content[xy_content[:, 0] <= wmax]
+
+    x, y = xy_content[:, 0], xy_content[:, 1]
+    wavelength_1 = get_wavelength(wavelength)
+    wavelength_2 = get_kalpha2_wavelength(wavelength)
+    lambda_ratio = wavelength_2 / wavelength_1 if wavelength_2 is not None else None
+
+    step = float(np.median(np.diff(x)))
+    background = pb.Baseline(x).snip(
+        y,
+        max_half_window=max(int(round(background_window / step)), 2),
+        decreasing=True,
+        smooth_half_window=max(int(round(0.05 / step)), 1),
+    )[0]
+    sigma = np.sqrt(np.maximum(y, 1.0))
+    noise = np.sqrt(np.maximum(background, 1.0))
+    smooth_window = max(int(round(0.04 / step)) | 1, 5)
+
+    net = signal.savgol_filter(y - background, smooth_window, 2)
+    centers, heights, widths = _find_candidates(net, x, noise, min_snr, step)
+    centers, heights, widths = _drop_kalpha2_candidates(
+        centers, heights, widths, lambda_ratio
+    )
+
+    params = _initial_params(centers, heights, widths, step)
+    for round_ in range(refit_rounds + 1):
+        if len(params) == 0:
+            break
+        params = _fit_profiles(x, y - background, sigma, params, lambda_ratio, step)
+        params = _drop_insignificant(params, x, noise, min_snr)
+        if round_ == refit_rounds:
+            break
+        residual = y - background - _evaluate(x, params, lambda_ratio, step)
+        residual = signal.savgol_filter(residual, smooth_window, 2)
+        new = _find_candidates(residual, x, sigma, min_snr, step)
+        new = _drop_kalpha2_candidates(*new, lambda_ratio)
+        if len(new[0]) == 0:
+            break
+        params = np.vstack((params, _initial_params(*new, step)))
+
+    # eflech reports the intensity of the whole doublet
+    if lambda_ratio is not None:
+        params[:, 1] *= 1 + KALPHA2_RATIO
+    return _to_peak_list(params, wavelength_1)
+
+
+def _find_candidates(
+    net: np.ndarray, x: np.ndarray, noise: np.ndarray, min_snr: float, step: float
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Local maxima of ``net`` that stand ``min_snr`` noise levels above their surroundings."""
+    indices, properties = signal.find_peaks(
+        net,
+        height=min_snr * noise,
+        prominence=min_snr * noise,
+        width=1,
+    )
+    return x[indices], net[indices], np.maximum(properties["widths"] * step, step)
+
+
+def _drop_kalpha2_candidates(
+    centers: np.ndarray,
+    heights: np.ndarray,
+    widths: np.ndarray,
+    lambda_ratio: float | None,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Drop candidates that sit at the Kalpha2 position of a stronger candidate."""
+    if lambda_ratio is None or len(centers) < 2:
+        return centers, heights, widths
+    alpha2 = _kalpha2_position(centers, lambda_ratio)
+    # nearest candidate to each predicted Kalpha2 position
+    nearest = _nearest(centers, alpha2)
+    is_alpha2 = (
+        (np.abs(centers[nearest] - alpha2) < 0.5 * widths)
+        & (nearest != np.arange(len(centers)))
+        & (heights[nearest] < 0.8 * heights)
+    )
+    keep = np.ones(len(centers), dtype=bool)
+    keep[nearest[is_alpha2]] = False
+    return centers[keep], heights[keep], widths[keep]
+
+
+def _drop_insignificant(
+    params: np.ndarray, x: np.ndarray, noise: np.ndarray, min_snr: float
+) -> np.ndarray:
+    """
+    Drop fitted peaks below ``min_snr`` times the background noise, and noise spikes
+    that are much sharper than the typical peak (the instrument sets a minimum width).
+    """
+    if len(params) == 0:
+        return params
+    _, area, fwhm, eta = params.T
+    height = area * (
+        eta * 2 / (np.pi * fwhm) + (1 - eta) * np.sqrt(_FOUR_LN2 / np.pi) / fwhm
+    )
+    noise_at_peak = np.interp(params[:, 0], x, noise)
+    keep = (height >= min_snr * noise_at_peak) & (fwhm >= 0.4 * np.median(fwhm))
+    return params[keep]
+
+
+def _kalpha2_position(two_theta: np.ndarray, lambda_ratio: float) -> np.ndarray:
+    sin_theta = np.clip(np.sin(np.radians(two_theta) / 2) * lambda_ratio, -1.0, 1.0)
+    return np.degrees(np.arcsin(sin_theta)) * 2
+
+
+def _initial_params(
+    centers: np.ndarray, heights: np.ndarray, widths: np.ndarray, step: float
+) -> np.ndarray:
+    """(n, 4) array of center, area, FWHM and Lorentzian fraction."""
+    widths = np.clip(widths, 2 * step, 0.5)
+    areas = np.maximum(heights, 0) * widths * 1.2
+    return np.column_stack((centers, areas, widths, np.full(len(centers), 0.5)))
+
+
+def _windows(
+    x: np.ndarray, params: np.ndarray, lambda_ratio: float | None, step: float
+) -> tuple[np.ndarray, np.ndarray]:
+    """Index matrix of the points each peak is evaluated on, and its validity mask."""
+    centers, _, widths, _ = params.T
+    upper = centers if lambda_ratio is None else _kalpha2_position(centers, lambda_ratio)
+    half_width = np.minimum(4 * widths, _MAX_HALF_WINDOW)
+    start = np.searchsorted(x, centers - half_width)
+    stop = np.searchsorted(x, upper + half_width)
+    length = max(int((stop - start).max()), 1)
+    indices = start[:, None] + np.arange(length)[None, :]
+    valid = indices < stop[:, None]
+    return np.minimum(indices, len(x) - 1), valid
+
+
+def _pseudo_voigt(
+    x: np.ndarray, center: np.ndarray, fwhm: np.ndarray, eta: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Area-normalised pseudo-Voigt profile and its analytic derivatives.
+
+    Returns
+    -------
+        the profile and its derivatives with respect to center, FWHM and eta
+    """
+    z = (x - center) / fwhm
+    gaussian = np.sqrt(_FOUR_LN2 / np.pi) / fwhm * np.exp(-_FOUR_LN2 * z**2)
+    lorentz_denominator = 1 + 4 * z**2
+    lorentzian = 2 / (np.pi * fwhm) / lorentz_denominator
+    profile = eta * lorentzian + (1 - eta) * gaussian
+
+    d_center = (
+        eta * lorentzian * 8 * z / lorentz_denominator
+        + (1 - eta) * gaussian * 2 * _FOUR_LN2 * z
+    ) / fwhm
+    d_fwhm = (
+        eta * lorentzian * (8 * z**2 / lorentz_denominator - 1)
+        + (1 - eta) * gaussian * (2 * _FOUR_LN2 * z**2 - 1)
+    ) / fwhm
+    return profile, d_center, d_fwhm, lorentzian - gaussian
+
+
+def _doublet(
+    xs: np.ndarray, params: np.ndarray, lambda_ratio: float | None
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Evaluate every peak on its window.
+
+    Returns
+    -------
+        the (n_peaks, window) values and the (4, n_peaks, window) derivatives
+        with respect to center, area, FWHM and eta
+    """
+    center, area, fwhm, eta = (p[:, None] for p in params.T)
+    profile, d_center, d_fwhm, d_eta = _pseudo_voigt(xs, center, fwhm, eta)
+    if lambda_ratio is not None:
+        center_2 = _kalpha2_position(center, lambda_ratio)
+        profile_2, d_center_2, d_fwhm_2, d_eta_2 = _pseudo_voigt(xs, center_2, fwhm, eta)
+        # d(2theta_2) / d(2theta_1) = ratio * cos(theta_1) / cos(theta_2)
+        d_center_2_d_center = (
+            lambda_ratio
+            * np.cos(np.radians(center) / 2)
+            / np.cos(np.radians(center_2) / 2)
+        )
+        profile = profile + KALPHA2_RATIO * profile_2
+        d_center = d_center + KALPHA2_RATIO * d_center_2 * d_center_2_d_center
+        d_fwhm = d_fwhm + KALPHA2_RATIO * d_fwhm_2
+        d_eta = d_eta + KALPHA2_RATIO * d_eta_2
+    jacobian = np.stack((area * d_center, profile, area * d_fwhm, area * d_eta))
+    return area * profile, jacobian
+
+
+def _evaluate(
+    x: np.ndarray,
+    params: np.ndarray,
+    lambda_ratio: float | None,
+    step: float,
+    windows: tuple[np.ndarray, np.ndarray] | None = None,
+) -> np.ndarray:
+    indices, valid = windows or _windows(x, params, lambda_ratio, step)
+    values, _ = _doublet(x[indices], params, lambda_ratio)
+    return np.bincount(indices[valid], weights=values[valid], minlength=len(x))
+
+
+def _fit_profiles(
+    x: np.ndarray,
+    net: np.ndarray,
+    sigma: np.ndarray,
+    params: np.ndarray,
+    lambda_ratio: float | None,
+    step: float,
+) -> np.ndarray:
+    """
+    Fit all peaks, one least-squares problem per cluster of peaks whose windows overlap.
+
+    Clusters are independent, so each is fitted with a small dense analytic Jacobian
+    instead of one large, badly conditioned sparse problem over the whole pattern.
+    """
+    params = params[np.argsort(params[:, 0])]
+    indices, valid = _windows(x, params, lambda_ratio, step)
+    stop = np.where(valid, indices, 0).max(axis=1)
+    breaks = np.flatnonzero(indices[1:, 0] > np.maximum.accumulate(stop)[:-1]) + 1
+    fitted = [
+        _fit_cluster(x, net, sigma, params[cluster], lambda_ratio, step)
+        for cluster in np.split(np.arange(len(params)), breaks)
+    ]
+    params = np.vstack(fitted)
+    return params[params[:, 1] > 0]
+
+
+def _fit_cluster(
+    x: np.ndarray,
+    net: np.ndarray,
+    sigma: np.ndarray,
+    params: np.ndarray,
+    lambda_ratio: float | None,
+    step: float,
+) -> np.ndarray:
+    n_peaks = len(params)
+    indices, valid = _windows(x, params, lambda_ratio, step)
+    fitted = np.unique(indices[valid])
+    rows = np.searchsorted(fitted, indices[valid])
+    peaks = np.broadcast_to(np.arange(n_peaks)[:, None], indices.shape)[valid]
+    weights = 1 / sigma[indices][valid]
+
+    centers, areas, widths, _ = params.T
+    lower = np.concatenate(
+        (centers - 0.5 * widths, np.zeros(n_peaks), np.full(n_peaks, 2 * step), np.zeros(n_peaks))
+    )
+    upper = np.concatenate(
+        (
+            centers + 0.5 * widths,
+            np.maximum(areas, 1.0) * 20,
+            widths * 4,
+            np.ones(n_peaks),
+        )
+    )
+    start = np.clip(params.T.ravel(), lower, upper)
+
+    def residuals(flat: np.ndarray) -> np.ndarray:
+        values, _ = _doublet(x[indices], flat.reshape(4, -1).T, lambda_ratio)
+        model = np.bincount(rows, weights=values[valid], minlength=len(fitted))
+        return (net[fitted] - model) / sigma[fitted]
+
+    def jacobian(flat: np.ndarray) -> np.ndarray:
+        _, derivatives = _doublet(x[indices], flat.reshape(4, -1).T, lambda_ratio)
+        jac = np.zeros((len(fitted), 4 * n_peaks))
+        for k in range(4):
+            jac[rows, peaks + k * n_peaks] = -derivatives[k][valid] * weights
+        return jac
+
+    result = optimize.least_squares(
+        residuals,
+        start,
+        jac=jacobian,
+        bounds=(lower, upper),
+        x_scale="jac",
+        max_nfev=100,
+    )
+    return result.x.reshape(4, -1).T
+
+
+def _to_peak_list(params: np.ndarray, wavelength: float) -> pd.DataFrame:
+    if len(params) == 0:
+        return pd.DataFrame(columns=["2theta", "intensity", "b1", "b2"], dtype=float)
+    params = params[np.argsort(params[:, 0])]
+    two_theta, area, fwhm, eta = params.T
+    cos_theta = np.cos(np.radians(two_theta) / 2)
+    # Lorentzian FWHM in reciprocal space (1/nm), in excess of the sharpest peaks
+    lorentz_d_inv = eta * np.radians(fwhm) * cos_theta / wavelength
+    b1 = np.maximum(lorentz_d_inv - np.percentile(lorentz_d_inv, 10), 0)
+    return pd.DataFrame(
+        {"2theta": two_theta, "intensity": area, "b1": b1, "b2": np.zeros(len(params))}
+    ).astype(float)
+
+
+def compare_peak_lists(
+    reference: pd.DataFrame, peaks: pd.DataFrame, tolerance: float = 0.05
+) -> dict[str, float]:
+    """
+    Compare a peak list against a reference (e.g. eflech) peak list.
+
+    A peak matches when the nearest peak of the other list is within ``tolerance``
+    degrees 2theta.
+
+    Args:
+        reference: the reference peak list
+        peaks: the peak list to evaluate
+        tolerance: the maximum 2theta difference of matching peaks
+
+    Returns
+    -------
+        the number of peaks in both lists, the recall (also weighted by reference
+        intensity), the precision, the median 2theta error and the median intensity
+        ratio of the matched peaks
+    """
+    reference = reference.sort_values("2theta")
+    peaks = peaks.sort_values("2theta")
+    reference_two_theta = reference["2theta"].to_numpy()
+    reference_intensity = reference["intensity"].to_numpy()
+    two_theta = peaks["2theta"].to_numpy()
+    intensity = peaks["intensity"].to_numpy()
+    if len(reference_two_theta) == 0 or len(two_theta) == 0:
+        return {
+            "n_reference": len(reference_two_theta),
+            "n_peaks": len(two_theta),
+            "recall": 0.0,
+            "weighted_recall": 0.0,
+            "precision": 0.0,
+            "median_2theta_error": np.nan,
+            "median_intensity_ratio": np.nan,
+        }
+
+    nearest = _nearest(two_theta, reference_two_theta)
+    error = np.abs(two_theta[nearest] - reference_two_theta)
+    matched = error < tolerance
+    reverse = _nearest(reference_two_theta, two_theta)
+    precision = np.mean(np.abs(reference_two_theta[reverse] - two_theta) < tolerance)
+    ratio = intensity[nearest][matched] / reference_intensity[matched]
+    return {
+        "n_reference": len(reference_two_theta),
+        "n_peaks": len(two_theta),
+        "recall": float(matched.mean()),
+        "weighted_recall": float(
+            reference_intensity[matched].sum() / reference_intensity.sum()
+        ),
+        "precision": float(precision),
+        "median_2theta_error": float(np.median(error[matched])) if matched.any() else np.nan,
+        "median_intensity_ratio": float(np.median(ratio)) if matched.any() else np.nan,
+    }
+
+
+def _nearest(sorted_values: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    """Index of the nearest element of the (non-empty) ``sorted_values`` for each query."""
+    index = np.clip(np.searchsorted(sorted_values, queries), 1, len(sorted_values) - 1)
+    if len(sorted_values) == 1:
+        return np.zeros(len(queries), dtype=int)
+    closer_left = np.abs(sorted_values[index - 1] - queries) < np.abs(
+        sorted_values[index] - queries
+    )
+    return index - closer_left
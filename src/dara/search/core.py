@@ -9,6 +9,7 @@ from typing import TYPE_CHECKING, Literal
 
 import ray
 
+from dara.search.progress import emit_progress, get_progress_sink
 from dara.search.tree import BaseSearchTree, SearchTree
 from dara.utils import get_logger
 
@@ -19,6 +20,7 @@ if TYPE_CHECKING:
 
     from dara.refine import RefinementPhase
     from dara.search.data_model import SearchResult
+    from dara.search.progress import ProgressSink
 
 DEFAULT_PHASE_PARAMS = {
     "gewicht": "0_0",
@@ -42,9 +44,12 @@ def _remote_expand_node(search_tree: BaseSearchTree) -> BaseSearchTree:
         raise e
 
 
-def remote_expand_node(search_tree: SearchTree, nid: str) -> ray.ObjectRef:
-    """Expand a node in the search tree."""
+def remote_expand_node(
+    search_tree: SearchTree, nid: str, max_refinements: int | None = None
+) -> ray.ObjectRef:
+    """Expand a node in the search tree, with at most ``max_refinements`` refinements in flight."""
     subtree = BaseSearchTree.from_search_tree(root_nid=nid, search_tree=search_tree)
+    subtree.max_refinements = max_refinements
     return _remote_expand_node.remote(subtree)
 
 
@@ -61,6 +66,10 @@ def search_phases(
     return_search_tree: bool = False,
     record_peak_matcher_scores: bool = False,
     rpb_threshold: float = 2,
+    peak_detection_method: Literal["eflech", "scipy"] = "eflech",
+    slim_results: bool = True,
+    max_workers: int | None = None,
+    progress: ProgressSink | None = None,
 ) -> list[SearchResult] | SearchTree:
     """
     Search for the best phases to use for refinement.
@@ -81,6 +90,15 @@ def search_phases(
         record_peak_matcher_scores: whether to record the peak matcher scores. This is mainly used for
             debugging purposes.
         rpb_threshold: the RPB threshold
+        peak_detection_method: "eflech" (BGMN) or "scipy" (the faster in-process detector)
+        slim_results: whether to drop the raw .lst text and atomic positions from the intermediate
+            refinement results; the final results are refined again to get them back
+        max_workers: the maximum number of refinements running at the same time. Up to this many
+            nodes are expanded at once, each refining one candidate at a time. Defaults to expanding as
+            many nodes as there are CPUs in the Ray cluster, without limiting the refinements; set it to
+            share the cluster between concurrent searches.
+        progress: a callable or queue receiving SearchProgressEvent objects (see dara.search.progress)
+            as the search advances. Defaults to the sink installed with report_progress_to, if any.
     """
     if phase_params is None:
         phase_params = {}
@@ -95,6 +113,7 @@ def search_phases(
     except Exception as e:
         logger.warning(f"Failed to initialize Ray ({e}), will use serial processing instead")
 
+    progress = get_progress_sink(progress)
     phase_params = {**DEFAULT_PHASE_PARAMS, **phase_params}
     refinement_params = {**DEFAULT_REFINEMENT_PARAMS, **refinement_params}
 
@@ -111,11 +130,20 @@ def search_phases(
         max_phases=max_phases,
         rpb_threshold=rpb_threshold,
         record_peak_matcher_scores=record_peak_matcher_scores,
+        peak_detection_method=peak_detection_method,
+        slim_results=slim_results,
+        max_refinements=max_workers,
+        progress=progress,
     )
 
-    max_worker = ray.cluster_resources()["CPU"]
-    pending = [remote_expand_node(search_tree, search_tree.root)]
+    max_worker = max_workers or ray.cluster_resources()["CPU"]
+    # with a quota, every expansion refines one candidate at a time, so the
+    # concurrent expansions never run more than max_workers refinements
+    expansion_refinements = 1 if max_workers else None
+    pending = [remote_expand_node(search_tree, search_tree.root, max_workers)]
     to_be_submitted = deque()
+    nodes_expanded = 0
+    best_rpb = float("inf")
 
     while pending:
         done, pending = ray.wait(pending, timeout=0.5)
@@ -129,9 +157,32 @@ def search_phases(
             for nid in search_tree.get_expandable_children(remote_search_tree.root):
                 to_be_submitted.append(nid)
 
+            if progress is not None:
+                nodes_expanded += 1
+                emit_progress(
+                    progress,
+                    "node_expanded",
+                    nodes_expanded=nodes_expanded,
+                    nodes_pending=len(pending) + len(to_be_submitted),
+                )
+                results = [
+                    node.data.current_result
+                    for node in remote_search_tree.all_nodes_itr()
+                    if node.data.current_result is not None
+                ]
+                best = min(results, key=lambda r: r.lst_data.rpb, default=None)
+                if best is not None and best.lst_data.rpb < best_rpb:
+                    best_rpb = best.lst_data.rpb
+                    emit_progress(
+                        progress,
+                        "best_rpb",
+                        best_rpb=best_rpb,
+                        best_rwp=best.lst_data.rwp,
+                    )
+
         while len(pending) < max_worker and to_be_submitted:
             nid = to_be_submitted.popleft()
-            pending.append(remote_expand_node(search_tree, nid))
+            pending.append(remote_expand_node(search_tree, nid, expansion_refinements))
 
     if not return_search_tree:
         return search_tree.get_search_results()
@@ -0,0 +1,125 @@
+"""Structured progress events reported by the phase search."""
+
+from __future__ import annotations
+
+import queue
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator, Literal, Optional, Union
+
+from pydantic import BaseModel
+
+from dara.utils import get_logger
+
+logger = get_logger(__name__)
+
+
+class SearchProgressEvent(BaseModel):
+    """
+    A progress event of search_phases.
+
+    Only the fields that belong to the event's ``kind`` are set:
+
+    - ``peaks_detected``: ``num_peaks``
+    - ``candidates_refined``: ``refinements_done`` out of ``refinements_total``
+      single-phase refinements of the candidate phases have finished
+    - ``node_expanded``: ``nodes_expanded`` nodes are done, ``nodes_pending`` are
+      running or queued
+    - ``best_rpb``: a node improved the best result so far to ``best_rpb``
+      (with ``best_rwp``)
+    """
+
+    kind: Literal["peaks_detected", "candidates_refined", "node_expanded", "best_rpb"]
+    num_peaks: Optional[int] = None
+    refinements_done: Optional[int] = None
+    refinements_total: Optional[int] = None
+    nodes_expanded: Optional[int] = None
+    nodes_pending: Optional[int] = None
+    best_rpb: Optional[float] = None
+    best_rwp: Optional[float] = None
+
+
+ProgressSink = Union[Callable[[SearchProgressEvent], None], queue.Queue]
+
+_current_sink: ContextVar[Optional[ProgressSink]] = ContextVar(
+    "dara_search_progress_sink", default=None
+)
+
+
+@contextmanager
+def report_progress_to(sink: ProgressSink) -> Iterator[None]:
+    """
+    Send the progress of every search_phases call made in this context to ``sink``.
+
+    This is for callers that cannot pass the sink to search_phases directly,
+    e.g. when the search runs inside a serialized jobflow job.
+    """
+    token = _current_sink.set(sink)
+    try:
+        yield
+    finally:
+        _current_sink.reset(token)
+
+
+def get_progress_sink(sink: ProgressSink | None = None) -> ProgressSink | None:
+    """Return ``sink``, or the one installed with report_progress_to if it is None."""
+    return sink if sink is not None else _current_sink.get()
+
+
+def emit_progress(sink: ProgressSink | None, kind: str, **fields) -> None:
+    """
+    Send an event to a callback or queue sink. A failing sink never fails the search.
+
+    Args:
+        sink: a callable taking a SearchProgressEvent, a queue, or None to do nothing
+        kind: the kind of the event
+        **fields: the fields of the event
+    """
+    if sink is None:
+        return
+    event = SearchProgressEvent(kind=kind, **fields)
+    try:
+        if isinstance(sink, queue.Queue):
+            sink.put_nowait(event)
+        else:
+            sink(event)
+    except Exception as e:
+        logger.warning(f"Failed to report search progress ({e})")
+
+
+class ThrottledProgress:
+    """
+    A progress sink that folds events into one progress state and forwards the state
+    at most every ``min_interval`` seconds, e.g. to a job store.
+
+    Args:
+        callback: called with the progress state, a dict of the latest value of every
+            event field plus ``stage``, the kind of the latest event
+        min_interval: the minimum time in seconds between two calls of ``callback``
+    """
+
+    def __init__(self, callback: Callable[[dict[str, Any]], None], min_interval: float = 1.0):
+        self.callback = callback
+        self.min_interval = min_interval
+        self.state: dict[str, Any] = {}
+        self._last_forwarded: float | None = None
+        self._dirty = False
+
+    def __call__(self, event: SearchProgressEvent) -> None:
+        self.state.update(event.model_dump(exclude={"kind"}, exclude_none=True))
+        self.state["stage"] = event.kind
+        self._dirty = True
+        now = time.monotonic()
+        if self._last_forwarded is None or now - self._last_forwarded >= self.min_interval:
+            self._forward(now)
+
+    def flush(self) -> None:
+        """Forward the current state if it changed since it was last forwarded."""
+        if self._dirty:
+            self._forward(time.monotonic())
+
+    def _forward(self, now: float) -> None:
+        self._dirty = False
+        self._last_forwarded = now
+        self.callback(dict(self.state))
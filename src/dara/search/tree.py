@@ -5,7 +5,7 @@ from itertools import zip_longest
 from numbers import Number
 from pathlib import Path
 from subprocess import TimeoutExpired
-from typing import TYPE_CHECKING, Literal
+from typing import TYPE_CHECKING, Callable, Literal
 
 import jenkspy
 import numpy as np
@@ -20,12 +20,14 @@ from dara.peak_detection import detect_peaks
 from dara.refine import RefinementPhase
 from dara.search.data_model import SearchNodeData, SearchResult
 from dara.search.peak_matcher import PeakMatcher
+from dara.search.progress import emit_progress
 from dara.utils import (
     find_optimal_intensity_threshold,
     find_optimal_score_threshold,
     get_logger,
     get_number,
     get_optimal_max_two_theta,
+    leave_one_out_rpb,
     load_symmetrized_structure,
     parse_refinement_param,
     rpb,
@@ -33,6 +35,7 @@ from dara.utils import (
 
 if TYPE_CHECKING:
     from dara.result import RefinementResult
+    from dara.search.progress import ProgressSink
 
 
 logger = get_logger(__name__, level="INFO")
@@ -46,6 +49,7 @@ def remote_do_refinement_no_saving(
     instrument_profile: str | Path,
     phase_params: dict[str, ...] | None,
     refinement_params: dict[str, float] | None,
+    slim: bool = False,
 ) -> RefinementResult | None:
     """
     Perform the actual refinement in the remote process.
@@ -62,6 +66,7 @@ def remote_do_refinement_no_saving(
             instrument_profile=instrument_profile,
             phase_params=phase_params,
             refinement_params=refinement_params,
+            slim=slim,
         )
     except (RuntimeError, TimeoutExpired, CIF2StrError) as e:
         logger.debug(f"Refinement failed for {cif_paths}, the reason is {e}")
@@ -123,23 +128,42 @@ def batch_refinement(
     instrument_profile: str | Path = "Aeris-fds-Pixcel1d-Medipix3",
     phase_params: dict[str, ...] | None = None,
     refinement_params: dict[str, float] | None = None,
+    slim: bool = False,
+    callback: Callable[[int, int], None] | None = None,
+    max_in_flight: int | None = None,
 ) -> list[RefinementResult]:
+    # callback, if given, is called with (number done, total) after every refinement;
+    # max_in_flight, if given, caps the number of refinement tasks submitted at once
     # Try using Ray for parallel processing
     try:
         if not ray.is_initialized():
             raise RuntimeError("Ray not initialized, falling back to serial processing")
-        
-        handles = [
-            remote_do_refinement_no_saving.remote(
+
+        handles = []
+        in_flight = []
+
+        def wait_for_one():
+            nonlocal in_flight
+            _, in_flight = ray.wait(in_flight)
+            if callback is not None:
+                callback(len(handles) - len(in_flight), len(cif_paths))
+
+        for cif_path_list in cif_paths:
+            if max_in_flight is not None and len(in_flight) >= max_in_flight:
+                wait_for_one()
+            handle = remote_do_refinement_no_saving.remote(
                 pattern_path,
-                cif_paths,
+                cif_path_list,
                 wavelength=wavelength,
                 instrument_profile=instrument_profile,
                 phase_params=phase_params,
                 refinement_params=refinement_params,
+                slim=slim,
             )
-            for cif_paths in cif_paths
-        ]
+            handles.append(handle)
+            in_flight.append(handle)
+        while callback is not None and in_flight:
+            wait_for_one()
         return ray.get(handles)
     except (ray.exceptions.RaySystemError, ray.exceptions.LocalRayletDiedError, RuntimeError) as e:
         # Fallback to serial processing if Ray fails
@@ -153,8 +177,11 @@ def batch_refinement(
                 instrument_profile=instrument_profile,
                 phase_params=phase_params,
                 refinement_params=refinement_params,
+                slim=slim,
             )
             results.append(result)
+            if callback is not None:
+                callback(len(results), len(cif_paths))
         return results
 
 
@@ -315,28 +342,32 @@ def remove_unnecessary_phases(
     Remove unnecessary phases from the result.
 
     If a phase cannot cause increase in RWP, it will be removed.
+
+    The RPB without each phase is computed for all phases at once from the stacked
+    per-phase curves.
     """
-    phases_results = {k: np.array(v) for k, v in result.plot_data.structs.items()}
-    y_obs = np.array(result.plot_data.y_obs)
-    y_calc = np.array(result.plot_data.y_calc)
-    y_bkg = np.array(result.plot_data.y_bkg)
+    plot_data = result.plot_data
+    phase_names = list(plot_data.structs)
+    if not phase_names:
+        return []
+
+    y_obs = np.asarray(plot_data.y_obs, dtype=float)
+    y_calc = np.asarray(plot_data.y_calc, dtype=float)
+    y_bkg = np.asarray(plot_data.y_bkg, dtype=float)
+    y_structs = np.stack(
+        [np.asarray(plot_data.structs[name], dtype=float) for name in phase_names]
+    )
 
     cif_paths_dict = {cif_path.stem: cif_path for cif_path in cif_paths}
 
     original_rpb = rpb(y_calc, y_obs, y_bkg)
+    new_rpbs = leave_one_out_rpb(y_calc, y_obs, y_bkg, y_structs)
 
-    new_phases = []
-
-    for excluded_phase in phases_results:  # noqa: PLC0206
-        y_calc_excl = y_calc.copy()
-        y_calc_excl -= phases_results[excluded_phase]
-
-        new_rpb = rpb(y_calc_excl, y_obs, y_bkg)
-
-        if new_rpb > original_rpb + rpb_threshold:
-            new_phases.append(cif_paths_dict[excluded_phase])
-
-    return new_phases
+    return [
+        cif_paths_dict[name]
+        for name, new_rpb in zip(phase_names, new_rpbs)
+        if new_rpb > original_rpb + rpb_threshold
+    ]
 
 
 def get_natural_break_results(
@@ -384,6 +415,10 @@ class BaseSearchTree(Tree):
         max_phases: the maximum number of phases
         rpb_threshold: the minimum RPB improvement in each step
         pinned_phases: the phases that are pinned and will be included in all the results
+        slim_results: whether to keep only the numbers of the intermediate refinement results,
+            dropping the raw .lst text and atomic positions (they are regenerated for the final results)
+        max_refinements: the maximum number of refinement tasks in flight at once for each batch;
+            None submits every refinement of a batch at the same time
     """
 
     def __init__(
@@ -403,6 +438,8 @@ class BaseSearchTree(Tree):
         pinned_phases: list[RefinementPhase] | None = None,
         record_peak_matcher_scores: bool = False,
         *args,
+        slim_results: bool = True,
+        max_refinements: int | None = None,
         **kwargs,
     ):
         super().__init__(*args, **kwargs)
@@ -419,6 +456,8 @@ class BaseSearchTree(Tree):
         self.max_phases = max_phases
         self.pinned_phases = pinned_phases
         self.record_peak_matcher_scores = record_peak_matcher_scores
+        self.slim_results = slim_results
+        self.max_refinements = max_refinements
 
         self.all_phases_result = all_phases_result
         self.peak_obs = peak_obs
@@ -805,6 +844,7 @@ class BaseSearchTree(Tree):
         self,
         phases: list[RefinementPhase],
         pinned_phases: list[RefinementPhase] | None = None,
+        callback: Callable[[int, int], None] | None = None,
     ) -> dict[RefinementPhase, RefinementResult | None]:
         """
         Get the result of all the phases.
@@ -812,6 +852,7 @@ class BaseSearchTree(Tree):
         Args:
             phases: the phases
             pinned_phases: the pinned phases thta will be included in all the refinement
+            callback: called with (number done, total) after every refinement
 
         Returns
         -------
@@ -825,6 +866,7 @@ class BaseSearchTree(Tree):
                 phases,
                 self._batch_refine(
                     all_references=[[*pinned_phases, phase] for phase in phases],
+                    callback=callback,
                 ),
                 fillvalue=None,
             )
@@ -833,6 +875,8 @@ class BaseSearchTree(Tree):
     def _batch_refine(
         self,
         all_references: list[list[RefinementPhase]],
+        slim: bool | None = None,
+        callback: Callable[[int, int], None] | None = None,
     ) -> list[RefinementResult]:
         return batch_refinement(
             self.pattern_path,
@@ -841,6 +885,9 @@ class BaseSearchTree(Tree):
             instrument_profile=self.instrument_profile,
             phase_params=self.phase_params,
             refinement_params=self.refinement_params,
+            slim=self.slim_results if slim is None else slim,
+            callback=callback,
+            max_in_flight=self.max_refinements,
         )
 
     def _clone(self, identifier=None, with_tree=False, deep=False):
@@ -861,6 +908,8 @@ class BaseSearchTree(Tree):
             maximum_grouping_distance=self.maximum_grouping_distance,
             pinned_phases=self.pinned_phases,
             express_mode=self.express_mode,
+            slim_results=self.slim_results,
+            max_refinements=self.max_refinements,
         )
 
     @classmethod
@@ -897,6 +946,8 @@ class BaseSearchTree(Tree):
             maximum_grouping_distance=search_tree.maximum_grouping_distance,
             pinned_phases=search_tree.pinned_phases,
             record_peak_matcher_scores=search_tree.record_peak_matcher_scores,
+            slim_results=search_tree.slim_results,
+            max_refinements=search_tree.max_refinements,
         )
         new_search_tree.add_node(root_node)
 
@@ -941,6 +992,11 @@ class SearchTree(BaseSearchTree):
         maximum_grouping_distance: the maximum grouping distance, default to 0.1
         max_phases: the maximum number of phases, note that the pinned phases are COUNTED as well
         rpb_threshold: the minimium Rpb improvement for the search tree to continue to expand one node.
+        peak_detection_method: "eflech" or "scipy", see dara.peak_detection.detect_peaks
+        slim_results: whether to drop the raw .lst text from the intermediate refinement results
+        max_refinements: the maximum number of refinement tasks in flight at once for each batch
+        progress: a progress sink (see dara.search.progress) receiving the peak detection and
+            candidate refinement events while the tree is built; it is not kept on the tree
     """
 
     def __init__(
@@ -958,9 +1014,14 @@ class SearchTree(BaseSearchTree):
         rpb_threshold: float = 4,
         record_peak_matcher_scores: bool = False,
         *args,
+        peak_detection_method: Literal["eflech", "scipy"] = "eflech",
+        slim_results: bool = True,
+        max_refinements: int | None = None,
+        progress: ProgressSink | None = None,
         **kwargs,
     ):
         pattern_path = Path(pattern_path)
+        self.peak_detection_method = peak_detection_method
 
         # remove duplicates
         self.cif_paths = list(
@@ -994,12 +1055,15 @@ class SearchTree(BaseSearchTree):
             self.pinned_phases,
             record_peak_matcher_scores,
             *args,
+            slim_results=slim_results,
+            max_refinements=max_refinements,
             **kwargs,
         )
 
         # side effect: sets self.peak_obs and self.refinement_params["wmax"] in the function
         # also update the initial guess of b1 in self.refinement_params
         self._detect_peak_in_pattern()
+        emit_progress(progress, "peaks_detected", num_peaks=len(self.peak_obs))
 
         self.intensity_threshold = min(
             find_optimal_intensity_threshold(self.peak_obs[:, 1]),
@@ -1013,7 +1077,7 @@ class SearchTree(BaseSearchTree):
         root_node = self._create_root_node()
         self.add_node(root_node)
 
-        all_phases_result = self._get_all_cleaned_phases_result()
+        all_phases_result = self._get_all_cleaned_phases_result(progress)
 
         if self.express_mode:
             logger.info("Express mode is enabled. Grouping phases before starting.")
@@ -1067,6 +1131,7 @@ class SearchTree(BaseSearchTree):
             instrument_profile=self.instrument_profile,
             wmin=self.refinement_params.get("wmin", None),
             wmax=None,
+            method=self.peak_detection_method,
         )
         if len(peak_list) == 0:
             raise ValueError("No peaks are detected in the pattern.")
@@ -1112,7 +1177,9 @@ class SearchTree(BaseSearchTree):
             ),
         )
 
-    def _get_all_cleaned_phases_result(self) -> dict[RefinementPhase, RefinementResult]:
+    def _get_all_cleaned_phases_result(
+        self, progress: ProgressSink | None = None
+    ) -> dict[RefinementPhase, RefinementResult]:
         logger.info("Refining all the phases in the dataset.")
         pinned_phases_set = set(self.pinned_phases)
         cif_paths = [
@@ -1121,6 +1188,16 @@ class SearchTree(BaseSearchTree):
         all_phases_result = self.refine_phases(
             cif_paths,
             pinned_phases=self.pinned_phases,
+            callback=(
+                None
+                if progress is None
+                else lambda done, total: emit_progress(
+                    progress,
+                    "candidates_refined",
+                    refinements_done=done,
+                    refinements_total=total,
+                )
+            ),
         )
 
         # adjust the initial value of eps1 based on the weighted average of all the phases
@@ -1229,6 +1306,8 @@ class SearchTree(BaseSearchTree):
             a dictionary containing the phase combinations and their results
         """
         results = []
+        # the refined phases of each result, to regenerate slim results
+        result_phases = {}
 
         for node in self.nodes.values():
             if node.data.current_result is None:
@@ -1271,17 +1350,46 @@ class SearchTree(BaseSearchTree):
                         foms[i] = tuple(new_foms_)
                         lattice_strains[i] = tuple(new_lattice_strains_)
 
-                results.append(
-                    SearchResult(
-                        refinement_result=node.data.current_result,
-                        phases=tuple(phases),
-                        foms=tuple(foms),
-                        lattice_strains=tuple(lattice_strains),
-                        missing_peaks=node.data.isolated_missing_peaks,
-                        extra_peaks=node.data.isolated_extra_peaks,
-                    )
+                search_result = SearchResult(
+                    refinement_result=node.data.current_result,
+                    phases=tuple(phases),
+                    foms=tuple(foms),
+                    lattice_strains=tuple(lattice_strains),
+                    missing_peaks=node.data.isolated_missing_peaks,
+                    extra_peaks=node.data.isolated_extra_peaks,
                 )
-        return get_natural_break_results(results)
+                results.append(search_result)
+                result_phases[id(search_result)] = node.data.current_phases
+        return self._restore_full_results(
+            get_natural_break_results(results), result_phases
+        )
+
+    def _restore_full_results(
+        self,
+        results: list[SearchResult],
+        result_phases: dict[int, list[RefinementPhase]],
+    ) -> list[SearchResult]:
+        """
+        Re-run the refinement of slim results to get the raw .lst text and atomic positions.
+
+        Only the final results are refined again; if a refinement fails, the slim result is kept.
+        """
+        slim_results = [
+            result for result in results if result.refinement_result.is_slim
+        ]
+        if not slim_results:
+            return results
+
+        logger.info(
+            f"Regenerating the full refinement results of {len(slim_results)} results."
+        )
+        full_results = self._batch_refine(
+            [result_phases[id(result)] for result in slim_results], slim=False
+        )
+        for result, full_result in zip(slim_results, full_results):
+            if full_result is not None:
+                result.refinement_result = full_result
+        return results
 
     def show(
         self,
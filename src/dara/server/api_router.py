@@ -1,33 +1,67 @@
 from __future__ import annotations
 
+import asyncio
+import json
 import os
-import shutil
 import tempfile
 from ast import literal_eval
 from pathlib import Path
 from traceback import print_exc
 from typing import Annotated, Optional
 
-from fastapi import APIRouter, File, Form, HTTPException, Query, UploadFile
-from monty.serialization import MontyDecoder
+from fastapi import APIRouter, File, Form, HTTPException, Query, Request, UploadFile
+from fastapi.responses import StreamingResponse
 from pymatgen.core import Composition
 
 from dara.cif import Cif
 from dara.jobs import PhaseSearchMaker
-from dara.plot import visualize
-from dara.server.utils import convert_to_local_tz, get_result_store, get_worker_store
+from dara.server.results import get_task_plot, get_task_summary
+from dara.server.utils import convert_to_local_tz, get_worker_store
 from dara.server.worker import (
     add_job_to_queue,
+    find_job_by_fingerprint,
 )
 from dara.structure_db import CODDatabase
 from dara.utils import (
-    get_compositional_clusters,
-    get_head_of_compositional_cluster,
+    copy_stream,
+    submission_fingerprint,
 )
 from dara.xrd import RawFile, XRDMLFile, XYFile
 
 router = APIRouter(prefix="/api")
 
+# How often the task event stream checks the job store for changes
+TASK_EVENTS_POLL_SECONDS = 1.0
+
+# Fields of a task document read by the result endpoint
+TASK_PROPERTIES = [
+    "uuid",
+    "job.name",
+    "status",
+    "submitted_time",
+    "start_time",
+    "end_time",
+    "error",
+    "progress",
+    "summary",
+]
+
+# Upload size limits; 2-D detector exports can be large, CIFs never are
+MAX_PATTERN_UPLOAD_BYTES = 256 * 1024 * 1024
+MAX_CIF_UPLOAD_BYTES = 16 * 1024 * 1024
+
+
+async def _save_upload(upload: UploadFile, path: Path, max_bytes: int) -> str:
+    """Stream an upload to ``path`` in a worker thread and return its SHA-256."""
+    try:
+        _, sha256 = await asyncio.to_thread(copy_stream, upload.file, path, max_bytes)
+    except ValueError:
+        raise HTTPException(
+            status_code=413,
+            detail=f"{upload.filename} is larger than {max_bytes // (1024 * 1024)} MB",
+        )
+    return sha256
+
 
 @router.post("/submit")
 async def submit(
@@ -42,29 +76,34 @@ async def submit(
 ):
     try:
         name = pattern_file.filename
-        with tempfile.NamedTemporaryFile() as temp:
-            temp.write(pattern_file.file.read())
-            temp.seek(0)
-            if name.endswith(".xy") or name.endswith(".txt") or name.endswith(".xye"):  # noqa: PIE810
-                pattern = XYFile.from_file(temp.name)
-            elif name.endswith(".xrdml"):
-                pattern = XRDMLFile.from_file(temp.name)
-            elif name.endswith(".raw"):
-                pattern = RawFile.from_file(temp.name)
-            else:
-                print(pattern_file.filename)
-                raise HTTPException(status_code=400, detail="Invalid file format")
+        if name.endswith(".xy") or name.endswith(".txt") or name.endswith(".xye"):  # noqa: PIE810
+            pattern_cls = XYFile
+        elif name.endswith(".xrdml"):
+            pattern_cls = XRDMLFile
+        elif name.endswith(".raw"):
+            pattern_cls = RawFile
+        else:
+            print(pattern_file.filename)
+            raise HTTPException(status_code=400, detail="Invalid file format")
+        # the upload is streamed to disk and parsed off the event loop
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_path = Path(temp_dir) / "pattern"
+            pattern_sha256 = await _save_upload(pattern_file, temp_path, MAX_PATTERN_UPLOAD_BYTES)
+            pattern = await asyncio.to_thread(pattern_cls.from_file, temp_path)
 
         precursor_formulas = literal_eval(precursor_formulas)
 
+        additional_cif_hashes = {}
         if additional_phases:
             additional_cifs = []
             with tempfile.TemporaryDirectory() as temp_dir:
                 temp_dir = Path(temp_dir)
                 for phase in additional_phases:
-                    with open(temp_dir / phase.filename, "wb") as f:
-                        shutil.copyfileobj(phase.file, f)
-                        additional_cifs.append(Cif.from_file(temp_dir / phase.filename))
+                    cif_path = temp_dir / Path(phase.filename).name
+                    additional_cif_hashes[cif_path.name] = await _save_upload(
+                        phase, cif_path, MAX_CIF_UPLOAD_BYTES
+                    )
+                    additional_cifs.append(await asyncio.to_thread(Cif.from_file, cif_path))
         else:
             additional_cifs = None
 
@@ -78,6 +117,32 @@ async def submit(
         except ValueError:
             pass
 
+        # An identical submission (same pattern content and parameters) reuses
+        # the queued, running or completed job instead of searching again
+        fingerprint = submission_fingerprint(
+            pattern_sha256,
+            {
+                "user": user,
+                "pattern_format": pattern_cls.__name__,
+                "precursor_formulas": sorted({str(p).strip() for p in precursor_formulas}),
+                "instrument_profile": instrument_profile,
+                "wavelength": wavelength,
+                "temperature": temperature if use_rxn_predictor else None,
+                "use_rxn_predictor": use_rxn_predictor,
+                "additional_cifs": additional_cif_hashes,
+            },
+        )
+        # looked up and queued without yielding to the event loop in between, so
+        # identical submissions arriving together still queue a single job
+        existing = find_job_by_fingerprint(fingerprint)
+        if existing is not None:
+            return {
+                "message": "submitted",
+                "wf_id": existing["index"],
+                "status": existing["status"],
+                "deduplicated": True,
+            }
+
         if use_rxn_predictor:
             try:
                 import mp_api  # noqa: F401
@@ -128,8 +193,10 @@ async def submit(
                     "wavelength": wavelength,
                 },
             )
-        job_index = add_job_to_queue(job, user=user)
-        return {"message": "submitted", "wf_id": job_index}
+        job_index = add_job_to_queue(
+            job, user=user, pattern_sha256=pattern_sha256, fingerprint=fingerprint
+        )
+        return {"message": "submitted", "wf_id": job_index, "status": "READY", "deduplicated": False}
     except Exception as e:
         if isinstance(e, HTTPException):
             raise e
@@ -141,7 +208,8 @@ async def submit(
 async def result(task_id: int):
     # get the task state
     with get_worker_store() as worker_store:
-        job = worker_store.query_one({"index": task_id})
+        # leave out the stored job responses, which repeat the whole result document
+        job = worker_store.query_one({"index": task_id}, TASK_PROPERTIES)
 
     if job is None:
         raise HTTPException(status_code=404, detail="Task not found")
@@ -167,6 +235,7 @@ async def result(task_id: int):
             "start_time": convert_to_local_tz(job["start_time"]).strftime(
                 "%Y-%m-%d %H:%M:%S"
             ),
+            "progress": job.get("progress"),
         }
 
     if job["status"] == "FIZZLED":
@@ -185,101 +254,93 @@ async def result(task_id: int):
             "error_tb": job["error"],
         }
 
-    with get_result_store() as result_store:
-        d = result_store.query_one({"uuid": job["uuid"]})
-    if d is None:
-        raise HTTPException(status_code=404, detail="Task result not found")
-    d = MontyDecoder().process_decoded(d["output"])
-
-    all_results = []
+    # the summary is stored when the task completes; older tasks are summarized
+    # from their (cached) result document
+    summary = job.get("summary")
+    if summary is None:
+        try:
+            summary = await asyncio.to_thread(get_task_summary, job["uuid"])
+        except KeyError:
+            raise HTTPException(status_code=404, detail="Task result not found")
+
+    if not summary["all_results"]:
+        raise HTTPException(status_code=404, detail="No phases identified in the pattern")
+    if summary["final_result"] is None:
+        raise HTTPException(status_code=404, detail="No search result returned")
+
+    start_time = convert_to_local_tz(job["start_time"])
+    end_time = convert_to_local_tz(job["end_time"])
+    runtime = (end_time - start_time).total_seconds()
+    return {
+        "status": job["status"],
+        "task_label": job["job"]["name"],
+        "best_rwp": summary["best_rwp"],
+        "final_result": summary["final_result"],
+        "all_results": summary["all_results"],
+        "precursors": summary["precursors"],
+        "temperature": summary["temperature"],
+        "use_rxn_predictor": summary["use_rxn_predictor"],
+        "submitted_on": convert_to_local_tz(job["submitted_time"]).strftime(
+            "%Y-%m-%d %H:%M:%S"
+        ),
+        "start_time": start_time.strftime("%Y-%m-%d %H:%M:%S"),
+        "end_time": end_time.strftime("%Y-%m-%d %H:%M:%S"),
+        "runtime": runtime,
+        "additional_search_options": summary["additional_search_options"],
+    }
 
-    for result in d.results:
-        grouped_phases = (
-            d.grouped_phases[len(all_results)] if d.grouped_phases else None
-        )
-        phases = [[cif.filename for cif in cifs] for cifs in result[0]]
-
-        if not grouped_phases:  # for backward compatibility
-            grouped_phases = []
-            for phases_ in phases:
-                grouped_phase = get_compositional_clusters(list(phases_))
-                grouped_phase_with_head = [
-                    (get_head_of_compositional_cluster(cluster), cluster)
-                    for cluster in grouped_phase
-                ]
-                grouped_phases.append(grouped_phase_with_head)
-
-        # convert composition into formula
-        for i in range(len(grouped_phases)):
-            for j in range(len(grouped_phases[i])):
-                grouped_phases[i][j] = (
-                    grouped_phases[i][j][0]
-                    .reduced_composition.to_html_string()
-                    .replace("<sub>1</sub>", ""),
-                    grouped_phases[i][j][1],
-                )
 
-        all_results.append(
-            {
-                "rwp": result[1].lst_data.rwp,
-                "phases": phases,
-                "highlighted_phases": list(result[1].lst_data.phases_results),
-                "grouped_phases": grouped_phases,
-            }
-        )
+@router.get("/task/{task_id}/events")
+async def task_events(task_id: int, request: Request):
+    """Stream the task's status and live progress as server-sent events.
 
-        if d.final_result is None:
-            raise HTTPException(status_code=404, detail="No search result returned")
+    A ``task`` event is sent on every status transition or progress update;
+    the stream ends once the task has completed or fizzled.
+    """
 
-        start_time = convert_to_local_tz(job["start_time"])
-        end_time = convert_to_local_tz(job["end_time"])
-        runtime = (end_time - start_time).total_seconds()
+    def get_state():
+        with get_worker_store() as worker_store:
+            job = worker_store.query_one(
+                {"index": task_id}, ["status", "progress", "error"]
+            )
+        if job is None:
+            return None
         return {
             "status": job["status"],
-            "task_label": job["job"]["name"],
-            "best_rwp": d.best_rwp,
-            "final_result": {
-                "rwp": d.final_result.lst_data.rwp,
-                "phases": list(d.final_result.lst_data.phases_results),
-            },
-            "all_results": all_results,
-            "precursors": d.precursors,
-            "temperature": (
-                None
-                if d.predict_kwargs.get("temp", None) is None
-                else d.predict_kwargs["temp"] - 273
-            ),
-            "use_rxn_predictor": d.phase_predictor is not None,
-            "submitted_on": convert_to_local_tz(job["submitted_time"]).strftime(
-                "%Y-%m-%d %H:%M:%S"
-            ),
-            "start_time": start_time.strftime("%Y-%m-%d %H:%M:%S"),
-            "end_time": end_time.strftime("%Y-%m-%d %H:%M:%S"),
-            "runtime": runtime,
-            "additional_search_options": d.search_kwargs,
+            "progress": job.get("progress"),
+            "error_tb": job.get("error"),
         }
-    raise HTTPException(status_code=404, detail="No phases identified in the pattern")
+
+    if await asyncio.to_thread(get_state) is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    async def stream():
+        last_payload = None
+        while not await request.is_disconnected():
+            state = await asyncio.to_thread(get_state)
+            payload = json.dumps(state)
+            if payload != last_payload:
+                yield f"event: task\ndata: {payload}\n\n"
+                last_payload = payload
+            if state["status"] in ("COMPLETED", "FIZZLED"):
+                return
+            await asyncio.sleep(TASK_EVENTS_POLL_SECONDS)
+
+    return StreamingResponse(
+        stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"}
+    )
 
 
 @router.get("/task/{task_id}/plot")
 async def plot(task_id: int, idx: int = Query(None)):
     with get_worker_store() as worker_store:
         uuid = worker_store.query_one({"index": task_id}, ["uuid"])["uuid"]
-    with get_result_store() as result_store:
-        d = result_store.query_one({"uuid": uuid})
-    if d is None:
+    try:
+        return await asyncio.to_thread(get_task_plot, uuid, idx)
+    except KeyError:
         raise HTTPException(status_code=404, detail="Task not found")
-    d = MontyDecoder().process_decoded(d["output"])
-    if idx is None:
-        return visualize(result=d.final_result).to_json()
-    if 0 <= idx < len(d.results):
-        result = d.results[idx][1]
-        missing_peaks = d.missing_peaks[idx] if d.missing_peaks else None
-        extra_peaks = d.extra_peaks[idx] if d.extra_peaks else None
-        return visualize(
-            result=result, missing_peaks=missing_peaks, extra_peaks=extra_peaks
-        ).to_json()
-    raise HTTPException(status_code=404, detail="Index out of range")
+    except IndexError:
+        raise HTTPException(status_code=404, detail="Index out of range")
 
 
 @router.get("/tasks")
@@ -7,7 +7,7 @@ from fastapi.staticfiles import StaticFiles
 
 from dara.server.api_router import router
 from dara.server.setting import get_dara_server_settings
-from dara.server.worker import worker_process
+from dara.server.worker import set_new_job_event, worker_process
 
 try:
     multiprocessing.set_start_method("spawn")
@@ -21,7 +21,11 @@ _worker_process = None
 async def launch_worker_process(app: FastAPI):
     """Context manager to launch the worker process."""
     global _worker_process  # noqa: PLW0603
-    _worker_process = multiprocessing.Process(target=worker_process, daemon=True)
+    new_job_event = multiprocessing.Event()
+    set_new_job_event(new_job_event)
+    _worker_process = multiprocessing.Process(
+        target=worker_process, args=(new_job_event,), daemon=True
+    )
     _worker_process.start()
     try:
         yield
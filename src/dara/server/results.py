@@ -0,0 +1,141 @@
+"""Summaries and cached documents of finished phase search tasks."""
+
+from __future__ import annotations
+
+from functools import lru_cache
+
+from monty.json import MontyDecoder, jsanitize
+
+from dara.plot import visualize
+from dara.server.utils import get_result_store
+from dara.utils import (
+    get_compositional_clusters,
+    get_head_of_compositional_cluster,
+)
+
+# Decoded documents hold every refinement result and CIF of a task, so only a
+# few are kept; plots and summaries are small
+DOCUMENT_CACHE_SIZE = 8
+PLOT_CACHE_SIZE = 64
+SUMMARY_CACHE_SIZE = 256
+
+
+def summarize_search_document(d) -> dict:
+    """
+    Summarize a phase search document for the task result page.
+
+    Args:
+        d: the PhaseSearchDocument of a finished task
+
+    Returns
+    -------
+        the result fields shown on the task page; JSON-serializable, so it can be
+        stored with the task
+    """
+    all_results = []
+
+    for result in d.results or []:
+        grouped_phases = (
+            d.grouped_phases[len(all_results)] if d.grouped_phases else None
+        )
+        phases = [[cif.filename for cif in cifs] for cifs in result[0]]
+
+        if not grouped_phases:  # for backward compatibility
+            grouped_phases = []
+            for phases_ in phases:
+                grouped_phase = get_compositional_clusters(list(phases_))
+                grouped_phase_with_head = [
+                    (get_head_of_compositional_cluster(cluster), cluster)
+                    for cluster in grouped_phase
+                ]
+                grouped_phases.append(grouped_phase_with_head)
+
+        # convert composition into formula
+        grouped_phases = [
+            [
+                (
+                    head.reduced_composition.to_html_string().replace("<sub>1</sub>", ""),
+                    cluster,
+                )
+                for head, cluster in groups
+            ]
+            for groups in grouped_phases
+        ]
+
+        all_results.append(
+            {
+                "rwp": result[1].lst_data.rwp,
+                "phases": phases,
+                "highlighted_phases": list(result[1].lst_data.phases_results),
+                "grouped_phases": grouped_phases,
+            }
+        )
+
+    temperature = (d.predict_kwargs or {}).get("temp", None)
+    return jsanitize(
+        {
+            "best_rwp": d.best_rwp,
+            "final_result": (
+                None
+                if d.final_result is None
+                else {
+                    "rwp": d.final_result.lst_data.rwp,
+                    "phases": list(d.final_result.lst_data.phases_results),
+                }
+            ),
+            "all_results": all_results,
+            "precursors": d.precursors,
+            "temperature": None if temperature is None else temperature - 273,
+            "use_rxn_predictor": d.phase_predictor is not None,
+            "additional_search_options": d.search_kwargs,
+        }
+    )
+
+
+@lru_cache(maxsize=DOCUMENT_CACHE_SIZE)
+def load_search_document(uuid: str):
+    """
+    Load and decode the PhaseSearchDocument of a task.
+
+    The result of a task never changes once it is stored, so decoded documents are
+    cached by uuid (least recently used first out).
+
+    Args:
+        uuid: the uuid of the task's job
+
+    Returns
+    -------
+        the decoded PhaseSearchDocument. A missing result raises a KeyError, which
+        is not cached.
+    """
+    with get_result_store() as result_store:
+        d = result_store.query_one({"uuid": uuid})
+    if d is None:
+        raise KeyError(uuid)
+    return MontyDecoder().process_decoded(d["output"])
+
+
+@lru_cache(maxsize=SUMMARY_CACHE_SIZE)
+def get_task_summary(uuid: str) -> dict:
+    """Summarize a task stored without a summary (i.e. finished before summaries were stored)."""
+    return summarize_search_document(load_search_document(uuid))
+
+
+@lru_cache(maxsize=PLOT_CACHE_SIZE)
+def get_task_plot(uuid: str, idx: int | None = None) -> str:
+    """
+    Plot the final result of a task, or its ``idx``-th result, as a plotly JSON string.
+
+    A missing result raises a KeyError and an ``idx`` out of range an IndexError.
+    """
+    d = load_search_document(uuid)
+    if idx is None:
+        return visualize(result=d.final_result).to_json()
+    if not 0 <= idx < len(d.results):
+        raise IndexError(idx)
+    result = d.results[idx][1]
+    missing_peaks = d.missing_peaks[idx] if d.missing_peaks else None
+    extra_peaks = d.extra_peaks[idx] if d.extra_peaks else None
+    return visualize(
+        result=result, missing_peaks=missing_peaks, extra_peaks=extra_peaks
+    ).to_json()
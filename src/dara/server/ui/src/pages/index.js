@@ -154,7 +154,9 @@ function Submission() {
               form.resetFields();
               messageApi.open({
                 type: 'success',
-                content: 'The refinement task has been submitted successfully!',
+                content: data.deduplicated
+                  ? `An identical task (#${data.wf_id}) is already ${data.status.toLowerCase()}.`
+                  : 'The refinement task has been submitted successfully!',
               });
             } else {
               setMsg(JSON.stringify(data));
@@ -204,14 +204,27 @@ function TaskDetail({ data, task_id }) {
   )
 }
 
+function formatProgress(progress) {
+  const parts = [];
+  if (progress.stage) parts.push(progress.stage.replace(/_/g, ' '));
+  if (typeof progress.num_peaks === 'number') parts.push(`${progress.num_peaks} peaks`);
+  if (typeof progress.refinements_total === 'number') {
+    parts.push(`${progress.refinements_done ?? 0}/${progress.refinements_total} candidates refined`);
+  }
+  if (typeof progress.nodes_expanded === 'number') parts.push(`${progress.nodes_expanded} nodes expanded`);
+  if (typeof progress.best_rwp === 'number') parts.push(`best Rwp ${progress.best_rwp.toFixed(2)}`);
+  return parts.join(' · ');
+}
+
 function TaskDetailedUnfinished({ data }) {
-  const { status, submitted_on, start_time, end_time, error_tb } = data;
+  const { status, submitted_on, start_time, end_time, error_tb, progress } = data;
   return (<Descriptions bordered column={1} size='small'>
     <Descriptions.Item label="Name" span={1}>{data.task_label}</Descriptions.Item>
     <Descriptions.Item label="Status" span={1}><Tag color={STATE_COLOR[status]}>{status}</Tag></Descriptions.Item>
     <Descriptions.Item label="Submitted on" span={1}>{submitted_on}</Descriptions.Item>
     {start_time ? <Descriptions.Item label="Start time" span={1}>{start_time}</Descriptions.Item> : <></>}
     {end_time ? <Descriptions.Item label="End time" span={1}>{end_time}</Descriptions.Item> : <></>}
+    {progress ? <Descriptions.Item label="Progress" span={1}>{formatProgress(progress)}</Descriptions.Item> : <></>}
     {error_tb ? <Descriptions.Item label="Error Traceback" span={1}><div class="error-code"><pre style={{ whiteSpace: "break-spaces", fontSize: "0.9em" }}>{error_tb}</pre></div></Descriptions.Item> : <></>}
   </Descriptions>)
 }
@@ -224,7 +237,7 @@ function TaskPage({ location }) {
 
   const [data, setData] = React.useState(undefined);
   console.log(data);
-  React.useEffect(() => {
+  const loadTask = React.useCallback(() => {
     // handle 404 error
     fetch(`${URL}/task/${task_id}`)
       .then(response => {
@@ -236,6 +249,29 @@ function TaskPage({ location }) {
       .then(data => setData(data));
   }, [task_id]);
 
+  React.useEffect(loadTask, [loadTask]);
+
+  // follow a queued or running task through the event stream, and reload it
+  // once it has finished
+  const unfinished = data && (data.status === "READY" || data.status === "RUNNING");
+  React.useEffect(() => {
+    if (!unfinished) return;
+    const source = new EventSource(`${URL}/task/${task_id}/events`);
+    source.addEventListener('task', (event) => {
+      const state = JSON.parse(event.data);
+      if (state.status === "COMPLETED" || state.status === "FIZZLED") {
+        source.close();
+        loadTask();
+      } else if (state.status === "RUNNING" && data.status !== "RUNNING") {
+        // the start time is only known once the task is running
+        loadTask();
+      } else {
+        setData(current => ({ ...current, status: state.status, progress: state.progress }));
+      }
+    });
+    return () => source.close();
+  }, [task_id, unfinished, data && data.status, loadTask]);
+
   return (
     <Layout hasSider={false} title="Result">
       <Container>
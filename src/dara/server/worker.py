@@ -8,21 +8,45 @@ import ray
 from jobflow.managers.local import run_locally
 from monty.serialization import MontyDecoder
 
+from dara.search.progress import ThrottledProgress, report_progress_to
+from dara.server.results import summarize_search_document
 from dara.server.utils import get_job_store, get_result_store, get_worker_store
 
 logger = logging.getLogger("dara.server.worker")
 
+# Search progress is written to the job document at most this often
+PROGRESS_INTERVAL_SECONDS = 2.0
 
-def worker_process():
-    """Start the Ray worker process."""
+# Set by add_job_to_queue in the server process to wake the worker process up
+_new_job_event = None
+
+
+def set_new_job_event(event):
+    """Register the (multiprocessing) event that is set whenever a job is submitted."""
+    global _new_job_event  # noqa: PLW0603
+    _new_job_event = event
+
+
+def worker_process(new_job_event=None):
+    """Start the Ray worker process.
+
+    If ``new_job_event`` is given, the worker starts a newly submitted job as
+    soon as the event is set instead of waiting for the next 3 s poll.
+    """
     logger.info("Starting worker process for job execution...")
     mark_running_jobs_as_fizzled()
 
     while True:
+        if new_job_event is not None:
+            # Clear before querying, so a job submitted meanwhile is not missed
+            new_job_event.clear()
         for job_uuid in get_all_pending_jobs():
             logger.debug(f"Job {job_uuid} has started...")
             run_job(job_uuid)
-        time.sleep(3)
+        if new_job_event is not None:
+            new_job_event.wait(3)
+        else:
+            time.sleep(3)
 
 
 def run_job(uuid):
@@ -36,14 +60,25 @@ def run_job(uuid):
         job["start_time"] = datetime.now(tz=timezone.utc)
         job["status"] = "RUNNING"
         worker_store.update(job)
+
+        def save_progress(state):
+            job["progress"] = state
+            worker_store.update(job)
+
+        # the search runs inside the jobflow job, so its progress sink is installed
+        # for the context instead of being passed through the serialized job
+        progress = ThrottledProgress(save_progress, min_interval=PROGRESS_INTERVAL_SECONDS)
         try:
-            with TemporaryDirectory() as tmp_dir:
+            with TemporaryDirectory() as tmp_dir, report_progress_to(progress):
                 result = run_locally(
                     MontyDecoder().process_decoded(job["job"]),
                     raise_immediately=True,
                     store=get_job_store(get_result_store()),
                     root_dir=tmp_dir,
                 )
+            if progress.state:
+                job["progress"] = progress.state
+            job["summary"] = summarize_job_output(result, uuid)
             job["status"] = "COMPLETED"
             job["end_time"] = datetime.now(tz=timezone.utc)
             job["result"] = result
@@ -61,8 +96,29 @@ def run_job(uuid):
             raise
 
 
-def add_job_to_queue(job, user):
-    """Add a job to the queue for remote execution."""
+def summarize_job_output(responses, uuid):
+    """Summarize the search document returned by a finished job for the result endpoint.
+
+    The summary spares the endpoint from decoding the whole document on every
+    request. If it cannot be made, None is returned and the endpoint summarizes
+    the stored document instead.
+    """
+    try:
+        job_responses = responses[uuid]
+        # the response of the last run of the job (jobs only rerun when replaced)
+        output = job_responses[max(job_responses)].output
+        return summarize_search_document(output)
+    except Exception:
+        logger.warning(f"Failed to summarize the result of job {uuid}", exc_info=True)
+        return None
+
+
+def add_job_to_queue(job, user, pattern_sha256=None, fingerprint=None):
+    """Add a job to the queue for remote execution.
+
+    ``pattern_sha256`` is the hash of the uploaded pattern file and
+    ``fingerprint`` identifies the submission (see find_job_by_fingerprint), if known.
+    """
     with get_worker_store() as worker_store:
         number_of_jobs = worker_store.count()
         worker_store.update(
@@ -73,11 +129,30 @@ def add_job_to_queue(job, user):
                 "submitted_time": datetime.now(tz=timezone.utc),
                 "index": number_of_jobs + 1,
                 "user": user,
+                "pattern_sha256": pattern_sha256,
+                "fingerprint": fingerprint,
             }
         )
+    if _new_job_event is not None:
+        _new_job_event.set()
     return number_of_jobs + 1  # index of the job in the queue
 
 
+def find_job_by_fingerprint(fingerprint):
+    """Return the newest queued, running or completed job of an identical submission.
+
+    Fizzled jobs are never returned, so resubmitting retries them.
+    """
+    with get_worker_store() as worker_store:
+        jobs = worker_store.query(
+            criteria={"fingerprint": fingerprint, "status": {"$in": ["READY", "RUNNING", "COMPLETED"]}},
+            properties=["index", "status"],
+            sort={"submitted_time": -1},
+            limit=1,
+        )
+        return next(iter(jobs), None)
+
+
 def get_all_pending_jobs(sort_by_submitted_time=False):
     """Add all pending jobs to the queue for remote execution."""
     with get_worker_store() as worker_store:
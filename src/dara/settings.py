@@ -23,6 +23,24 @@ class DaraSettings(BaseSettings):
     PATH_TO_ICSD: Path = Field(Path("~/ICSD_2024/ICSD_2024_experimental_inorganic/experimental_inorganic").expanduser())
     PATH_TO_COD: Path = Field(Path("~/COD_2024").expanduser())
 
+    PATTERN_CACHE_DIR: Path = Field(
+        Path("~/.cache/dara/patterns").expanduser(),
+        description="Directory of patterns converted to memory-mappable .npz files.",
+    )
+    PATTERN_CACHE_MAX_ENTRIES: int = Field(
+        256, description="Number of converted patterns kept in the pattern cache; the least recently used are evicted."
+    )
+    PATTERN_CACHE_MAX_BYTES: int = Field(
+        2 * 1024**3,
+        description="Total size in bytes of the pattern cache; beyond it the least recently used patterns are evicted.",
+    )
+    PEAK_CACHE_DIR: Path = Field(
+        Path("~/.cache/dara/peaks").expanduser(), description="Directory of cached peak detection results."
+    )
+    PEAK_CACHE_MAX_ENTRIES: int = Field(
+        1024, description="Number of peak lists kept in the peak cache; the least recently used are evicted."
+    )
+
     model_config = SettingsConfigDict(env_prefix="dara_")  # prepend dara_ to env vars
 
     @model_validator(mode="before")
@@ -2,7 +2,9 @@
 
 from __future__ import annotations
 
+import hashlib
 import itertools
+import json
 import logging
 import os
 import random
@@ -12,7 +14,7 @@ import sys
 import warnings
 from datetime import datetime
 from pathlib import Path
-from typing import TYPE_CHECKING, Union
+from typing import TYPE_CHECKING, BinaryIO, Union
 
 import numpy as np
 from monty.json import MontyDecoder
@@ -249,6 +251,64 @@ def copy_and_rename_files(
                 print(f"ERROR: File {src_file} not found!")
 
 
+def copy_stream(
+    src: BinaryIO,
+    dest: Path | str,
+    max_bytes: int | None = None,
+    chunk_size: int = 1 << 20,
+) -> tuple[int, str]:
+    """
+    Copy a binary file object to a file in chunks, hashing the content on the way.
+
+    Only one chunk is held in memory at a time. If the content is larger than
+    ``max_bytes``, the partially written file is removed and a ValueError is raised.
+
+    Args:
+        src: the file object to read, e.g. the file of an uploaded file
+        dest: the file to write
+        max_bytes: the maximum size of the content in bytes, or None for no limit
+        chunk_size: the number of bytes read at a time
+
+    Returns
+    -------
+        the size of the content in bytes and its SHA-256 hex digest
+    """
+    sha256 = hashlib.sha256()
+    size = 0
+    try:
+        with open(dest, "wb") as f:
+            while chunk := src.read(chunk_size):
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise ValueError(f"The file is larger than the limit of {max_bytes} bytes.")
+                sha256.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        Path(dest).unlink(missing_ok=True)
+        raise
+    return size, sha256.hexdigest()
+
+
+def submission_fingerprint(pattern_sha256: str, params: dict) -> str:
+    """
+    Identify a phase search submission by its pattern and its (normalized) parameters.
+
+    Two submissions with the same fingerprint give the same result, so the second
+    one can reuse the job of the first.
+
+    Args:
+        pattern_sha256: the SHA-256 hex digest of the pattern file
+        params: the search parameters, normalized by the caller so that equivalent
+            values compare equal (e.g. sorted element lists); must be JSON-serializable
+
+    Returns
+    -------
+        a SHA-256 hex digest
+    """
+    canonical = json.dumps({"pattern": pattern_sha256, "params": params}, sort_keys=True)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
 def get_chemsys_from_formulas(formulas: list[str]):
     """Convert a list of formulas to a chemsys."""
     elements = set()
@@ -339,6 +399,69 @@ def intensity_correction(
     return intensity
 
 
+_PAR_PEAK_NUM_PATTERN = re.compile(r"PEAKZAHL=(\d+)")
+_PAR_POL_PATTERN = re.compile(r"POL=(\d+(\.\d+)?)")
+_PAR_GSUM_PATTERN = re.compile(r"GSUM=(\d+(\.\d+)?)")
+
+
+def read_par_file(par_file: Path) -> tuple[str, list[str]] | None:
+    """
+    Read the header and the peak lines of a BGMN .par file.
+
+    Args:
+        par_file: the path to the .par file
+
+    Returns
+    -------
+        the header line and the peak lines, or None if the file has no peak list
+    """
+    content = par_file.read_text().split("\n")
+    if len(content) < 2 or not (peak_num := _PAR_PEAK_NUM_PATTERN.search(content[0])):
+        return None
+    peak_lines = content[1 : int(peak_num.group(1)) + 1]
+    return content[0], [line for line in peak_lines if line]
+
+
+def get_par_peaks(header: str, peak_lines: list[str], wavelength: float) -> np.ndarray:
+    """
+    Get the peaks from the peak lines of a .par file (see ``read_par_file``).
+
+    The intensities are corrected with ``intensity_correction``, using the
+    polarization factor from the header and the GSUM of each peak.
+
+    Args:
+        header: the header line of the .par file
+        peak_lines: the peak lines
+        wavelength: the wavelength in nm
+
+    Returns
+    -------
+        (n, 4) array with d_inv, intensity, b1 and b2 of every peak, including the
+        ones with a non-positive intensity
+    """
+    pol = float(pol.group(1)) if (pol := _PAR_POL_PATTERN.search(header)) else 1.0
+
+    rows = []
+    for line in peak_lines:
+        fields = line.split(None, 5)
+        rp = int(fields[0])
+        b1 = float(fields[3]) if rp in {3, 4} else 0.0
+        b2 = float(fields[4]) ** 2 if rp == 4 else 0.0
+        gsum = float(gsum.group(1)) if (gsum := _PAR_GSUM_PATTERN.search(line)) else 1.0
+        rows.append((float(fields[2]), float(fields[1]), b1, b2, gsum))
+
+    # columns: d_inv, intensity, b1, b2, gsum
+    peaks = np.array(rows, dtype=float).reshape(-1, 5)
+    peaks[:, 1] = intensity_correction(
+        intensity=peaks[:, 1],
+        d_inv=peaks[:, 0],
+        gsum=peaks[:, 4],
+        wavelength=wavelength,
+        pol=pol,
+    )
+    return peaks[:, :4]
+
+
 def rwp(y_calc: np.ndarray, y_obs: np.ndarray) -> float:
     """
     Calculate the Rietveld weighted profile (RWP) for a refinement.
@@ -369,11 +492,33 @@ def rpb(y_calc: np.ndarray, y_obs: np.ndarray, y_bkg) -> float:
     Returns:
         the RPB
     """
-    y_calc = np.array(y_calc)
-    y_obs = np.array(y_obs)
+    y_calc = np.asarray(y_calc)
+    y_obs = np.asarray(y_obs)
     return np.sum(np.abs(y_calc - y_obs)) / np.sum(np.abs(y_obs - y_bkg)) * 100
 
 
+def leave_one_out_rpb(
+    y_calc: np.ndarray, y_obs: np.ndarray, y_bkg: np.ndarray, y_structs: np.ndarray
+) -> np.ndarray:
+    """
+    Calculate the RPB of a refinement with each phase's contribution removed in turn.
+
+    Args:
+        y_calc: the calculated intensity
+        y_obs: the observed intensity
+        y_bkg: the background intensity
+        y_structs: the (n_phases, n_points) calculated intensity of each phase
+
+    Returns
+    -------
+        the RPB (in percentage) without each of the phases
+    """
+    y_obs = np.asarray(y_obs)
+    residual = np.asarray(y_calc) - y_obs
+    denominator = np.sum(np.abs(y_obs - np.asarray(y_bkg)))
+    return np.abs(residual[None, :] - np.asarray(y_structs)).sum(axis=1) / denominator * 100
+
+
 def get_logger(
     name: str,
     level=logging.DEBUG,
@@ -544,17 +689,21 @@ def get_head_of_compositional_cluster(paths: list[str | Path]) -> Composition:
     return sorted_comps[0]
 
 
+# Kalpha1, Kalpha2 and Kbeta wavelengths (in angstrom) of common anodes
+X_RAY_LINES = {
+    "cu": (1.540598, 1.544426, 1.392250),
+    "cr": (2.289760, 2.293663, 2.084920),
+    "fe": (1.936042, 1.93998, 1.75661),
+    "co": (1.789010, 1.792900, 1.620830),
+    "ni": (1.65791, 1.661747, 1.48862),
+    "mo": (0.709319, 0.713609, 0.632305),
+    "ag": (0.5594075, 0.563798, 0.497069),
+    "w": (0.20901, 0.213828, 0.184374),
+}
+
+
 def get_wavelength(wavelength_or_target_metal: float | str) -> float:
-    element_data = {
-        "cu": (1.540598, 1.544426, 1.392250),
-        "cr": (2.289760, 2.293663, 2.084920),
-        "fe": (1.936042, 1.93998, 1.75661),
-        "co": (1.789010, 1.792900, 1.620830),
-        "ni": (1.65791, 1.661747, 1.48862),
-        "mo": (0.709319, 0.713609, 0.632305),
-        "ag": (0.5594075, 0.563798, 0.497069),
-        "w": (0.20901, 0.213828, 0.184374),
-    }
+    element_data = X_RAY_LINES
     try:
         wavelength_or_target_metal = float(wavelength_or_target_metal)
     except ValueError:
@@ -573,6 +722,26 @@ def get_wavelength(wavelength_or_target_metal: float | str) -> float:
     return wavelength_or_target_metal
 
 
+def get_kalpha2_wavelength(wavelength_or_target_metal: float | str) -> float | None:
+    """
+    Get the Kalpha2 wavelength (in nm) of an anode.
+
+    Args:
+        wavelength_or_target_metal: the name of the anode or a wavelength in nm
+
+    Returns
+    -------
+        the Kalpha2 wavelength, or None for a monochromatic (numeric) wavelength
+    """
+    if (
+        isinstance(wavelength_or_target_metal, str)
+        and wavelength_or_target_metal.lower() in X_RAY_LINES
+    ):
+        return X_RAY_LINES[wavelength_or_target_metal.lower()][1] / 10
+    get_wavelength(wavelength_or_target_metal)  # raise for unknown anodes
+    return None
+
+
 def parse_refinement_param(
     refinement_param: str | float,
 ) -> tuple[str | float, float | None, float | None]:
@@ -1,8 +1,14 @@
-"""Load and process XRD data files (.xrdml, .xy)."""
+"""Load and process XRD data files (.xrdml, .xy, .raw)."""
 
 from __future__ import annotations
 
+import hashlib
+import os
 import struct
+import xml.etree.ElementTree as ET
+import zipfile
+from collections.abc import Iterator
+from itertools import islice
 from pathlib import Path
 
 import matplotlib.pyplot as plt
@@ -11,6 +17,8 @@ import xmltodict
 from dict2xml import dict2xml
 from monty.json import MSONable
 
+from dara.settings import DaraSettings
+
 
 class XRDData(MSONable):
     """General XRD data class; this is the base class for XRDMLFile, XYFile and other
@@ -24,9 +32,9 @@ class XRDData(MSONable):
         errors: list | np.ndarray | None = None,
     ):
         """Initialize XRD data from angles (2-theta values) and intensities/counts."""
-        self._angles = np.array(angles)
-        self._intensities = np.array(intensities)
-        self._errors = np.array(errors) if errors is not None else None
+        self._angles = np.asarray(angles)
+        self._intensities = np.asarray(intensities)
+        self._errors = np.asarray(errors) if errors is not None else None
 
     @property
     def angles(self) -> np.ndarray:
@@ -43,6 +51,15 @@ class XRDData(MSONable):
         """Errors in intensity values."""
         return self._errors
 
+    @property
+    def content_hash(self) -> str:
+        """SHA-1 of the angles, intensities and errors (as float64), independent of the source format."""
+        digest = hashlib.sha1()
+        for array in (self.angles, self.intensities, self.errors):
+            if array is not None:
+                digest.update(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+        return digest.hexdigest()
+
     def plot(self, style="line", ax=None, **kwargs):
         """Plot XRD data.
 
@@ -97,21 +114,51 @@ class XRDData(MSONable):
                 fmt="%f",
             )
 
+    def to_npz(self, fn: str | Path = "xrd_data.npz") -> None:
+        """Save as an uncompressed .npz file that can be memory-mapped by XYFile.from_npz.
+
+        Args:
+            fn: filename to save to. Defaults to "xrd_data.npz".
+        """
+        arrays = {
+            "angles": np.ascontiguousarray(self.angles, dtype=np.float64),
+            "intensities": np.ascontiguousarray(self.intensities, dtype=np.float64),
+            "content_hash": np.array(self.content_hash),
+        }
+        if self.errors is not None:
+            arrays["errors"] = np.ascontiguousarray(self.errors, dtype=np.float64)
+        with open(Path(fn), "wb") as f:
+            np.savez(f, **arrays)
+
 
 class RawFile(XRDData):
-    """Load Rigaku RAW file data format."""
+    """Load RAW file data (Rigaku RAW, or Bruker RAW v3 with one or more ranges)."""
 
     def __init__(self, angles, intensities, binary_data: bytes | None = None):
         super().__init__(angles, intensities)
         self._binary_data = binary_data
 
     @classmethod
-    def from_file(cls, path: str | Path) -> RawFile:
-        """Load data from a raw file."""
+    def from_file(cls, path: str | Path, scan: int = 0) -> RawFile:
+        """Load data from a raw file.
+
+        Args:
+            path: path to the .raw file
+            scan: index of the range to load (Bruker multi-range files)
+        """
         path = Path(path)
-        (angles, intensities), binary_data = load_raw(path)
+        ranges, binary_data = load_raw_ranges(path)
+        if scan >= len(ranges):
+            raise ValueError(f"Range {scan} not found in {path}")
+        angles, intensities = ranges[scan]
         return cls(angles, intensities, binary_data)
 
+    @classmethod
+    def scans_from_file(cls, path: str | Path) -> list[RawFile]:
+        """Load every range of a (multi-range) raw file."""
+        ranges, binary_data = load_raw_ranges(Path(path))
+        return [cls(angles, intensities, binary_data) for angles, intensities in ranges]
+
     @property
     def binary_data(self) -> bytes | None:
         """Binary data."""
@@ -145,11 +192,43 @@ class XRDMLFile(XRDData):
         return self._xrdml_dict
 
     @classmethod
-    def from_file(cls, path: str | Path) -> XRDMLFile:
-        """Load data from an XRDML file."""
-        xrdml_dict = load_xrdml(Path(path))
-        angles, intensities = get_xrdml_data(xrdml_dict)
-        return cls(angles=angles, intensities=intensities, xrdml_dict=xrdml_dict)
+    def from_file(
+        cls, path: str | Path, scan: int = 0, full_metadata: bool = True
+    ) -> XRDMLFile:
+        """Load data from an XRDML file.
+
+        By default the whole document is parsed into ``xrdml_dict``. With
+        ``full_metadata=False`` only the 2theta positions and counts are streamed
+        from the file and the rest of the document is skipped.
+
+        Args:
+            path: path to the .xrdml file
+            scan: index of the scan to load (for files with several scans)
+            full_metadata: whether to parse the whole document into ``xrdml_dict``, which
+                is required by ``to_xrdml_file``
+        """
+        path = Path(path)
+        if full_metadata:
+            xrdml_dict = load_xrdml(path)
+            try:
+                angles, intensities = get_xrdml_data(xrdml_dict, scan=scan)
+            except IndexError:
+                raise ValueError(f"Scan {scan} not found in {path}") from None
+            return cls(angles=angles, intensities=intensities, xrdml_dict=xrdml_dict)
+
+        selected = next(islice(iter_xrdml_scans(path), scan, None), None)
+        if selected is None:
+            raise ValueError(f"Scan {scan} not found in {path}")
+        angles, intensities = selected
+        return cls(angles=angles, intensities=intensities)
+
+    @classmethod
+    def scans_from_file(cls, path: str | Path) -> list[XRDMLFile]:
+        """Load every scan of a (multi-scan) XRDML file."""
+        return [
+            cls(angles=angles, intensities=intensities)
+            for angles, intensities in iter_xrdml_scans(Path(path))
+        ]
 
     def to_xrdml_file(self, fn: str | Path = "xrd_data.xrdml") -> None:
         """Save as an XRDML file.
@@ -157,6 +236,10 @@ class XRDMLFile(XRDData):
         Args:
             fn: filename to save to. Defaults to "xrd_data.xrdml".
         """
+        if self.xrdml_dict is None:
+            raise ValueError(
+                "No XRDML metadata loaded; load the file with XRDMLFile.from_file(..., full_metadata=True)"
+            )
         with open(Path(fn), "w") as f:
             f.write(dict2xml(self.xrdml_dict))
 
@@ -168,9 +251,17 @@ class XYFile(XRDData):
         super().__init__(angles, intensities, errors)
 
     @classmethod
-    def from_file(cls, path: str | Path) -> XYFile:
-        """Load data from a .xy file."""
+    def from_file(cls, path: str | Path, cache_dir: str | Path | None = None) -> XYFile:
+        """Load data from a .xy file.
+
+        Args:
+            path: path to the .xy/.xye file
+            cache_dir: if given, parse the file once and memory-map the converted arrays
+                from this directory afterwards (see load_pattern)
+        """
         path = Path(path)
+        if cache_dir is not None:
+            return load_pattern(path, cache_dir=cache_dir)
         try:
             data = np.loadtxt(path, unpack=True)
         except ValueError:
@@ -183,6 +274,161 @@ class XYFile(XRDData):
             angles, intensities, errors = data  # if it is xye data
         return cls(angles, intensities, errors)
 
+    @classmethod
+    def from_npz(cls, path: str | Path, mmap_mode: str | None = "r") -> XYFile:
+        """Load a pattern saved with XRDData.to_npz.
+
+        Args:
+            path: path to the .npz file
+            mmap_mode: memory-map the arrays with this mode (see numpy.memmap) instead of
+                reading them; None reads them into memory.
+
+        Returns
+        -------
+            XYFile with the stored angles, intensities and (optionally) errors
+        """
+        if mmap_mode is None:
+            with np.load(Path(path)) as npz:
+                arrays = {key: npz[key] for key in npz.files}
+        else:
+            arrays = _mmap_npz(Path(path), mmap_mode)
+        return cls(arrays["angles"], arrays["intensities"], arrays.get("errors"))
+
+
+PATTERN_READERS: dict[str, type[XRDData]] = {
+    ".xy": XYFile,
+    ".txt": XYFile,
+    ".xye": XYFile,
+    ".scn": XYFile,
+    ".xrdml": XRDMLFile,
+    ".raw": RawFile,
+}
+
+
+def default_pattern_cache_dir() -> Path:
+    """Directory of the converted-pattern cache (DaraSettings.PATTERN_CACHE_DIR)."""
+    return DaraSettings().PATTERN_CACHE_DIR
+
+
+def load_pattern(
+    path: str | Path,
+    cache_dir: str | Path | None = None,
+    max_entries: int | None = None,
+    max_bytes: int | None = None,
+) -> XYFile:
+    """Load a pattern file (.xy, .xye, .txt, .scn, .xrdml or .raw) as xy data.
+
+    With ``cache_dir``, each file is parsed once and stored as ``<sha1 of file>.npz``;
+    later loads of the same bytes (under any name) memory-map the cached arrays
+    instead of parsing the source again. A hit refreshes the file's modification
+    time, and once the cache holds more than ``max_entries`` patterns or
+    ``max_bytes`` bytes the least recently used ones are deleted.
+
+    Args:
+        path: path to the pattern file
+        cache_dir: directory for converted patterns; None disables the cache
+        max_entries: the number of cached patterns to keep, defaults to
+            DaraSettings.PATTERN_CACHE_MAX_ENTRIES
+        max_bytes: the total size of the cached patterns to keep, defaults to
+            DaraSettings.PATTERN_CACHE_MAX_BYTES
+
+    Returns
+    -------
+        XYFile with the pattern's angles, intensities and (for .xye) errors
+    """
+    path = Path(path)
+    reader = PATTERN_READERS.get(path.suffix.lower())
+    if reader is None:
+        raise ValueError(f"Unknown pattern file type: {path.suffix}")
+    if cache_dir is None:
+        data = _read_pattern_data(reader, path)
+        return XYFile(data.angles, data.intensities, data.errors)
+
+    cache_dir = Path(cache_dir)
+    digest = hashlib.sha1(path.read_bytes()).hexdigest()
+    cache_path = cache_dir / f"{digest}.npz"
+    try:
+        os.utime(cache_path)
+        return XYFile.from_npz(cache_path)
+    except (OSError, ValueError):  # not cached yet, or evicted by another process
+        pass
+
+    data = _read_pattern_data(reader, path)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+    XYFile(data.angles, data.intensities, data.errors).to_npz(tmp_path)
+    os.replace(tmp_path, cache_path)
+    loaded = XYFile.from_npz(cache_path)
+
+    settings = DaraSettings()
+    _evict_pattern_cache(
+        cache_dir,
+        max_entries or settings.PATTERN_CACHE_MAX_ENTRIES,
+        max_bytes or settings.PATTERN_CACHE_MAX_BYTES,
+    )
+    return loaded
+
+
+def _read_pattern_data(reader: type[XRDData], path: Path) -> XRDData:
+    """Read a pattern file with ``reader``, skipping the XRDML metadata (only xy data is kept)."""
+    if reader is XRDMLFile:
+        return reader.from_file(path, full_metadata=False)
+    return reader.from_file(path)
+
+
+def _evict_pattern_cache(cache_dir: Path, max_entries: int, max_bytes: int) -> None:
+    """Delete the least recently used patterns beyond ``max_entries`` or ``max_bytes``.
+
+    The most recently used pattern is always kept. Memory maps of deleted files stay valid.
+    """
+    entries = []
+    for path in cache_dir.glob("*.npz"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:  # evicted by another process
+            continue
+        entries.append((stat.st_mtime_ns, stat.st_size, path))
+    entries.sort(reverse=True)
+
+    total_bytes = 0
+    for i, (_, size, path) in enumerate(entries):
+        total_bytes += size
+        if i > 0 and (i >= max_entries or total_bytes > max_bytes):
+            path.unlink(missing_ok=True)
+
+
+def _mmap_npz(path: Path, mmap_mode: str) -> dict[str, np.ndarray]:
+    """Memory-map the numeric arrays of an uncompressed .npz file (np.load cannot)."""
+    arrays = {}
+    with zipfile.ZipFile(path) as zf, path.open("rb") as f:
+        for info in zf.infolist():
+            key = info.filename.removesuffix(".npy")
+            if info.compress_type != zipfile.ZIP_STORED:
+                with zf.open(info) as member:
+                    arrays[key] = np.lib.format.read_array(member)
+                continue
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack("<HH", f.read(4))
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            if not shape or dtype.hasobject:
+                f.seek(info.header_offset + 30 + name_length + extra_length)
+                arrays[key] = np.lib.format.read_array(f)
+            else:
+                arrays[key] = np.memmap(
+                    path,
+                    dtype=dtype,
+                    mode=mmap_mode,
+                    shape=shape,
+                    order="F" if fortran_order else "C",
+                    offset=f.tell(),
+                )
+    return arrays
+
 
 def load_xrdml(file: Path) -> dict:
     """Load an XRDML file and returns a dictionary using xmltodict."""
@@ -190,27 +436,74 @@ def load_xrdml(file: Path) -> dict:
         return xmltodict.parse(f.read())
 
 
-def get_xrdml_data(xrd_dict: dict) -> tuple[np.ndarray, np.ndarray]:
-    """Get angles and intensities from an XRDML dictionary."""
-    min_angle = float(
-        xrd_dict["xrdMeasurements"]["xrdMeasurement"]["scan"]["dataPoints"][
-            "positions"
-        ][0]["startPosition"]
-    )
-    max_angle = float(
-        xrd_dict["xrdMeasurements"]["xrdMeasurement"]["scan"]["dataPoints"][
-            "positions"
-        ][0]["endPosition"]
-    )
-
-    intensities = xrd_dict["xrdMeasurements"]["xrdMeasurement"]["scan"]["dataPoints"][
-        "counts"
-    ]["#text"]
-    intensities = np.array([float(val) for val in intensities.split()])
-    angles = np.linspace(min_angle, max_angle, len(intensities))
+def _as_list(value) -> list:
+    return value if isinstance(value, list) else [value]
+
+
+def get_xrdml_data(xrd_dict: dict, scan: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """Get angles and intensities of one scan from an XRDML dictionary."""
+    scans = [
+        s
+        for measurement in _as_list(xrd_dict["xrdMeasurements"]["xrdMeasurement"])
+        for s in _as_list(measurement["scan"])
+    ]
+    data_points = scans[scan]["dataPoints"]
+    positions = _as_list(data_points["positions"])
+    two_theta = next((p for p in positions if p.get("@axis") == "2Theta"), positions[0])
+
+    counts = data_points.get("counts", data_points.get("intensities"))
+    intensities = _parse_numbers(counts["#text"])
+    if "listPositions" in two_theta:
+        angles = _parse_numbers(two_theta["listPositions"])
+    else:
+        min_angle = float(two_theta["startPosition"])
+        max_angle = float(two_theta["endPosition"])
+        angles = np.linspace(min_angle, max_angle, len(intensities))
     return angles, intensities
 
 
+def _parse_numbers(text: str | None) -> np.ndarray:
+    """Parse a whitespace-separated block of numbers in C, without Python floats."""
+    return np.fromstring(text or "", dtype=float, sep=" ")
+
+
+def iter_xrdml_scans(file: Path | str) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    """Stream (angles, intensities) for each scan of an XRDML file.
+
+    The document is read incrementally with ``iterparse``; only the 2theta positions
+    and the counts of each scan are kept, and every scan subtree is released as soon
+    as it has been read, so memory stays bounded for large multi-scan files.
+    """
+    positions = []
+    counts = None
+    for _, elem in ET.iterparse(str(file), events=("end",)):
+        tag = elem.tag.rpartition("}")[2]
+        if tag == "positions":
+            fields = {child.tag.rpartition("}")[2]: child.text for child in elem}
+            positions.append((elem.get("axis"), fields))
+        elif tag == "counts" or (tag == "intensities" and counts is None):
+            counts = _parse_numbers(elem.text)
+            elem.clear()
+        elif tag == "scan":
+            if counts is None or not positions:
+                raise ValueError(f"Scan without positions or counts in {file}")
+            _, two_theta = next(
+                ((axis, f) for axis, f in positions if axis == "2Theta"), positions[0]
+            )
+            if two_theta.get("listPositions"):
+                angles = _parse_numbers(two_theta["listPositions"])
+            else:
+                angles = np.linspace(
+                    float(two_theta["startPosition"]),
+                    float(two_theta["endPosition"]),
+                    len(counts),
+                )
+            yield angles, counts
+            positions = []
+            counts = None
+            elem.clear()
+
+
 def xrdml2xy(fn: str | Path, target_folder: Path = None) -> Path:
     """Convert .xrdml file to .xy file (and save)."""
     fn = Path(fn)
@@ -218,7 +511,7 @@ def xrdml2xy(fn: str | Path, target_folder: Path = None) -> Path:
         target_folder = fn.parent
     target_path = target_folder / fn.with_suffix(".xy").name
 
-    XRDMLFile.from_file(fn).to_xy_file(target_path)
+    XRDMLFile.from_file(fn, full_metadata=False).to_xy_file(target_path)
     return target_path
 
 
@@ -233,29 +526,65 @@ def hex2int(hex_string: bytes) -> int:
 
 
 def load_raw(file: Path | str) -> tuple[tuple[np.ndarray, np.ndarray], bytes]:
-    """Convert raw file to xy data."""
+    """Convert raw file to xy data (first range for multi-range files)."""
+    ranges, content = load_raw_ranges(file)
+    return ranges[0], content
+
+
+def load_raw_ranges(
+    file: Path | str,
+) -> tuple[list[tuple[np.ndarray, np.ndarray]], bytes]:
+    """Decode all ranges of a raw file into (angles, intensities) arrays.
+
+    Bruker RAW v3 files (``RAW1.01``) may hold several ranges; Rigaku RAW files hold
+    one. Intensity blocks are decoded with ``np.frombuffer`` (no per-point unpacking).
+
+    Returns
+    -------
+        list of (angles, intensities) per range, and the raw file content
+    """
     with open(file, "rb") as f:
         content = f.read()
-    size_float = 4  # Assuming 4 bytes for a float
-    size_int = 4  # Assuming 4 bytes for an int
-
-    # Extracting start angle, end angle, and step size from binary content
-    start_ang = hex2float(content[2962 : 2962 + size_float])
-    end_ang = hex2float(content[2966 : 2966 + size_float])
-    count = hex2int(content[3154 : 3154 + size_int])
-    start_idx = 3158
-    angles = np.zeros(count)
-    intensities = np.zeros(count)
-
-    for j in range(count):
-        ang = start_ang + (j / (count - 1)) * (end_ang - start_ang)
-        its = hex2float(
-            content[start_idx + j * size_float : start_idx + (j + 1) * size_float]
-        )
-        angles[j] = ang
-        intensities[j] = its
 
-    return (angles, intensities), content
+    if content.startswith(b"RAW1.01"):
+        return _decode_bruker_raw_v3(content), content
+    if content.startswith(b"RAW"):
+        raise ValueError(
+            f"Unsupported Bruker RAW version {content[:7]!r}; only RAW1.01 (v3) is supported"
+        )
+    return [_decode_rigaku_raw(content)], content
+
+
+def _decode_rigaku_raw(content: bytes) -> tuple[np.ndarray, np.ndarray]:
+    # Start/end angle (float32) and number of points (int32) at fixed header offsets
+    start_ang, end_ang = struct.unpack_from("<ff", content, 2962)
+    (count,) = struct.unpack_from("<i", content, 3154)
+    intensities = np.frombuffer(content, dtype="<f4", count=count, offset=3158)
+    angles = np.linspace(start_ang, end_ang, count)
+    return angles, intensities.astype(np.float64)
+
+
+def _decode_bruker_raw_v3(content: bytes) -> list[tuple[np.ndarray, np.ndarray]]:
+    # 712-byte file header (number of ranges at offset 12), then per range: a
+    # 304-byte range header, an optional supplementary header and float32 counts
+    (n_ranges,) = struct.unpack_from("<I", content, 12)
+    pos = 712
+    ranges = []
+    for _ in range(n_ranges):
+        header_len, steps = struct.unpack_from("<II", content, pos)
+        if steps == 0:
+            break
+        (start_2theta,) = struct.unpack_from("<d", content, pos + 16)
+        (step_size,) = struct.unpack_from("<d", content, pos + 176)
+        (supplementary_len,) = struct.unpack_from("<I", content, pos + 256)
+        data_start = pos + header_len + supplementary_len
+        intensities = np.frombuffer(content, dtype="<f4", count=steps, offset=data_start)
+        angles = np.linspace(start_2theta, start_2theta + step_size * (steps - 1), steps)
+        ranges.append((angles, intensities.astype(np.float64)))
+        pos = data_start + 4 * steps
+    if not ranges:
+        raise ValueError("Bruker RAW file contains no data ranges")
+    return ranges
 
 
 def raw2xy(fn: str | Path, target_folder: Path = None) -> Path:
@@ -2,18 +2,57 @@
 
 from __future__ import annotations
 
+import asyncio
 import json
+import time
+import zlib
 from pathlib import Path
-from typing import List, Optional
+from typing import Callable, List, Optional
 
-from fastapi import APIRouter, File, Form, HTTPException, Query, UploadFile
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, File, Form, HTTPException, Query, Request, UploadFile
+from fastapi.responses import FileResponse, Response, StreamingResponse
 
 from .models import JobDetail, JobInput, JobStatus
+from .phase_utils import ensure_report_zip
 from .queue import JobStore
+from .uploads import MAX_CIF_BYTES, MAX_PATTERN_BYTES, cif_hashes, save_upload
 
+# How often the event stream looks for changes, and sends a keep-alive when there are none
+EVENTS_POLL_SECONDS = 0.5
+EVENTS_KEEPALIVE_SECONDS = 15.0
 
-def build_api_router(store: JobStore, uploads_dir: Path, base_workdir: Path) -> APIRouter:
+
+def accepts_encoding(accept_encoding: str, coding: str) -> bool:
+    """Whether an Accept-Encoding header allows ``coding``.
+
+    The header lists codings with optional q-values (e.g. ``gzip, deflate;q=0.5``);
+    a coding is accepted if its own entry, or else a ``*`` entry, has q > 0.
+    """
+    qvalues = {}
+    for entry in accept_encoding.split(","):
+        name, *params = (part.strip() for part in entry.split(";"))
+        if not name:
+            continue
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qvalues[name.lower()] = q
+    q = qvalues.get(coding.lower(), qvalues.get("*", 0.0))
+    return q > 0
+
+
+def build_api_router(
+    store: JobStore,
+    uploads_dir: Path,
+    base_workdir: Path,
+    *,
+    notify_worker: Optional[Callable[[], None]] = None,
+) -> APIRouter:
     """Construct API router bound to the provided JobStore.
 
     Parameters
@@ -26,6 +65,8 @@ def build_api_router(store: JobStore, uploads_dir: Path, base_workdir: Path) ->
         Base working directory used by the worker. Custom CIF uploads are
         written into ``base_workdir / chemical_system_without_dashes /
         "custom_cifs"`` so they are picked up by the worker.
+    notify_worker:
+        Called after every submission, to wake an idle worker immediately.
     """
 
     router = APIRouter()
@@ -56,23 +97,21 @@ def build_api_router(store: JobStore, uploads_dir: Path, base_workdir: Path) ->
         if not isinstance(required, list) or not isinstance(excluded, list):
             raise HTTPException(status_code=400, detail="Element fields must be JSON arrays")
 
-        dest_path = uploads_dir / pattern_file.filename
-        with dest_path.open("wb") as fp:
-            fp.write(await pattern_file.read())
+        # Patterns are stored by content, so identical uploads share one file
+        pattern = await save_upload(
+            pattern_file, uploads_dir, max_bytes=MAX_PATTERN_BYTES, content_addressed=True
+        )
 
         # Persist any custom CIF uploads into the same directory layout that
         # the worker expects, so they are automatically included in phase
         # search via Worker._collect_cifs.
         chem_dir_name = chemical_system.replace("-", "")
         custom_cif_dir = base_workdir / chem_dir_name / "custom_cifs"
-        custom_cif_dir.mkdir(parents=True, exist_ok=True)
 
         for cif in custom_cifs or []:
             if not cif.filename:
                 continue
-            cif_path = custom_cif_dir / cif.filename
-            with cif_path.open("wb") as fp:
-                fp.write(await cif.read())
+            await save_upload(cif, custom_cif_dir, max_bytes=MAX_CIF_BYTES)
 
         job_input = JobInput(
             user=user,
@@ -85,12 +124,21 @@ def build_api_router(store: JobStore, uploads_dir: Path, base_workdir: Path) ->
             mp_experimental_only=mp_experimental_only,
             mp_max_e_above_hull=mp_max_e_above_hull,
             max_phases=max_phases,
-            pattern_filename=pattern_file.filename,
-            pattern_path=str(dest_path),
+            pattern_filename=pattern.path.name,
+            pattern_path=str(pattern.path),
+            pattern_sha256=pattern.sha256,
         )
 
-        job_id = store.create_job(job_input)
-        return {"job_id": job_id, "status": JobStatus.PENDING}
+        # The worker searches every CIF in the custom CIF directory, not only
+        # the ones uploaded now, so all of them are part of the fingerprint
+        fingerprint = job_input.fingerprint(await cif_hashes(custom_cif_dir))
+        # submit_job is a blocking SQLite write, so it runs off the event loop
+        job, deduplicated = await asyncio.to_thread(store.submit_job, job_input, fingerprint)
+        if not deduplicated and notify_worker is not None:
+            notify_worker()
+        # A duplicate submission gets the identical job: its result if it has
+        # completed, otherwise it follows the same pending or running job
+        return {"job_id": job.job_id, "status": job.status, "deduplicated": deduplicated}
 
     # ------------------------------------------------------------------
     @router.get("/jobs")
@@ -99,14 +147,23 @@ def build_api_router(store: JobStore, uploads_dir: Path, base_workdir: Path) ->
         user: Optional[str] = Query(default=None),
         limit: Optional[int] = Query(default=None, ge=1),
         offset: Optional[int] = Query(default=None, ge=0),
+        after: Optional[str] = Query(default=None),
     ) -> dict:
-        jobs = store.list_jobs(status=status, user=user, limit=limit, offset=offset)
-        return {"jobs": [job.model_dump() for job in jobs], "total": len(jobs)}
+        jobs = store.list_jobs(status=status, user=user, limit=limit, offset=offset, after=after)
+        # The job_id of the last job on a full page is the cursor for the next one
+        next_cursor = jobs[-1].job_id if limit is not None and len(jobs) == limit else None
+        return {
+            "jobs": [job.model_dump() for job in jobs],
+            "total": store.count_jobs(status=status, user=user),
+            "next_cursor": next_cursor,
+        }
 
     # ------------------------------------------------------------------
     @router.get("/jobs/{job_id}")
-    def get_job_detail(job_id: str) -> JobDetail:
-        detail = store.load_job_detail(job_id)
+    def get_job_detail(job_id: str, light: bool = Query(default=True)) -> JobDetail:
+        # By default the figures and phase tables are left out; they are fetched
+        # one solution at a time from the endpoints below (light=false inlines them)
+        detail = store.load_job_detail(job_id, light=light)
         if detail is None:
             summary = store.get_job(job_id)
             if summary is None:
@@ -118,10 +175,73 @@ def build_api_router(store: JobStore, uploads_dir: Path, base_workdir: Path) ->
             )
         return detail
 
+    # ------------------------------------------------------------------
+    @router.get("/jobs/{job_id}/events")
+    async def job_events(job_id: str, request: Request) -> StreamingResponse:
+        """Stream the job summary as server-sent events whenever it changes.
+
+        Every status transition and progress update is sent as a ``job``
+        event; the stream ends once the job has completed or failed, or ends
+        with a ``deleted`` event if the job disappears meanwhile.
+        """
+        if await asyncio.to_thread(store.get_job, job_id) is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+
+        async def stream():
+            last_payload = None
+            last_sent = time.monotonic()
+            while not await request.is_disconnected():
+                # SQLite lookups run in a worker thread, off the event loop
+                summary = await asyncio.to_thread(store.get_job, job_id)
+                if summary is None:
+                    yield f"event: deleted\ndata: {json.dumps({'job_id': job_id})}\n\n"
+                    return
+                payload = summary.model_dump_json()
+                if payload != last_payload:
+                    yield f"event: job\ndata: {payload}\n\n"
+                    last_payload, last_sent = payload, time.monotonic()
+                elif time.monotonic() - last_sent > EVENTS_KEEPALIVE_SECONDS:
+                    yield ": keep-alive\n\n"
+                    last_sent = time.monotonic()
+                if summary.status in (JobStatus.COMPLETED, JobStatus.FAILED):
+                    return
+                await asyncio.sleep(EVENTS_POLL_SECONDS)
+
+        return StreamingResponse(
+            stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache"},
+        )
+
+    # ------------------------------------------------------------------
+    @router.get("/jobs/{job_id}/solutions/{solution_index}/figure")
+    def get_solution_figure(job_id: str, solution_index: int, request: Request) -> Response:
+        return _solution_blob_response(job_id, solution_index, "plotly_figure", request)
+
+    @router.get("/jobs/{job_id}/solutions/{solution_index}/phases")
+    def get_solution_phases(job_id: str, solution_index: int, request: Request) -> Response:
+        return _solution_blob_response(job_id, solution_index, "phases_table", request)
+
+    def _solution_blob_response(
+        job_id: str, solution_index: int, field: str, request: Request
+    ) -> Response:
+        blob = store.load_solution_blob(job_id, solution_index, field)
+        if blob is None:
+            raise HTTPException(status_code=404, detail="Solution not found")
+        # The stored zlib stream is exactly HTTP's "deflate" coding, so clients
+        # that accept it get the blob as stored, without decoding the JSON
+        if accepts_encoding(request.headers.get("accept-encoding", ""), "deflate"):
+            return Response(
+                content=blob,
+                media_type="application/json",
+                headers={"Content-Encoding": "deflate"},
+            )
+        return Response(content=zlib.decompress(blob), media_type="application/json")
+
     # ------------------------------------------------------------------
     @router.get("/jobs/{job_id}/download/{solution_index}/zip")
     def download_report(job_id: str, solution_index: int) -> FileResponse:
-        detail = store.load_job_detail(job_id)
+        detail = store.load_job_detail(job_id, light=True)
         if detail is None:
             raise HTTPException(status_code=404, detail="Job detail not found")
 
@@ -131,7 +251,11 @@ def build_api_router(store: JobStore, uploads_dir: Path, base_workdir: Path) ->
 
         path = Path(match.report_zip_url)
         if not path.exists():
-            raise HTTPException(status_code=404, detail="Report file missing")
+            # Reports are zipped on first download (this handler runs in a thread)
+            report_dir = path.with_suffix("")
+            if not report_dir.is_dir():
+                raise HTTPException(status_code=404, detail="Report file missing")
+            path = ensure_report_zip(report_dir)
 
         return FileResponse(path, filename=path.name)
 
@@ -24,12 +24,20 @@ DEFAULT_WORKDIR = Path.home() / "Documents" / "dara_analysis"
 DEFAULT_INDEXES_DIR = REPO_ROOT / "indexes"
 
 
-def _worker_main(job_db_path: Path, base_workdir: Path, indexes_dir: Path) -> None:
+def _worker_main(
+    job_db_path: Path,
+    base_workdir: Path,
+    indexes_dir: Path,
+    max_concurrent_jobs: int = 1,
+    wake_event=None,
+) -> None:
     store = JobStore(db_path=str(job_db_path))
     worker = Worker(
         store,
         base_workdir=base_workdir,
         indexes_dir=indexes_dir,
+        max_concurrent_jobs=max_concurrent_jobs,
+        wake_event=wake_event,
     )
     worker.run_forever()
 
@@ -42,6 +50,7 @@ def create_app(
     base_workdir: Optional[Path] = None,
     indexes_dir: Optional[Path] = None,
     start_worker: bool = True,
+    max_concurrent_jobs: int = 1,
 ) -> FastAPI:
     job_db_path = job_db_path or DEFAULT_DB_PATH
     uploads_dir = uploads_dir or DEFAULT_UPLOADS_DIR
@@ -53,7 +62,11 @@ def create_app(
     job_db_path.parent.mkdir(parents=True, exist_ok=True)
 
     job_store = JobStore(db_path=str(job_db_path))
-    router = build_api_router(job_store, uploads_dir, base_workdir)
+    # Set by the API on every submission, so the worker process starts it right away
+    wake_event = multiprocessing.Event()
+    router = build_api_router(
+        job_store, uploads_dir, base_workdir, notify_worker=wake_event.set
+    )
 
     worker_process: multiprocessing.Process | None = None
 
@@ -63,7 +76,7 @@ def create_app(
         if start_worker:
             worker_process = multiprocessing.Process(
                 target=_worker_main,
-                args=(job_db_path, base_workdir, indexes_dir),
+                args=(job_db_path, base_workdir, indexes_dir, max_concurrent_jobs, wake_event),
                 daemon=True,
             )
             worker_process.start()
@@ -0,0 +1,141 @@
+"""Long-lived, memory-mapped structure index cache for the dara_local_v2 worker."""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import sys
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+LOGGER = logging.getLogger("dara_local_v2.index_service")
+
+REPO_ROOT = Path(__file__).resolve().parents[3]
+SCRIPTS_DIR = REPO_ROOT / "scripts"
+if str(SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+
+from database_interface import (  # type: ignore  # noqa: E402
+    ELEMENT_MASK_COLUMNS,
+    StructureDatabaseIndex,
+    add_element_masks,
+)
+
+# Columns read by prepare_phases_for_dara; everything else stays on disk.
+DEFAULT_COLUMNS = (
+    "id",
+    "raw_db_id",
+    "source",
+    "formula",
+    "elements",
+    "path",
+    "density",
+    "experimental_status",
+    "energy_above_hull",
+    *ELEMENT_MASK_COLUMNS,
+)
+
+
+@dataclass
+class _CachedIndex:
+    mtime_ns: int
+    size: int
+    table: pa.Table
+
+
+class IndexService:
+    """Load each structure index once and serve filtered views of it.
+
+    Parquet indexes are projected to ``columns`` and converted once into an
+    uncompressed Arrow IPC file under ``cache_dir``, which is then memory-mapped
+    so repeated loads (and other worker processes) share the OS page cache
+    instead of decoding Parquet again. An index is reloaded whenever the source
+    file's mtime or size changes.
+    """
+
+    def __init__(self, cache_dir: Path | None = None, columns: Sequence[str] = DEFAULT_COLUMNS) -> None:
+        self.cache_dir = cache_dir
+        self.columns = tuple(columns)
+        self._cache: Dict[Path, _CachedIndex] = {}
+        self._lock = threading.Lock()
+
+    def get_table(self, index_path: Path) -> pa.Table:
+        """Return the cached Arrow table for ``index_path``, reloading it if the file changed."""
+        path = Path(index_path).resolve()
+        stat = path.stat()
+        with self._lock:
+            cached = self._cache.get(path)
+            if cached is None or cached.mtime_ns != stat.st_mtime_ns or cached.size != stat.st_size:
+                LOGGER.info("Loading index %s", path)
+                cached = _CachedIndex(stat.st_mtime_ns, stat.st_size, self._load(path, stat.st_mtime_ns))
+                self._cache[path] = cached
+            return cached.table
+
+    def query(self, index_path: Path, filter: Optional[pc.Expression] = None) -> StructureDatabaseIndex:
+        """Apply ``filter`` to the cached table and wrap the matching rows as an index.
+
+        Only the rows that pass the Arrow-level predicate are converted to pandas.
+        """
+        table = self.get_table(index_path)
+        if filter is not None:
+            table = table.filter(filter)
+        return StructureDatabaseIndex.from_dataframe(table.to_pandas(), index_path)
+
+    def invalidate(self, index_path: Path | None = None) -> None:
+        """Drop one cached index (or all of them)."""
+        with self._lock:
+            if index_path is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(Path(index_path).resolve(), None)
+
+    # ------------------------------------------------------------------
+    # Internal helpers
+    # ------------------------------------------------------------------
+    def _load(self, path: Path, mtime_ns: int) -> pa.Table:
+        if self.cache_dir is None:
+            return self._read_source(path)
+
+        digest = hashlib.sha1(str(path).encode("utf-8")).hexdigest()[:12]
+        prefix = f"{path.stem}-{digest}-"
+        arrow_path = self.cache_dir / f"{prefix}{mtime_ns}.arrow"
+        if not arrow_path.exists():
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            table = self._read_source(path)
+            tmp_path = arrow_path.with_suffix(f".{os.getpid()}.tmp")
+            with pa.OSFile(str(tmp_path), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            os.replace(tmp_path, arrow_path)
+            self._remove_stale(prefix, keep=arrow_path)
+        return pa.ipc.open_file(pa.memory_map(str(arrow_path), "r")).read_all()
+
+    def _read_source(self, path: Path) -> pa.Table:
+        if path.suffix.lower() == ".parquet":
+            available = set(pq.read_schema(path).names)
+            columns = [col for col in self.columns if col in available]
+            if not all(col in available for col in ELEMENT_MASK_COLUMNS) and "elements" not in columns:
+                columns.append("elements")
+            table = pq.read_table(path, columns=columns, memory_map=True)
+            if all(col in table.column_names for col in ELEMENT_MASK_COLUMNS):
+                return table
+            df = add_element_masks(table.to_pandas())
+        else:
+            df = StructureDatabaseIndex(path).df
+            df = df[[col for col in self.columns if col in df.columns]]
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+    def _remove_stale(self, prefix: str, keep: Path) -> None:
+        for stale in self.cache_dir.glob(f"{prefix}*.arrow"):
+            if stale != keep:
+                try:
+                    stale.unlink()
+                except OSError:
+                    # Still mapped by another process (Windows); removed on a later reload
+                    pass
@@ -3,8 +3,10 @@
 from __future__ import annotations
 
 from enum import Enum
+from pathlib import Path
 from typing import Any, Dict, List, Optional
 
+from dara.utils import submission_fingerprint
 from pydantic import BaseModel, Field
 
 
@@ -32,6 +34,34 @@ class JobInput(BaseModel):
     max_phases: int = 500
     pattern_filename: str
     pattern_path: str
+    # SHA-256 of the pattern file, recorded when the upload is stored
+    pattern_sha256: Optional[str] = None
+
+    def fingerprint(self, custom_cifs: Dict[str, str]) -> str:
+        """Identify the search this input runs, to reuse the job of an identical submission.
+
+        ``custom_cifs`` maps the name of every custom CIF the search will use
+        to its SHA-256. The pattern is identified by its content, not its
+        name, and element lists are compared as sets.
+        """
+        if self.pattern_sha256 is None:
+            raise ValueError("The pattern hash is required to fingerprint a job")
+        params = {
+            "user": self.user,
+            "chemical_system": sorted(self.chemical_system.split("-")),
+            "required_elements": sorted(set(self.required_elements)),
+            "exclude_elements": sorted(set(self.exclude_elements)),
+            "wavelength": self.wavelength.strip(),
+            "instrument_profile": self.instrument_profile,
+            "database": self.database,
+            "mp_experimental_only": self.mp_experimental_only,
+            "mp_max_e_above_hull": float(self.mp_max_e_above_hull),
+            "max_phases": self.max_phases,
+            # the pattern is parsed according to its file extension
+            "pattern_format": Path(self.pattern_filename).suffix.lower(),
+            "custom_cifs": custom_cifs,
+        }
+        return submission_fingerprint(self.pattern_sha256, params)
 
 
 class JobSummary(BaseModel):
@@ -47,6 +77,8 @@ class JobSummary(BaseModel):
     started_at: Optional[str] = None
     finished_at: Optional[str] = None
     error_message: Optional[str] = None
+    worker_id: Optional[str] = None
+    progress: Optional[Dict[str, Any]] = None
 
 
 class Diagnostics(BaseModel):
@@ -68,13 +100,16 @@ class PhaseTable(BaseModel):
 
 
 class SolutionResult(BaseModel):
-    """Result metadata for a single solution."""
+    """Result metadata for a single solution.
+
+    The figure and phase table are left out (``None``) in light-weight details.
+    """
 
     index: int
     rwp: float
     num_phases: int
-    plotly_figure: Dict[str, Any]
-    phases_table: PhaseTable
+    plotly_figure: Optional[Dict[str, Any]] = None
+    phases_table: Optional[PhaseTable] = None
     report_zip_url: str
 
 
@@ -6,10 +6,15 @@ for use in the web/worker pipeline.
 
 from __future__ import annotations
 
+import json
+import os
+import shutil
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 import pandas as pd
+from plotly.utils import PlotlyJSONEncoder
 from pymatgen.core import Structure
 from pymatgen.symmetry.analyzer import SpacegroupAnalyzer
 
@@ -52,6 +57,38 @@ def phase_result_to_dict(phase_result: Any) -> Dict[str, Any] | None:
     return result_dict
 
 
+def cif_metadata(cif_path: str | Path) -> Dict[str, Any]:
+    """Return the formula, symmetry and lattice columns of the phase table for a CIF.
+
+    Parsing the CIF and running the symmetry analysis dominate report
+    generation, and the same candidate CIFs show up in many solutions and
+    jobs, so the result is cached per file (and recomputed if it changes).
+    """
+
+    stat = os.stat(cif_path)
+    return dict(_cif_metadata(str(cif_path), stat.st_mtime_ns, stat.st_size))
+
+
+@lru_cache(maxsize=4096)
+def _cif_metadata(cif_path: str, mtime_ns: int, size: int) -> Dict[str, Any]:
+    structure = Structure.from_file(cif_path)
+    lattice = structure.lattice
+    # One analysis gives all three; get_space_group_info would rerun it per call
+    sga = SpacegroupAnalyzer(structure)
+    return {
+        "Formula": structure.composition.reduced_formula,
+        "Space Group": sga.get_space_group_symbol(),
+        "SG Number": sga.get_space_group_number(),
+        "Crystal System": sga.get_crystal_system(),
+        "a (Å)": f"{lattice.a:.4f}",
+        "b (Å)": f"{lattice.b:.4f}",
+        "c (Å)": f"{lattice.c:.4f}",
+        "α (°)": f"{lattice.alpha:.2f}",
+        "β (°)": f"{lattice.beta:.2f}",
+        "γ (°)": f"{lattice.gamma:.2f}",
+    }
+
+
 def extract_phase_info(solution: Any, custom_cif_dir: Path, database: str) -> pd.DataFrame:
     """Extract detailed crystallographic information from a search result.
 
@@ -69,7 +106,7 @@ def extract_phase_info(solution: Any, custom_cif_dir: Path, database: str) -> pd
 
     for idx, phase in enumerate(phase_list):
         try:
-            structure = Structure.from_file(str(phase.path))
+            metadata = cif_metadata(phase.path)
             phase_name = _Path(phase.path).stem
 
             # Resolve PhaseResult regardless of container type
@@ -94,10 +131,6 @@ def extract_phase_info(solution: Any, custom_cif_dir: Path, database: str) -> pd
                 if candidate_name == phase_name:
                     phase_result = phase_results_source
 
-            lattice = structure.lattice
-            sga = SpacegroupAnalyzer(structure)
-            crystal_system = sga.get_crystal_system()
-
             # Determine source: custom vs database
             if custom_cif_dir and str(custom_cif_dir) in str(phase.path):
                 source = "Custom"
@@ -115,16 +148,7 @@ def extract_phase_info(solution: Any, custom_cif_dir: Path, database: str) -> pd
             phase_info = {
                 "Source": source,
                 "Phase Name": phase_name,
-                "Formula": structure.composition.reduced_formula,
-                "Space Group": structure.get_space_group_info()[0],
-                "SG Number": structure.get_space_group_info()[1],
-                "Crystal System": crystal_system,
-                "a (Å)": f"{lattice.a:.4f}",
-                "b (Å)": f"{lattice.b:.4f}",
-                "c (Å)": f"{lattice.c:.4f}",
-                "α (°)": f"{lattice.alpha:.2f}",
-                "β (°)": f"{lattice.beta:.2f}",
-                "γ (°)": f"{lattice.gamma:.2f}",
+                **metadata,
                 "Weight %": f"{weight_pct:.2f}",
             }
             phase_data.append(phase_info)
@@ -141,6 +165,9 @@ def export_phase_search_report(
     output_dir: Path,
     custom_cif_dir: Path,
     database: str,
+    *,
+    fig: Any = None,
+    phase_info: Optional[pd.DataFrame] = None,
 ) -> Path:
     """Export a comprehensive report for a single solution.
 
@@ -150,10 +177,10 @@ def export_phase_search_report(
     - refinement_stats.json
     - cif_files/*
     - summary.txt
-    """
 
-    import json
-    import shutil
+    ``fig`` and ``phase_info`` may be passed in if the caller already has
+    them, so they are not computed twice.
+    """
 
     output_dir.mkdir(parents=True, exist_ok=True)
     report_dir = output_dir / f"solution_{solution_number}"
@@ -164,16 +191,17 @@ def export_phase_search_report(
 
     # 1. Plot as HTML
     try:
-        fig = solution.visualize()
+        if fig is None:
+            fig = solution.visualize()
         plot_path = report_dir / "refinement_plot.html"
         fig.write_html(str(plot_path))
     except Exception:  # noqa: BLE001
         plot_path = None
 
     # 2. Phase table CSV
-    phase_info = None
     try:
-        phase_info = extract_phase_info(solution, custom_cif_dir=custom_cif_dir, database=database)
+        if phase_info is None:
+            phase_info = extract_phase_info(solution, custom_cif_dir=custom_cif_dir, database=database)
         csv_path = report_dir / "identified_phases.csv"
         phase_info.to_csv(csv_path, index=False)
     except Exception:  # noqa: BLE001
@@ -246,3 +274,66 @@ def export_phase_search_report(
         pass
 
     return report_dir
+
+
+def report_zip_path(report_dir: Path) -> Path:
+    """Return where the zip archive of a report directory is (or will be) written."""
+
+    return report_dir.parent / f"{report_dir.name}.zip"
+
+
+def ensure_report_zip(report_dir: Path) -> Path:
+    """Zip a report directory on first use and return the archive path.
+
+    The archive is written under a temporary name and renamed into place,
+    so concurrent downloads never see a partial zip.
+    """
+
+    zip_path = report_zip_path(report_dir)
+    if not zip_path.exists():
+        tmp_base = report_dir.parent / f".{report_dir.name}.{os.getpid()}.{id(report_dir)}"
+        archive = shutil.make_archive(str(tmp_base), "zip", root_dir=report_dir)
+        os.replace(archive, zip_path)
+    return zip_path
+
+
+def build_solution_report(
+    solution: Any,
+    solution_number: int,
+    output_dir: Path,
+    custom_cif_dir: Path,
+    database: str,
+) -> Dict[str, Any]:
+    """Build everything the worker stores for one solution.
+
+    The figure and phase table are computed once and shared between the
+    stored result and the exported report. The zip archive is not built
+    here but on first download (see ensure_report_zip). This is a module
+    level function so it can run in a worker process; the figure is
+    returned as a JSON string, which is cheap to send back.
+    """
+
+    fig = solution.visualize()
+    phase_df = extract_phase_info(solution, custom_cif_dir=custom_cif_dir, database=database)
+    report_dir = export_phase_search_report(
+        solution,
+        solution_number,
+        output_dir,
+        custom_cif_dir=custom_cif_dir,
+        database=database,
+        fig=fig,
+        phase_info=phase_df,
+    )
+    # A zip left over from an earlier job writing to the same directory is stale now
+    report_zip_path(report_dir).unlink(missing_ok=True)
+    return {
+        "index": solution_number,
+        "rwp": float(solution.refinement_result.lst_data.rwp),
+        "num_phases": len(solution.phases),
+        "figure_json": json.dumps(fig, cls=PlotlyJSONEncoder),
+        "phases_table": {
+            "columns": list(phase_df.columns),
+            "rows": phase_df.to_dict(orient="records"),
+        },
+        "report_dir": str(report_dir),
+    }
@@ -4,15 +4,20 @@ from __future__ import annotations
 
 import json
 import sqlite3
+import threading
 import uuid
+import zlib
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, List, Optional, Sequence
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
-from .models import JobDetail, JobInput, JobStatus, JobSummary
+from .models import Diagnostics, JobDetail, JobInput, JobStatus, JobSummary, SolutionResult
 
 ISO_FMT = "%Y-%m-%dT%H:%M:%S.%fZ"
 
+# Heavy per-solution fields kept out of detail_json, each stored as a zlib blob
+SOLUTION_BLOB_FIELDS = ("plotly_figure", "phases_table")
+
 
 def _now() -> str:
     return datetime.now(tz=timezone.utc).strftime(ISO_FMT)
@@ -21,13 +26,36 @@ def _now() -> str:
 class JobStore:
     """Persist job metadata and results using SQLite."""
 
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, *, timeout: float = 30.0):
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
-        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        self._conn.row_factory = sqlite3.Row
+        self.timeout = timeout
+        # One connection per thread: API handlers and worker job slots never share
+        # a connection (or its transaction), and WAL lets readers run alongside a writer
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
         self._init_db()
 
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _connect(self) -> sqlite3.Connection:
+        # check_same_thread=False only so that close() can close every thread's connection
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
     def _init_db(self) -> None:
         with self._conn:
             self._conn.execute(
@@ -43,7 +71,10 @@ class JobStore:
                     started_at TEXT,
                     finished_at TEXT,
                     error_message TEXT,
-                    job_input_json TEXT NOT NULL
+                    job_input_json TEXT NOT NULL,
+                    worker_id TEXT,
+                    progress_json TEXT,
+                    fingerprint TEXT
                 )
                 """
             )
@@ -56,31 +87,88 @@ class JobStore:
                 )
                 """
             )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS solution_blobs (
+                    job_id TEXT NOT NULL,
+                    solution_index INTEGER NOT NULL,
+                    field TEXT NOT NULL,
+                    data BLOB NOT NULL,
+                    PRIMARY KEY (job_id, solution_index, field),
+                    FOREIGN KEY(job_id) REFERENCES jobs(job_id) ON DELETE CASCADE
+                )
+                """
+            )
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            for column in ("worker_id", "progress_json", "fingerprint"):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} TEXT")
+            # created_at is a fixed-width ISO string, so it sorts chronologically as
+            # text; job_id breaks ties and makes (created_at, job_id) a unique cursor
+            for name, columns_sql in (
+                ("idx_jobs_created", "created_at, job_id"),
+                ("idx_jobs_status_created", "status, created_at, job_id"),
+                ("idx_jobs_user_created", "user, created_at, job_id"),
+                ("idx_jobs_fingerprint", "fingerprint, created_at"),
+            ):
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON jobs ({columns_sql})")
 
     def close(self) -> None:
-        self._conn.close()
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
 
-    def create_job(self, job_input: JobInput) -> str:
-        job_id = uuid.uuid4().hex
-        created_at = _now()
+    def create_job(self, job_input: JobInput, *, fingerprint: Optional[str] = None) -> str:
         with self._conn:
-            self._conn.execute(
+            return self._insert_job(job_input, fingerprint)
+
+    def submit_job(self, job_input: JobInput, fingerprint: str) -> Tuple[JobSummary, bool]:
+        """Create a job, unless an identical one is pending, running or completed.
+
+        Returns the new job, or the newest job with the same ``fingerprint``
+        (see JobInput.fingerprint) together with ``True``. Failed jobs are
+        never reused, so resubmitting retries them. The lookup and the insert
+        run in one write transaction, so identical submissions arriving at the
+        same time still create a single job.
+        """
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._conn.execute(
                 """
-                INSERT INTO jobs (
-                    job_id, user, pattern_filename, database, status,
-                    created_at, job_input_json
-                ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                SELECT * FROM jobs
+                WHERE fingerprint = ? AND status != ?
+                ORDER BY created_at DESC
+                LIMIT 1
                 """,
-                (
-                    job_id,
-                    job_input.user,
-                    job_input.pattern_filename,
-                    job_input.database,
-                    JobStatus.PENDING.value,
-                    created_at,
-                    json.dumps(job_input.model_dump()),
-                ),
-            )
+                (fingerprint, JobStatus.FAILED.value),
+            ).fetchone()
+            if row is not None:
+                return self._row_to_summary(row), True
+            job_id = self._insert_job(job_input, fingerprint)
+        return self.get_job(job_id), False
+
+    def _insert_job(self, job_input: JobInput, fingerprint: Optional[str]) -> str:
+        job_id = uuid.uuid4().hex
+        self._conn.execute(
+            """
+            INSERT INTO jobs (
+                job_id, user, pattern_filename, database, status,
+                created_at, job_input_json, fingerprint
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                job_id,
+                job_input.user,
+                job_input.pattern_filename,
+                job_input.database,
+                JobStatus.PENDING.value,
+                _now(),
+                json.dumps(job_input.model_dump()),
+                fingerprint,
+            ),
+        )
         return job_id
 
     def get_job(self, job_id: str) -> Optional[JobSummary]:
@@ -96,41 +184,95 @@ class JobStore:
         user: Optional[str] = None,
         limit: Optional[int] = None,
         offset: Optional[int] = None,
+        after: Optional[str] = None,
     ) -> List[JobSummary]:
-        clauses: List[str] = []
-        params: List[Any] = []
-        if status:
-            clauses.append("status = ?")
-            params.append(status.value)
-        if user:
-            clauses.append("user LIKE ?")
-            params.append(f"%{user}%")
-        where_sql = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        """List jobs in submission order, optionally filtered by status and user.
+
+        Pass the ``job_id`` of the last job of a page as ``after`` to get the
+        next page (keyset pagination); unlike ``offset`` this does not scan
+        the skipped rows. An unknown ``after`` job id yields an empty list.
+        """
+        where_sql, params = self._filter_sql(status, user)
+        if after is not None:
+            where_sql += " AND " if where_sql else "WHERE "
+            where_sql += (
+                "(created_at, job_id) > (SELECT created_at, job_id FROM jobs WHERE job_id = ?)"
+            )
+            params.append(after)
         paging = ""
-        if limit is not None:
+        if limit is not None or offset is not None:
             paging += " LIMIT ?"
-            params.append(limit)
+            params.append(limit if limit is not None else -1)
         if offset is not None:
             paging += " OFFSET ?"
             params.append(offset)
         rows = self._conn.execute(
-            f"SELECT * FROM jobs {where_sql} ORDER BY datetime(created_at) ASC{paging}",
+            f"SELECT * FROM jobs {where_sql} ORDER BY created_at ASC, job_id ASC{paging}",
             tuple(params),
         ).fetchall()
         return [self._row_to_summary(row) for row in rows]
 
+    def count_jobs(
+        self,
+        status: Optional[JobStatus] = None,
+        user: Optional[str] = None,
+    ) -> int:
+        """Count the jobs matching the filters of list_jobs, using the covering indexes."""
+        where_sql, params = self._filter_sql(status, user)
+        row = self._conn.execute(f"SELECT COUNT(*) FROM jobs {where_sql}", tuple(params)).fetchone()
+        return row[0]
+
+    @staticmethod
+    def _filter_sql(
+        status: Optional[JobStatus], user: Optional[str]
+    ) -> Tuple[str, List[Any]]:
+        clauses: List[str] = []
+        params: List[Any] = []
+        if status:
+            clauses.append("status = ?")
+            params.append(status.value)
+        if user:
+            clauses.append("user = ?")
+            params.append(user)
+        where_sql = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where_sql, params
+
     def get_next_pending_job(self) -> Optional[JobSummary]:
         row = self._conn.execute(
             """
             SELECT * FROM jobs
             WHERE status = ?
-            ORDER BY datetime(created_at) ASC
+            ORDER BY created_at ASC, job_id ASC
             LIMIT 1
             """,
             (JobStatus.PENDING.value,),
         ).fetchone()
         return self._row_to_summary(row) if row else None
 
+    def claim_next_job(self, worker_id: Optional[str] = None) -> Optional[JobSummary]:
+        """Atomically mark the oldest pending job as running and return it.
+
+        The job is selected and updated by a single ``UPDATE ... RETURNING``
+        statement, which holds the database write lock throughout, so several
+        workers (threads or processes) polling the same database never claim
+        the same job. Returns ``None`` if there is no pending job.
+        """
+        with self._conn:
+            row = self._conn.execute(
+                """
+                UPDATE jobs SET status = ?, started_at = ?, worker_id = ?
+                WHERE job_id = (
+                    SELECT job_id FROM jobs
+                    WHERE status = ?
+                    ORDER BY created_at ASC, job_id ASC
+                    LIMIT 1
+                )
+                RETURNING *
+                """,
+                (JobStatus.RUNNING.value, _now(), worker_id, JobStatus.PENDING.value),
+            ).fetchone()
+        return self._row_to_summary(row) if row else None
+
     def update_status(
         self,
         job_id: str,
@@ -140,6 +282,26 @@ class JobStore:
         num_phases: Optional[int] = None,
         started: bool = False,
         finished: bool = False,
+    ) -> None:
+        with self._conn:
+            self._set_status(
+                job_id,
+                status,
+                error_message=error_message,
+                num_phases=num_phases,
+                started=started,
+                finished=finished,
+            )
+
+    def _set_status(
+        self,
+        job_id: str,
+        status: JobStatus,
+        *,
+        error_message: Optional[str] = None,
+        num_phases: Optional[int] = None,
+        started: bool = False,
+        finished: bool = False,
     ) -> None:
         fields: List[str] = ["status = ?"]
         params: List[Any] = [status.value]
@@ -156,10 +318,49 @@ class JobStore:
             fields.append("finished_at = ?")
             params.append(_now())
         params.append(job_id)
+        self._conn.execute(
+            f"UPDATE jobs SET {', '.join(fields)} WHERE job_id = ?",
+            tuple(params),
+        )
+
+    def finish_job(
+        self,
+        job_id: str,
+        status: JobStatus,
+        *,
+        diagnostics: Optional[Diagnostics] = None,
+        solutions: Sequence[SolutionResult] = (),
+        error_message: Optional[str] = None,
+        num_phases: Optional[int] = None,
+    ) -> JobDetail:
+        """Store the final detail of a job and set its terminal status in one transaction.
+
+        Readers never see a completed or failed job without its detail, so a
+        client that fetches the detail on the terminal status always gets it.
+        """
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._set_status(
+                job_id,
+                status,
+                error_message=error_message,
+                num_phases=num_phases,
+                finished=True,
+            )
+            detail = JobDetail(
+                job=self.get_job(job_id),
+                diagnostics=diagnostics,
+                solutions=list(solutions),
+            )
+            self._write_job_detail(job_id, detail)
+        return detail
+
+    def update_progress(self, job_id: str, progress: Dict[str, Any]) -> None:
+        """Replace the live progress of a running job (shown until it finishes)."""
         with self._conn:
             self._conn.execute(
-                f"UPDATE jobs SET {', '.join(fields)} WHERE job_id = ?",
-                tuple(params),
+                "UPDATE jobs SET progress_json = ? WHERE job_id = ?",
+                (json.dumps(progress), job_id),
             )
 
     def get_job_input(self, job_id: str) -> Optional[JobInput]:
@@ -173,25 +374,88 @@ class JobStore:
         return JobInput.model_validate(data)
 
     def save_job_detail(self, job_id: str, detail: JobDetail) -> None:
-        detail_json = json.dumps(detail.model_dump())
+        """Store a job detail, with each solution's figure and phase table as a separate blob.
+
+        The remaining light-weight detail stays small enough to be listed and
+        polled cheaply; the blobs are only read back when they are requested.
+        """
         with self._conn:
-            self._conn.execute(
-                """
-                INSERT INTO job_details (job_id, detail_json)
-                VALUES (?, ?) ON CONFLICT(job_id)
-                DO UPDATE SET detail_json = excluded.detail_json
-                """,
-                (job_id, detail_json),
-            )
+            self._write_job_detail(job_id, detail)
 
-    def load_job_detail(self, job_id: str) -> Optional[JobDetail]:
+    def _write_job_detail(self, job_id: str, detail: JobDetail) -> None:
+        exclude = {"solutions": {"__all__": set(SOLUTION_BLOB_FIELDS)}}
+        detail_json = json.dumps(detail.model_dump(exclude=exclude))
+        blobs = [
+            (job_id, solution.index, field, zlib.compress(json.dumps(value).encode()))
+            for solution in detail.solutions
+            for field, value in solution.model_dump(include=set(SOLUTION_BLOB_FIELDS)).items()
+            if value is not None
+        ]
+        self._conn.execute(
+            """
+            INSERT INTO job_details (job_id, detail_json)
+            VALUES (?, ?) ON CONFLICT(job_id)
+            DO UPDATE SET detail_json = excluded.detail_json
+            """,
+            (job_id, detail_json),
+        )
+        self._conn.execute("DELETE FROM solution_blobs WHERE job_id = ?", (job_id,))
+        self._conn.executemany(
+            """
+            INSERT INTO solution_blobs (job_id, solution_index, field, data)
+            VALUES (?, ?, ?, ?)
+            """,
+            blobs,
+        )
+
+    def load_job_detail(self, job_id: str, *, light: bool = False) -> Optional[JobDetail]:
+        """Load a job detail; with ``light=True`` the figures and phase tables are left out."""
         row = self._conn.execute(
             "SELECT detail_json FROM job_details WHERE job_id = ?",
             (job_id,),
         ).fetchone()
         if row is None:
             return None
-        return JobDetail.model_validate(json.loads(row[0]))
+        data = json.loads(row[0])
+        if light:
+            # Details saved before the blobs were split off still carry the fields inline
+            for solution in data["solutions"]:
+                for field in SOLUTION_BLOB_FIELDS:
+                    solution.pop(field, None)
+        else:
+            blobs = self._conn.execute(
+                "SELECT solution_index, field, data FROM solution_blobs WHERE job_id = ?",
+                (job_id,),
+            ).fetchall()
+            solutions = {solution["index"]: solution for solution in data["solutions"]}
+            for blob in blobs:
+                solution = solutions.get(blob["solution_index"])
+                if solution is not None:
+                    solution[blob["field"]] = json.loads(zlib.decompress(blob["data"]))
+        return JobDetail.model_validate(data)
+
+    def load_solution_blob(self, job_id: str, solution_index: int, field: str) -> Optional[bytes]:
+        """Return one solution field as zlib-compressed JSON, without decoding it.
+
+        ``field`` is one of ``SOLUTION_BLOB_FIELDS``. Returns ``None`` if the
+        job, the solution or the field does not exist.
+        """
+        if field not in SOLUTION_BLOB_FIELDS:
+            raise ValueError(f"Unknown solution field: {field}")
+        row = self._conn.execute(
+            """
+            SELECT data FROM solution_blobs
+            WHERE job_id = ? AND solution_index = ? AND field = ?
+            """,
+            (job_id, solution_index, field),
+        ).fetchone()
+        if row is not None:
+            return row["data"]
+        # Fall back to details saved before the blobs were split off
+        detail = self.load_job_detail(job_id)
+        solution = next((s for s in detail.solutions if s.index == solution_index), None) if detail else None
+        value = solution.model_dump()[field] if solution else None
+        return None if value is None else zlib.compress(json.dumps(value).encode())
 
     def _row_to_summary(self, row: sqlite3.Row) -> JobSummary:
         return JobSummary(
@@ -205,6 +469,8 @@ class JobStore:
             started_at=row["started_at"],
             finished_at=row["finished_at"],
             error_message=row["error_message"],
+            worker_id=row["worker_id"],
+            progress=json.loads(row["progress_json"]) if row["progress_json"] else None,
         )
 
     def __del__(self) -> None:  # pragma: no cover - best effort cleanup
@@ -0,0 +1,107 @@
+"""Streaming storage of uploaded files for dara_local_v2."""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict
+
+from dara.utils import copy_stream
+from fastapi import HTTPException, UploadFile
+
+# Upload size limits; 2-D detector exports can be large, CIFs never are
+MAX_PATTERN_BYTES = 256 * 1024 * 1024
+MAX_CIF_BYTES = 16 * 1024 * 1024
+
+
+@dataclass(frozen=True)
+class StoredUpload:
+    """An uploaded file written to disk."""
+
+    path: Path
+    size: int
+    sha256: str
+
+
+async def save_upload(
+    upload: UploadFile,
+    dest_dir: Path,
+    *,
+    max_bytes: int,
+    content_addressed: bool = False,
+) -> StoredUpload:
+    """Stream an upload to ``dest_dir`` without holding it in memory.
+
+    The file is copied and hashed chunk by chunk in a worker thread, so the
+    event loop is never blocked. It is first written to a temporary file and
+    then moved into place, so a failed or oversized upload leaves nothing behind.
+
+    Parameters
+    ----------
+    upload:
+        The uploaded file.
+    dest_dir:
+        Directory to store the file in, under its (base) file name.
+    max_bytes:
+        Uploads larger than this are rejected with HTTP 413.
+    content_addressed:
+        Store the file as ``dest_dir / <hash prefix> / <file name>``, so
+        identical uploads share one file and different files with the same
+        name never overwrite each other.
+    """
+    filename = Path(upload.filename or "").name
+    if not filename:
+        raise HTTPException(status_code=400, detail="Uploaded file has no name")
+
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(prefix=".upload-", dir=dest_dir)
+    os.close(fd)
+    tmp_path = Path(tmp_name)
+    try:
+        size, sha256 = await asyncio.to_thread(copy_stream, upload.file, tmp_path, max_bytes)
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=413, detail=f"{filename} is larger than {max_bytes // (1024 * 1024)} MB"
+        ) from exc
+
+    if content_addressed:
+        path = dest_dir / sha256[:16] / filename
+        path.parent.mkdir(exist_ok=True)
+        duplicate = path.exists()
+    else:
+        path = dest_dir / filename
+        duplicate = (
+            path.exists()
+            and path.stat().st_size == size
+            and await asyncio.to_thread(file_sha256, path) == sha256
+        )
+
+    if duplicate:
+        # Identical file already stored; leaving it untouched also keeps its
+        # mtime, and with it the worker's cached CIF metadata, valid
+        tmp_path.unlink()
+    else:
+        os.replace(tmp_path, path)
+    return StoredUpload(path=path, size=size, sha256=sha256)
+
+
+def file_sha256(path: Path) -> str:
+    """Hash a stored file in chunks."""
+    sha256 = hashlib.sha256()
+    with path.open("rb") as fp:
+        while chunk := fp.read(1 << 20):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+async def cif_hashes(cif_dir: Path) -> Dict[str, str]:
+    """Map the name of every CIF in ``cif_dir`` to its SHA-256, hashing off the event loop."""
+
+    def hash_all() -> Dict[str, str]:
+        return {path.name: file_sha256(path) for path in sorted(cif_dir.glob("*.cif"))}
+
+    return await asyncio.to_thread(hash_all)
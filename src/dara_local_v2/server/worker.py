@@ -2,28 +2,39 @@
 
 from __future__ import annotations
 
+import json
 import logging
+import multiprocessing
+import os
+import socket
 import sys
-import time
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import Any, Dict, List, Optional
 
-import numpy as np
 from dara import search_phases
-from plotly.utils import PlotlyJSONEncoder
+from dara.search.progress import ThrottledProgress
+from dara.xrd import load_pattern
 
 from .models import Diagnostics, JobDetail, JobInput, JobStatus, PhaseTable, SolutionResult
-from .phase_utils import export_phase_search_report, extract_phase_info
+from .phase_utils import build_solution_report, report_zip_path
 from .queue import JobStore
 
 LOGGER = logging.getLogger("dara_local_v2.worker")
 
+# Search progress is written to the job store at most this often
+PROGRESS_INTERVAL_SECONDS = 1.0
+
 REPO_ROOT = Path(__file__).resolve().parents[3]
 SCRIPTS_DIR = REPO_ROOT / "scripts"
 if str(SCRIPTS_DIR) not in sys.path:
     sys.path.insert(0, str(SCRIPTS_DIR))
 
 from dara_adapter import prepare_phases_for_dara  # type: ignore  # noqa: E402
+from database_interface import element_filter_expression  # type: ignore  # noqa: E402
+
+from .index_service import IndexService  # noqa: E402
 
 
 class Worker:
@@ -37,36 +48,71 @@ class Worker:
         base_workdir: Path | None = None,
         indexes_dir: Path | None = None,
         sleep_seconds: int = 2,
+        index_service: IndexService | None = None,
+        max_concurrent_jobs: int = 1,
+        cpus_per_job: Optional[int] = None,
+        worker_id: Optional[str] = None,
+        wake_event: Optional[Any] = None,
+        report_workers: Optional[int] = None,
     ) -> None:
         self.store = store
         self.repo_root = repo_root or REPO_ROOT
         self.base_workdir = base_workdir or (Path.home() / "Documents" / "dara_analysis")
         self.indexes_dir = indexes_dir or (self.repo_root / "indexes")
         self.sleep_seconds = sleep_seconds
+        self.index_service = index_service or IndexService(cache_dir=self.base_workdir / ".index_cache")
+        # Uploaded patterns are parsed once; diagnostics and peak detection memory-map the result
+        self.pattern_cache_dir = self.base_workdir / ".pattern_cache"
+        # In pool mode, up to max_concurrent_jobs searches share one Ray cluster and
+        # each may keep at most cpus_per_job tasks in flight (default: an even split)
+        self.max_concurrent_jobs = max(1, max_concurrent_jobs)
+        self.cpus_per_job = cpus_per_job
+        self._stop_event = threading.Event()
+        # Set by the API on every submission (a multiprocessing.Event when the worker
+        # runs in its own process), so idle workers start new jobs right away;
+        # sleep_seconds only bounds the wait for jobs submitted elsewhere
+        self._wake_event = wake_event or threading.Event()
+        # Solution reports are built in a long-lived process pool shared by all job
+        # slots, so the spawn cost and the per-CIF metadata cache carry over between jobs
+        self.report_workers = report_workers if report_workers is not None else min(4, os.cpu_count() or 1)
+        self._report_executor: ProcessPoolExecutor | None = None
+        self._report_executor_lock = threading.Lock()
+        # Recorded on every claimed job, to tell which worker process ran it
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
 
     # ------------------------------------------------------------------
     # Public API
     # ------------------------------------------------------------------
     def run_forever(self) -> None:
-        LOGGER.info("Worker loop started")
-        while True:
-            job = self.store.get_next_pending_job()
-            if job is None:
-                time.sleep(self.sleep_seconds)
-                continue
-            try:
-                self.process_job(job.job_id)
-            except Exception as exc:  # noqa: BLE001
-                LOGGER.exception("Job %s failed: %s", job.job_id, exc)
-
-    def process_job(self, job_id: str) -> None:
+        LOGGER.info("Worker loop started with %d job slot(s)", self.max_concurrent_jobs)
+        try:
+            if self.max_concurrent_jobs > 1:
+                self._run_pool()
+            else:
+                self._run_serial()
+        finally:
+            if self._report_executor is not None:
+                self._report_executor.shutdown()
+                self._report_executor = None
+
+    def wake(self) -> None:
+        """Make an idle worker look for pending jobs immediately."""
+        self._wake_event.set()
+
+    def stop(self) -> None:
+        """Ask run_forever to return once the running jobs have finished."""
+        self._stop_event.set()
+        self._wake_event.set()
+
+    def process_job(self, job_id: str, *, claimed: bool = False) -> None:
         LOGGER.info("Processing job %s", job_id)
         job_input = self.store.get_job_input(job_id)
         if job_input is None:
             self._mark_failed(job_id, "Missing job input")
             return
 
-        self.store.update_status(job_id, JobStatus.RUNNING, started=True)
+        if not claimed:
+            self.store.update_status(job_id, JobStatus.RUNNING, started=True)
         try:
             detail = self._execute_job(job_id, job_input)
             LOGGER.info("Job %s completed with %d solutions", job_id, len(detail.solutions))
@@ -77,12 +123,82 @@ class Worker:
     # ------------------------------------------------------------------
     # Internal helpers
     # ------------------------------------------------------------------
+    def _run_serial(self) -> None:
+        while not self._stop_event.is_set():
+            # Clear before claiming, so a submission made meanwhile is not missed
+            self._wake_event.clear()
+            job = self.store.claim_next_job(self.worker_id)
+            if job is None:
+                self._wake_event.wait(self.sleep_seconds)
+                continue
+            self._process_claimed_job(job.job_id)
+
+    def _run_pool(self) -> None:
+        """Run up to ``max_concurrent_jobs`` claimed jobs at the same time."""
+        self._init_ray()
+        running: Dict[Future, str] = {}
+        with ThreadPoolExecutor(
+            max_workers=self.max_concurrent_jobs, thread_name_prefix="dara-job"
+        ) as executor:
+            while not self._stop_event.is_set():
+                self._wake_event.clear()
+                for future in [f for f in running if f.done()]:
+                    running.pop(future)
+                while len(running) < self.max_concurrent_jobs:
+                    job = self.store.claim_next_job(self.worker_id)
+                    if job is None:
+                        break
+                    future = executor.submit(self._process_claimed_job, job.job_id)
+                    # A finished job frees a slot, so it wakes the loop like a submission
+                    future.add_done_callback(lambda _: self._wake_event.set())
+                    running[future] = job.job_id
+                self._wake_event.wait(self.sleep_seconds)
+
+    def _process_claimed_job(self, job_id: str) -> None:
+        try:
+            self.process_job(job_id, claimed=True)
+        except Exception as exc:  # noqa: BLE001
+            LOGGER.exception("Job %s failed: %s", job_id, exc)
+
+    def _init_ray(self) -> None:
+        """Start the Ray cluster shared by all job slots and size the per-job CPU quota."""
+        import ray
+
+        try:
+            if not ray.is_initialized():
+                ray.init(runtime_env={"working_dir": None}, ignore_reinit_error=True)
+            total_cpus = int(ray.cluster_resources().get("CPU", 1))
+        except Exception as exc:  # noqa: BLE001
+            LOGGER.warning("Failed to initialize Ray (%s); jobs will size their own pools", exc)
+            return
+        if self.cpus_per_job is None:
+            self.cpus_per_job = max(1, total_cpus // self.max_concurrent_jobs)
+        LOGGER.info(
+            "Sharing %d Ray CPUs between %d job slots (%d CPUs per job)",
+            total_cpus,
+            self.max_concurrent_jobs,
+            self.cpus_per_job,
+        )
+
+    def _search_kwargs(self) -> dict:
+        """Return the search_phases arguments that keep a job within its CPU quota.
+
+        The job runs at most ``cpus_per_job`` refinements at once, each on a single
+        BGMN thread, so concurrent jobs never oversubscribe the cores.
+        """
+        if self.cpus_per_job is None:
+            return {}
+        return {
+            "max_workers": self.cpus_per_job,
+            "refinement_params": {"n_threads": 1},
+        }
+
     def _execute_job(self, job_id: str, job_input: JobInput) -> JobDetail:
         pattern_path = Path(job_input.pattern_path)
         if not pattern_path.exists():
             raise FileNotFoundError(f"Pattern file not found: {pattern_path}")
 
-        work_dirs = self._ensure_workdirs(job_input)
+        work_dirs = self._ensure_workdirs(job_id, job_input)
         diagnostics = self._compute_diagnostics(pattern_path)
 
         all_cifs = self._collect_cifs(job_input, work_dirs["custom_cif_dir"])
@@ -92,56 +208,46 @@ class Worker:
             )
 
         LOGGER.info("Job %s: running phase search on %d phases", job_id, len(all_cifs))
+        progress = ThrottledProgress(
+            lambda state: self.store.update_progress(job_id, state),
+            min_interval=PROGRESS_INTERVAL_SECONDS,
+        )
         search_results = search_phases(
             pattern_path=str(pattern_path),
             phases=all_cifs,
             wavelength=job_input.wavelength,
             instrument_profile=job_input.instrument_profile,
+            progress=progress,
+            **self._search_kwargs(),
         )
+        progress.flush()
 
-        solutions: List[SolutionResult] = []
-        for idx, solution in enumerate(search_results, start=1):
-            fig = solution.visualize()
-            phase_df = extract_phase_info(
-                solution,
-                custom_cif_dir=work_dirs["custom_cif_dir"],
-                database=job_input.database,
-            )
-            phases_table = PhaseTable(
-                columns=list(phase_df.columns),
-                rows=phase_df.to_dict(orient="records"),
-            )
-
-            report_dir = export_phase_search_report(
-                solution,
-                idx,
-                work_dirs["reports_dir"],
-                custom_cif_dir=work_dirs["custom_cif_dir"],
-                database=job_input.database,
-            )
-            zip_path = self._make_zip(report_dir)
-
-            solutions.append(
-                SolutionResult(
-                    index=idx,
-                    rwp=float(solution.refinement_result.lst_data.rwp),
-                    num_phases=len(solution.phases),
-                    plotly_figure=self._figure_to_json(fig),
-                    phases_table=phases_table,
-                    report_zip_url=str(zip_path),
-                )
+        reports = self._build_reports(
+            [
+                (solution, idx, work_dirs["reports_dir"], work_dirs["custom_cif_dir"], job_input.database)
+                for idx, solution in enumerate(search_results, start=1)
+            ]
+        )
+        solutions: List[SolutionResult] = [
+            SolutionResult(
+                index=report["index"],
+                rwp=report["rwp"],
+                num_phases=report["num_phases"],
+                plotly_figure=json.loads(report["figure_json"]),
+                phases_table=PhaseTable(**report["phases_table"]),
+                # The archive itself is built on first download
+                report_zip_url=str(report_zip_path(Path(report["report_dir"]))),
             )
+            for report in reports
+        ]
 
-        self.store.update_status(
+        return self.store.finish_job(
             job_id,
             JobStatus.COMPLETED,
+            diagnostics=diagnostics,
+            solutions=solutions,
             num_phases=len(all_cifs),
-            finished=True,
         )
-        summary = self.store.get_job(job_id)
-        detail = JobDetail(job=summary, diagnostics=diagnostics, solutions=solutions)
-        self.store.save_job_detail(job_id, detail)
-        return detail
 
     def _collect_cifs(self, job_input: JobInput, custom_cif_dir: Path) -> List[str]:
         database = job_input.database.upper()
@@ -152,8 +258,18 @@ class Worker:
             if not index_path.exists():
                 raise FileNotFoundError(f"Index not found for {database}: {index_path}")
 
+            # Element predicates are pushed down to the cached Arrow table, so only
+            # the matching rows are materialised for the remaining filters
+            db = self.index_service.query(
+                index_path,
+                filter=element_filter_expression(
+                    allowed=job_input.required_elements,
+                    exclude=job_input.exclude_elements,
+                ),
+            )
             prepare_kwargs = {
                 "index_path": index_path,
+                "db": db,
                 "required_elements": job_input.required_elements,
                 "exclude_elements": job_input.exclude_elements,
                 "max_phases": job_input.max_phases,
@@ -185,14 +301,16 @@ class Worker:
             raise ValueError(f"Unsupported database: {database}")
         return mapping[database]
 
-    def _ensure_workdirs(self, job_input: JobInput) -> dict:
+    def _ensure_workdirs(self, job_id: str, job_input: JobInput) -> dict:
         chem_dir_name = job_input.chemical_system.replace("-", "")
         base_dir = self.base_workdir / chem_dir_name
         custom_dir = base_dir / "custom_cifs"
-        reports_dir = base_dir / "reports"
+        # Each job writes its reports to its own directory, so concurrent jobs
+        # of the same chemical system never overwrite each other's solutions
+        reports_dir = base_dir / "reports" / job_id
         base_dir.mkdir(parents=True, exist_ok=True)
         custom_dir.mkdir(exist_ok=True)
-        reports_dir.mkdir(exist_ok=True)
+        reports_dir.mkdir(parents=True, exist_ok=True)
         return {
             "base_dir": base_dir,
             "custom_cif_dir": custom_dir,
@@ -201,11 +319,11 @@ class Worker:
 
     def _compute_diagnostics(self, pattern_path: Path) -> Diagnostics:
         try:
-            data = np.loadtxt(pattern_path)
-            if data.ndim != 2 or data.shape[1] < 2:
+            data = load_pattern(pattern_path, cache_dir=self.pattern_cache_dir)
+            two_theta = data.angles
+            intensity = data.intensities
+            if two_theta.ndim != 1 or two_theta.size == 0:
                 raise ValueError("Pattern file must have two columns")
-            two_theta = data[:, 0]
-            intensity = data[:, 1]
             checks = {
                 "intensity": "ok" if intensity.max() >= 100 else "warn",
                 "num_points": "ok" if len(two_theta) >= 100 else "warn",
@@ -231,28 +349,25 @@ class Worker:
                 checks={"intensity": "warn", "num_points": "warn", "two_theta_range": "warn"},
             )
 
-    def _make_zip(self, report_dir: Path) -> Path:
-        import shutil
-
-        archive_path = shutil.make_archive(str(report_dir), "zip", root_dir=report_dir)
-        return Path(archive_path)
-
-    def _figure_to_json(self, fig):
-        import json
-
-        json_str = json.dumps(fig, cls=PlotlyJSONEncoder)
-        return json.loads(json_str)
+    def _build_reports(self, report_args: List[tuple]) -> List[dict]:
+        """Run build_solution_report for every solution, in parallel when possible."""
+        if self.report_workers <= 1 or len(report_args) <= 1:
+            return [build_solution_report(*args) for args in report_args]
+        with self._report_executor_lock:
+            if self._report_executor is None:
+                # spawn: forking the threaded Ray driver process is not safe
+                self._report_executor = ProcessPoolExecutor(
+                    max_workers=self.report_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            executor = self._report_executor
+        return list(executor.map(build_solution_report, *zip(*report_args)))
 
     def _mark_failed(self, job_id: str, message: str) -> None:
-        self.store.update_status(
+        self.store.finish_job(
             job_id,
             JobStatus.FAILED,
             error_message=message,
-            finished=True,
-        )
-        summary = self.store.get_job(job_id)
-        detail = JobDetail(
-            job=summary,
             diagnostics=Diagnostics(
                 two_theta_min=0.0,
                 two_theta_max=0.0,
@@ -261,6 +376,4 @@ class Worker:
                 num_points=0,
                 checks={"intensity": "warn", "num_points": "warn", "two_theta_range": "warn"},
             ),
-            solutions=[],
         )
-        self.store.save_job_detail(job_id, detail)
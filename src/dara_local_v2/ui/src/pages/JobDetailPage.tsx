@@ -3,7 +3,7 @@ import { useEffect, useMemo, useState } from 'react'
 import { Link, useParams } from 'react-router-dom'
 
 import StatusBadge from '../components/StatusBadge'
-import type { JobDetail, SolutionResult } from '../types/jobs'
+import type { JobDetail, JobSummary, PhaseTable as PhaseTableData, SolutionResult } from '../types/jobs'
 import { fetchJSON } from '../utils/api'
 
 function formatNumber(value: number, fractionDigits = 2) {
@@ -22,8 +22,10 @@ function formatDateTime(value?: string | null) {
   }
 }
 
-function PhaseTable({ solution }: { solution: SolutionResult }) {
-  const { phases_table: table } = solution
+function PhaseTable({ table }: { table: PhaseTableData | null }) {
+  if (!table) {
+    return <p className="muted-text">Loading phase table…</p>
+  }
   if (!table.rows.length) {
     return <p className="muted-text">Phase table not available.</p>
   }
@@ -51,6 +53,89 @@ function PhaseTable({ solution }: { solution: SolutionResult }) {
   )
 }
 
+function formatProgress(progress: Record<string, unknown>) {
+  const parts: string[] = []
+  if (typeof progress.num_peaks === 'number') parts.push(`${progress.num_peaks} peaks`)
+  if (typeof progress.refinements_total === 'number') {
+    parts.push(`${progress.refinements_done ?? 0}/${progress.refinements_total} candidates refined`)
+  }
+  if (typeof progress.nodes_expanded === 'number') parts.push(`${progress.nodes_expanded} nodes expanded`)
+  if (typeof progress.best_rwp === 'number') parts.push(`best Rwp ${formatNumber(progress.best_rwp)}`)
+  return parts.join(' · ') || '—'
+}
+
+type PlotlyFigure = { data?: any[]; layout?: Record<string, unknown>; frames?: any[] }
+
+// The job detail only lists the solutions; each card loads its own figure and
+// phase table, so opening a job does not transfer every solution's plot at once
+function SolutionCard({ jobId, solution }: { jobId: string; solution: SolutionResult }) {
+  const [figure, setFigure] = useState<PlotlyFigure | null>(null)
+  const [table, setTable] = useState<PhaseTableData | null>(null)
+  const [error, setError] = useState<string | null>(null)
+
+  useEffect(() => {
+    let active = true
+    const base = `/api/jobs/${jobId}/solutions/${solution.index}`
+    Promise.all([fetchJSON<PlotlyFigure>(`${base}/figure`), fetchJSON<PhaseTableData>(`${base}/phases`)])
+      .then(([figureData, tableData]) => {
+        if (active) {
+          setFigure(figureData)
+          setTable(tableData)
+        }
+      })
+      .catch((err) => {
+        if (active) {
+          setError(err instanceof Error ? err.message : 'Unable to load solution')
+        }
+      })
+    return () => {
+      active = false
+    }
+  }, [jobId, solution.index])
+
+  return (
+    <div className="solution-card">
+      <div>
+        <p className="eyebrow">Solution #{solution.index}</p>
+        <h4>Rwp {formatNumber(solution.rwp, 3)}</h4>
+        <p className="muted-text">{solution.num_phases} phases</p>
+      </div>
+      {error ? (
+        <p className="muted-text">{error}</p>
+      ) : (
+        <>
+          <div className="plot-wrapper">
+            {figure ? (
+              <Plot
+                data={Array.isArray(figure.data) ? figure.data : []}
+                layout={{
+                  height: 320,
+                  margin: { t: 32, r: 12, b: 60, l: 48 },
+                  ...figure.layout,
+                }}
+                frames={figure.frames}
+                config={{ displaylogo: false, responsive: true }}
+                style={{ width: '100%', height: '100%' }}
+              />
+            ) : (
+              <p className="muted-text">Loading plot…</p>
+            )}
+          </div>
+          <PhaseTable table={table} />
+        </>
+      )}
+      <a
+        className="download-link"
+        href={`/api/jobs/${jobId}/download/${solution.index}/zip`}
+        target="_blank"
+        rel="noreferrer"
+      >
+        Download report ZIP
+      </a>
+    </div>
+  )
+}
+
 export function JobDetailPage() {
   const { jobId } = useParams<{ jobId: string }>()
   const [detail, setDetail] = useState<JobDetail | null>(null)
@@ -93,6 +178,30 @@ export function JobDetailPage() {
   const solutions = detail?.solutions ?? []
 
   const job = detail?.job
+  const finished = !job || job.status === 'COMPLETED' || job.status === 'FAILED'
+
+  // Follow a pending or running job through the server-sent event stream, and
+  // reload the full detail (with its solutions) once it has finished
+  useEffect(() => {
+    if (!jobId || finished) return
+    const source = new EventSource(`/api/jobs/${jobId}/events`)
+    source.addEventListener('job', (event) => {
+      const summary = JSON.parse((event as MessageEvent<string>).data) as JobSummary
+      if (summary.status === 'COMPLETED' || summary.status === 'FAILED') {
+        source.close()
+        fetchJSON<JobDetail>(`/api/jobs/${jobId}`)
+          .then(setDetail)
+          .catch((err) => setError(err instanceof Error ? err.message : 'Unable to load job detail'))
+      } else {
+        setDetail((current) => (current ? { ...current, job: summary } : current))
+      }
+    })
+    source.addEventListener('deleted', () => {
+      source.close()
+      setError('This job has been deleted.')
+    })
+    return () => source.close()
+  }, [jobId, finished])
   const summaryItems = useMemo(() => {
     if (!job) return []
     return [
@@ -103,6 +212,7 @@ export function JobDetailPage() {
       { label: 'Started', value: formatDateTime(job.started_at) },
       { label: 'Finished', value: formatDateTime(job.finished_at) },
       { label: 'Phases fetched', value: job.num_phases },
+      ...(job.progress ? [{ label: 'Progress', value: formatProgress(job.progress) }] : []),
     ]
   }, [job])
 
@@ -183,37 +293,7 @@ export function JobDetailPage() {
           ) : (
             <div className="solutions-grid">
               {solutions.map((solution) => (
-                <div key={solution.index} className="solution-card">
-                  <div>
-                    <p className="eyebrow">Solution #{solution.index}</p>
-                    <h4>Rwp {formatNumber(solution.rwp, 3)}</h4>
-                    <p className="muted-text">{solution.num_phases} phases</p>
-                  </div>
-                  <div className="plot-wrapper">
-                    <Plot
-                      data={Array.isArray((solution.plotly_figure as { data?: any[] }).data)
-                        ? (solution.plotly_figure as { data?: any[] }).data
-                        : []}
-                      layout={{
-                        height: 320,
-                        margin: { t: 32, r: 12, b: 60, l: 48 },
-                        ...(solution.plotly_figure as { layout?: Record<string, unknown> }).layout,
-                      }}
-                      frames={(solution.plotly_figure as { frames?: any[] }).frames}
-                      config={{ displaylogo: false, responsive: true }}
-                      style={{ width: '100%', height: '100%' }}
-                    />
-                  </div>
-                  <PhaseTable solution={solution} />
-                  <a
-                    className="download-link"
-                    href={`/api/jobs/${jobId}/download/${solution.index}/zip`}
-                    target="_blank"
-                    rel="noreferrer"
-                  >
-                    Download report ZIP
-                  </a>
-                </div>
+                <SolutionCard key={solution.index} jobId={jobId as string} solution={solution} />
               ))}
             </div>
           )}
@@ -35,7 +35,7 @@ const searchSchema = z.object({
 type SearchFormValues = z.infer<typeof searchSchema>
 
 type SubmitResult =
-  | { status: 'success'; jobId: string }
+  | { status: 'success'; jobId: string; deduplicated: boolean; jobStatus: string }
   | { status: 'error'; message: string }
   | null
 
@@ -123,8 +123,13 @@ export function SearchPage() {
         throw new Error(errorPayload.detail || 'Job submission failed')
       }
 
-      const data: { job_id: string } = await response.json()
-      setSubmitResult({ status: 'success', jobId: data.job_id })
+      const data: { job_id: string; status: string; deduplicated: boolean } = await response.json()
+      setSubmitResult({
+        status: 'success',
+        jobId: data.job_id,
+        deduplicated: data.deduplicated,
+        jobStatus: data.status,
+      })
       resetField('pattern_file')
     } catch (error) {
       setSubmitResult({
@@ -274,7 +279,16 @@ export function SearchPage() {
             {submitResult.status === 'success' ? (
               <>
                 <div>
-                  <strong>Job queued!</strong> ID: {submitResult.jobId}
+                  {submitResult.deduplicated ? (
+                    <>
+                      <strong>Identical search already {submitResult.jobStatus.toLowerCase()}.</strong> ID:{' '}
+                      {submitResult.jobId}
+                    </>
+                  ) : (
+                    <>
+                      <strong>Job queued!</strong> ID: {submitResult.jobId}
+                    </>
+                  )}
                 </div>
                 <div className="status-links">
                   <Link to={`/results/${submitResult.jobId}`}>View detail</Link>
@@ -11,6 +11,8 @@ export interface JobSummary {
   started_at?: string | null
   finished_at?: string | null
   error_message?: string | null
+  worker_id?: string | null
+  progress?: Record<string, unknown> | null
 }
 
 export interface Diagnostics {
@@ -31,8 +33,9 @@ export interface SolutionResult {
   index: number
   rwp: number
   num_phases: number
-  plotly_figure: Record<string, unknown>
-  phases_table: PhaseTable
+  // Left out of the (light) job detail; fetched per solution
+  plotly_figure?: Record<string, unknown> | null
+  phases_table?: PhaseTable | null
   report_zip_url: string
 }
 
@@ -45,4 +48,5 @@ export interface JobDetail {
 export interface JobsResponse {
   jobs: JobSummary[]
   total: number
+  next_cursor?: string | null
 }
@@ -55,7 +55,7 @@ def main() -> None:
     worker = Worker(store)
     worker.process_job(job_id)
 
-    detail_response = client.get(f"/api/jobs/{job_id}")
+    detail_response = client.get(f"/api/jobs/{job_id}", params={"light": "false"})
     detail_response.raise_for_status()
     detail = detail_response.json()
     print("Solutions", len(detail["solutions"]))
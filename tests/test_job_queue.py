@@ -0,0 +1,441 @@
+import json
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+import zipfile
+import zlib
+from collections import Counter
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import plotly.graph_objects as go
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from dara_local_v2.server import api
+from dara_local_v2.server.models import JobDetail, JobInput, JobStatus, PhaseTable, SolutionResult
+from dara_local_v2.server.phase_utils import _cif_metadata, build_solution_report, ensure_report_zip
+from dara_local_v2.server.queue import JobStore
+from dara_local_v2.server.worker import Worker
+
+TEST_DATA_DIR = Path(__file__).parent / "test_data"
+
+
+def make_job_input(user: str = "test-user") -> JobInput:
+    return JobInput(
+        user=user,
+        chemical_system="Y-Mo-O",
+        required_elements=["Y", "Mo", "O"],
+        exclude_elements=[],
+        wavelength="Cu",
+        instrument_profile="Aeris-fds-Pixcel1d-Medipix3",
+        database="NONE",
+        pattern_filename="dummy.xy",
+        pattern_path="dummy.xy",
+    )
+
+
+class TestJobStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = str(Path(self.tmpdir.name) / "jobs.sqlite")
+        self.store = JobStore(self.db_path)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def test_claim_next_job(self):
+        """Test jobs are claimed oldest first, marked running and never handed out twice."""
+        job_ids = [self.store.create_job(make_job_input()) for _ in range(3)]
+        other_store = JobStore(self.db_path)
+        try:
+            claimed = [self.store.claim_next_job("a"), other_store.claim_next_job("b"), self.store.claim_next_job()]
+            self.assertEqual([job.job_id for job in claimed], job_ids)
+            self.assertTrue(all(job.status == JobStatus.RUNNING and job.started_at for job in claimed))
+            self.assertEqual(self.store.get_job(job_ids[1]).worker_id, "b")
+            self.assertIsNone(other_store.claim_next_job())
+        finally:
+            other_store.close()
+
+    def test_keyset_pagination(self):
+        """Test cursor pages walk the filtered jobs in order and agree with the count."""
+        job_ids = [self.store.create_job(make_job_input(f"user-{i % 2}")) for i in range(7)]
+        self.store.claim_next_job()
+
+        pages, after = [], None
+        while True:
+            page = self.store.list_jobs(user="user-0", limit=2, after=after)
+            if not page:
+                break
+            pages.append([job.job_id for job in page])
+            after = page[-1].job_id
+        self.assertEqual(pages, [job_ids[0:3:2], job_ids[4:7:2]])
+        self.assertEqual(self.store.count_jobs(user="user-0"), 4)
+
+        pending = self.store.list_jobs(status=JobStatus.PENDING, after=job_ids[2])
+        self.assertEqual([job.job_id for job in pending], job_ids[3:])
+        self.assertEqual(self.store.count_jobs(status=JobStatus.PENDING), 6)
+        self.assertEqual(self.store.count_jobs(), 7)
+        self.assertEqual([job.job_id for job in self.store.list_jobs(offset=5)], job_ids[5:])
+
+    def test_solution_blobs(self):
+        """Test figures and phase tables are split off the detail and can be loaded one by one."""
+        job_id = self.store.create_job(make_job_input())
+        solutions = [
+            SolutionResult(
+                index=index,
+                rwp=10.0 / index,
+                num_phases=index,
+                plotly_figure={"data": [{"x": list(range(1000)), "y": [index] * 1000}]},
+                phases_table=PhaseTable(columns=["phase"], rows=[{"phase": f"Phase{index}"}]),
+                report_zip_url=f"report_{index}.zip",
+            )
+            for index in (1, 2)
+        ]
+        detail = JobDetail(job=self.store.get_job(job_id), solutions=solutions)
+        self.store.save_job_detail(job_id, detail)
+
+        detail_json = self.store._conn.execute("SELECT detail_json FROM job_details").fetchone()[0]
+        self.assertNotIn("plotly_figure", detail_json)
+        self.assertEqual(self.store.load_job_detail(job_id), detail)
+
+        light = self.store.load_job_detail(job_id, light=True)
+        self.assertEqual([s.rwp for s in light.solutions], [10.0, 5.0])
+        self.assertIsNone(light.solutions[0].plotly_figure)
+        self.assertIsNone(light.solutions[0].phases_table)
+
+        figure = self.store.load_solution_blob(job_id, 2, "plotly_figure")
+        self.assertEqual(json.loads(zlib.decompress(figure)), solutions[1].plotly_figure)
+        self.assertLess(len(figure), len(json.dumps(solutions[1].plotly_figure)) / 2)
+        self.assertIsNone(self.store.load_solution_blob(job_id, 3, "phases_table"))
+
+        app = FastAPI()
+        app.include_router(api.build_api_router(self.store, Path(self.tmpdir.name), Path(self.tmpdir.name)))
+        client = TestClient(app)
+        self.assertIsNone(client.get(f"/jobs/{job_id}").json()["solutions"][0]["plotly_figure"])
+        full = client.get(f"/jobs/{job_id}", params={"light": "false"}).json()
+        self.assertEqual(full["solutions"][1]["plotly_figure"], solutions[1].plotly_figure)
+        response = client.get(f"/jobs/{job_id}/solutions/1/phases")
+        self.assertEqual(response.json(), {"columns": ["phase"], "rows": [{"phase": "Phase1"}]})
+
+        # the stored zlib stream is sent as is only when deflate is accepted with q > 0
+        for accept_encoding, deflated in [("gzip, deflate;q=0.5", True), ("deflate;q=0", False), ("*;q=0", False)]:
+            response = client.get(f"/jobs/{job_id}/solutions/1/phases", headers={"Accept-Encoding": accept_encoding})
+            self.assertEqual(response.headers.get("content-encoding") == "deflate", deflated, accept_encoding)
+            self.assertEqual(response.json()["rows"], [{"phase": "Phase1"}])
+        self.assertTrue(api.accepts_encoding("gzip;q=0, *", "deflate"))
+        self.assertFalse(api.accepts_encoding("x-deflate, identity", "deflate"))
+
+    def test_job_events_deleted(self):
+        """Test the event stream ends with a deleted event when the job disappears."""
+        job_id = self.store.create_job(make_job_input())
+        app = FastAPI()
+        app.include_router(api.build_api_router(self.store, Path(self.tmpdir.name), Path(self.tmpdir.name)))
+        get_job = self.store.get_job
+        # the job exists for the existence check and the first event only
+        summaries = iter([get_job(job_id), get_job(job_id)])
+
+        with (
+            mock.patch.object(api, "EVENTS_POLL_SECONDS", 0.01),
+            mock.patch.object(self.store, "get_job", side_effect=lambda job_id: next(summaries, None)),
+        ):
+            response = TestClient(app).get(f"/jobs/{job_id}/events")
+
+        events = [line for line in response.text.splitlines() if line.startswith("event: ")]
+        self.assertEqual(events, ["event: job", "event: deleted"])
+
+    def test_finish_job(self):
+        """Test the terminal status and the detail are written in one transaction."""
+        job_id = self.store.create_job(make_job_input())
+        self.store.claim_next_job()
+        solution = SolutionResult(index=1, rwp=5.0, num_phases=1, report_zip_url="report.zip")
+
+        # the detail write fails, so the status change is rolled back with it
+        with mock.patch.object(self.store, "_write_job_detail", side_effect=sqlite3.OperationalError):
+            with self.assertRaises(sqlite3.OperationalError):
+                self.store.finish_job(job_id, JobStatus.COMPLETED, solutions=[solution])
+        self.assertEqual(self.store.get_job(job_id).status, JobStatus.RUNNING)
+        self.assertIsNone(self.store.load_job_detail(job_id))
+
+        detail = self.store.finish_job(job_id, JobStatus.COMPLETED, solutions=[solution], num_phases=7)
+        self.assertEqual((detail.job.status, detail.job.num_phases), (JobStatus.COMPLETED, 7))
+        self.assertEqual(self.store.load_job_detail(job_id), detail)
+
+    def test_job_events(self):
+        """Test the event stream pushes every state transition and progress update, then ends."""
+        job_id = self.store.create_job(make_job_input())
+        app = FastAPI()
+        app.include_router(api.build_api_router(self.store, Path(self.tmpdir.name), Path(self.tmpdir.name)))
+
+        # start the job only once the stream has read the pending job, which
+        # it does after the existence check
+        get_job = self.store.get_job
+        stream_started = threading.Event()
+        calls = Counter()
+
+        def get_job_and_signal(job_id):
+            calls[job_id] += 1
+            if calls[job_id] == 2:
+                stream_started.set()
+            return get_job(job_id)
+
+        def run_job():
+            stream_started.wait(10)
+            for update in (
+                lambda: self.store.claim_next_job(),
+                lambda: self.store.update_progress(job_id, {"nodes_expanded": 3}),
+                lambda: self.store.update_status(job_id, JobStatus.COMPLETED, finished=True),
+            ):
+                time.sleep(0.2)
+                update()
+
+        thread = threading.Thread(target=run_job)
+        with (
+            mock.patch.object(api, "EVENTS_POLL_SECONDS", 0.01),
+            mock.patch.object(self.store, "get_job", side_effect=get_job_and_signal),
+        ):
+            thread.start()
+            response = TestClient(app).get(f"/jobs/{job_id}/events")
+        thread.join()
+
+        self.assertEqual(response.headers["content-type"], "text/event-stream; charset=utf-8")
+        events = [json.loads(line[len("data: ") :]) for line in response.text.splitlines() if line.startswith("data: ")]
+        self.assertEqual(
+            [(event["status"], event["progress"]) for event in events],
+            [
+                ("PENDING", None),
+                ("RUNNING", None),
+                ("RUNNING", {"nodes_expanded": 3}),
+                ("COMPLETED", {"nodes_expanded": 3}),
+            ],
+        )
+
+    def test_streaming_upload(self):
+        """Test uploads are stored by content hash, deduplicated and size-limited."""
+        tmpdir = Path(self.tmpdir.name)
+        app = FastAPI()
+        app.include_router(api.build_api_router(self.store, tmpdir / "uploads", tmpdir / "work"))
+        client = TestClient(app)
+        cif = (TEST_DATA_DIR / "BiFeO3.cif").read_bytes()
+
+        def submit(content: bytes, user: str = "test-user", max_bytes: int = api.MAX_PATTERN_BYTES):
+            form = {"user": user, "chemical_system": "Bi-Fe-O"}
+            files = [("pattern_file", ("pattern.xy", content)), ("custom_cifs", ("BiFeO3.cif", cif))]
+            with mock.patch.object(api, "MAX_PATTERN_BYTES", max_bytes):
+                return client.post("/jobs", data=form, files=files)
+
+        # different users, so that the second submission is not a duplicate job
+        job_ids = [
+            submit(content, user).json()["job_id"]
+            for content, user in ((b"1 2\n", "a"), (b"1 2\n", "b"), (b"1 3\n", "a"))
+        ]
+        inputs = [self.store.get_job_input(job_id) for job_id in job_ids]
+        self.assertEqual(inputs[0].pattern_path, inputs[1].pattern_path)
+        self.assertNotEqual(inputs[0].pattern_path, inputs[2].pattern_path)
+        self.assertEqual(Path(inputs[2].pattern_path).read_bytes(), b"1 3\n")
+        self.assertEqual(inputs[0].pattern_filename, "pattern.xy")
+        self.assertEqual(len(inputs[0].pattern_sha256), 64)
+        self.assertEqual((tmpdir / "work" / "BiFeO" / "custom_cifs" / "BiFeO3.cif").read_bytes(), cif)
+
+        response = submit(b"1 2\n" * 10, max_bytes=10)
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(self.store.count_jobs(), 3)
+        self.assertEqual(len(list((tmpdir / "uploads").rglob("*"))), 4)
+
+    def test_duplicate_submission(self):
+        """Test an identical submission gets the existing job unless that job failed."""
+        tmpdir = Path(self.tmpdir.name)
+        app = FastAPI()
+        notify_worker = mock.Mock()
+        app.include_router(
+            api.build_api_router(self.store, tmpdir / "uploads", tmpdir / "work", notify_worker=notify_worker)
+        )
+        client = TestClient(app)
+
+        def submit(chemical_system: str = "Bi-Fe-O", cif: bytes | None = None):
+            form = {"user": "test-user", "chemical_system": chemical_system, "required_elements": '["Fe", "Bi"]'}
+            files = [("pattern_file", ("pattern.xy", b"1 2\n"))]
+            if cif is not None:
+                files.append(("custom_cifs", ("BiFeO3.cif", cif)))
+            return client.post("/jobs", data=form, files=files).json()
+
+        first = submit()
+        self.assertEqual((first["status"], first["deduplicated"]), ("PENDING", False))
+        # the element order does not matter
+        self.assertEqual(submit("O-Fe-Bi")["job_id"], first["job_id"])
+        self.store.claim_next_job()
+        self.store.update_status(first["job_id"], JobStatus.COMPLETED, finished=True)
+        self.assertEqual(submit(), {"job_id": first["job_id"], "status": "COMPLETED", "deduplicated": True})
+        self.assertEqual(notify_worker.call_count, 1)
+
+        # a new custom CIF changes the search, and a failed job is retried
+        with_cif = submit(cif=(TEST_DATA_DIR / "BiFeO3.cif").read_bytes())
+        self.assertNotEqual(with_cif["job_id"], first["job_id"])
+        self.store.update_status(with_cif["job_id"], JobStatus.FAILED)
+        retry = submit()
+        self.assertFalse(retry["deduplicated"])
+        self.assertNotIn(retry["job_id"], (first["job_id"], with_cif["job_id"]))
+        self.assertEqual(self.store.count_jobs(), 3)
+
+    def test_wal_mode(self):
+        journal_mode = self.store._conn.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(journal_mode, "wal")
+
+    def test_concurrent_submit_and_claim(self):
+        """Test many submitters and workers on separate connections claim every job exactly once."""
+        n_submitters, n_workers, jobs_per_submitter = 4, 6, 25
+        submitted, claims = [], []
+        submitters_done = threading.Event()
+        errors = []
+
+        def submit(index):
+            try:
+                for _ in range(jobs_per_submitter):
+                    submitted.append(self.store.create_job(make_job_input(f"user-{index}")))
+            except Exception as exc:  # noqa: BLE001
+                errors.append(exc)
+
+        def work(worker_id):
+            # every worker has its own store, like a separate worker process
+            store = JobStore(self.db_path)
+            try:
+                while True:
+                    job = store.claim_next_job(worker_id)
+                    if job is not None:
+                        claims.append((job.job_id, worker_id))
+                        store.update_status(job.job_id, JobStatus.COMPLETED, finished=True)
+                    elif submitters_done.is_set():
+                        return
+            except Exception as exc:  # noqa: BLE001
+                errors.append(exc)
+            finally:
+                store.close()
+
+        workers = [threading.Thread(target=work, args=(f"worker-{i}",)) for i in range(n_workers)]
+        submitters = [threading.Thread(target=submit, args=(i,)) for i in range(n_submitters)]
+        for thread in workers + submitters:
+            thread.start()
+        for thread in submitters:
+            thread.join()
+        submitters_done.set()
+        for thread in workers:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(submitted), n_submitters * jobs_per_submitter)
+        counts = Counter(job_id for job_id, _ in claims)
+        self.assertEqual(set(counts), set(submitted))
+        self.assertEqual(set(counts.values()), {1})
+        for job_id, worker_id in claims:
+            job = self.store.get_job(job_id)
+            self.assertEqual((job.status, job.worker_id), (JobStatus.COMPLETED, worker_id))
+
+
+class TestWorkerPool(unittest.TestCase):
+    def test_concurrent_jobs(self):
+        """Test the pool mode runs jobs side by side, each within its CPU quota."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = JobStore(str(Path(tmpdir) / "jobs.sqlite"))
+            job_ids = {store.create_job(make_job_input()) for _ in range(4)}
+            worker = Worker(
+                store, base_workdir=Path(tmpdir), sleep_seconds=0.05, max_concurrent_jobs=2, cpus_per_job=3
+            )
+            worker._init_ray = lambda: None
+            # both slots must be busy at the same time for the barrier to open
+            barrier = threading.Barrier(2, timeout=10)
+            search_kwargs = []
+
+            def execute_job(job_id, job_input):
+                barrier.wait()
+                search_kwargs.append(worker._search_kwargs())
+                store.update_status(job_id, JobStatus.COMPLETED, finished=True)
+                if len(search_kwargs) == len(job_ids):
+                    worker.stop()
+                return JobDetail(job=store.get_job(job_id))
+
+            worker._execute_job = execute_job
+            thread = threading.Thread(target=worker.run_forever, daemon=True)
+            thread.start()
+            thread.join(timeout=30)
+            self.assertFalse(thread.is_alive())
+
+            self.assertEqual({job.status for job in store.list_jobs()}, {JobStatus.COMPLETED})
+            self.assertEqual(search_kwargs[0], {"max_workers": 3, "refinement_params": {"n_threads": 1}})
+            store.close()
+
+    def test_reports_per_job(self):
+        """Test jobs of the same chemical system write their reports to separate directories."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = JobStore(str(Path(tmpdir) / "jobs.sqlite"))
+            worker = Worker(store, base_workdir=Path(tmpdir))
+            first, second = (worker._ensure_workdirs(job_id, make_job_input()) for job_id in ("job-1", "job-2"))
+            self.assertEqual(first["custom_cif_dir"], second["custom_cif_dir"])
+            self.assertEqual(first["reports_dir"], Path(tmpdir) / "YMoO" / "reports" / "job-1")
+            self.assertNotEqual(first["reports_dir"], second["reports_dir"])
+            self.assertTrue(second["reports_dir"].is_dir())
+            store.close()
+
+    def test_wake_on_submit(self):
+        """Test an idle worker starts a new job right away when woken, instead of after sleeping."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = JobStore(str(Path(tmpdir) / "jobs.sqlite"))
+            worker = Worker(store, base_workdir=Path(tmpdir), sleep_seconds=60)
+            started = threading.Event()
+
+            def execute_job(job_id, job_input):
+                started.set()
+                worker.stop()
+                return JobDetail(job=store.get_job(job_id))
+
+            worker._execute_job = execute_job
+            thread = threading.Thread(target=worker.run_forever, daemon=True)
+            thread.start()
+            time.sleep(0.2)
+            store.create_job(make_job_input())
+            worker.wake()
+            self.assertTrue(started.wait(10))
+            thread.join(timeout=10)
+            self.assertFalse(thread.is_alive())
+            store.close()
+
+
+class TestSolutionReports(unittest.TestCase):
+    def test_build_solution_report(self):
+        """Test a report is built once per solution, with cached CIF metadata and a lazy zip."""
+        solution = SimpleNamespace(
+            phases=[[SimpleNamespace(path=TEST_DATA_DIR / f"{name}.cif")] for name in ("BiFeO3", "Bi2Fe4O9")],
+            refinement_result=SimpleNamespace(
+                lst_data=SimpleNamespace(
+                    rwp=7.97,
+                    pattern_name="BiFeO3.xy",
+                    phases_results={"BiFeO3": SimpleNamespace(gewicht=(60.0, 1.0))},
+                )
+            ),
+            visualize=mock.Mock(return_value=go.Figure(go.Scatter(x=[1, 2], y=[3, 4]))),
+        )
+        with tempfile.TemporaryDirectory() as tmpdir:
+            reports_dir = Path(tmpdir)
+            report = build_solution_report(solution, 1, reports_dir, reports_dir / "custom_cifs", "ICSD")
+            solution.visualize.assert_called_once()
+            self.assertEqual((report["index"], report["rwp"], report["num_phases"]), (1, 7.97, 2))
+            self.assertEqual(json.loads(report["figure_json"])["data"][0]["y"], [3, 4])
+            rows = report["phases_table"]["rows"]
+            self.assertEqual([row["Formula"] for row in rows], ["FeBiO3", "Fe4Bi2O9"])
+            self.assertEqual((rows[0]["Source"], rows[0]["Weight %"]), ("ICSD", "60.00"))
+
+            report_dir = Path(report["report_dir"])
+            self.assertTrue((report_dir / "identified_phases.csv").exists())
+            self.assertFalse(report_dir.with_suffix(".zip").exists())
+            zip_path = ensure_report_zip(report_dir)
+            with zipfile.ZipFile(zip_path) as archive:
+                self.assertIn("summary.txt", archive.namelist())
+
+            # the CIFs are not parsed again, and rebuilding drops the stale zip
+            hits = _cif_metadata.cache_info().hits
+            build_solution_report(solution, 1, reports_dir, reports_dir / "custom_cifs", "ICSD")
+            self.assertEqual(_cif_metadata.cache_info().hits, hits + 2)
+            self.assertFalse(zip_path.exists())
@@ -0,0 +1,182 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from dara.eflech_worker import EflechWorker
+from dara.peak_detection import PeakListCache, detect_peaks
+from dara.scipy_peak_detection import (
+    KALPHA2_RATIO,
+    _kalpha2_position,
+    _pseudo_voigt,
+    compare_peak_lists,
+    detect_peaks_scipy,
+)
+from dara.utils import get_kalpha2_wavelength, get_wavelength
+
+PEAKS = np.array(
+    [
+        # 2theta, area (whole doublet), FWHM
+        [25.0, 300.0, 0.08],
+        [32.0, 120.0, 0.10],
+        [40.0, 60.0, 0.12],
+        [55.0, 200.0, 0.15],
+    ]
+)
+
+
+def make_pattern(kalpha2: bool, seed: int = 0) -> np.ndarray:
+    x = np.arange(15.0, 70.0, 0.01)
+    y = 200 - 1.5 * (x - 15)
+    lambda_ratio = get_kalpha2_wavelength("Cu") / get_wavelength("Cu")
+    for center, area, fwhm in PEAKS:
+        if kalpha2:
+            area_1 = area / (1 + KALPHA2_RATIO)
+            center_2 = _kalpha2_position(np.array(center), lambda_ratio)
+            y = y + KALPHA2_RATIO * area_1 * _pseudo_voigt(x, center_2, fwhm, 0.5)[0]
+        else:
+            area_1 = area
+        y = y + area_1 * _pseudo_voigt(x, center, fwhm, 0.5)[0]
+    return np.column_stack((x, np.random.default_rng(seed).poisson(y)))
+
+
+class TestScipyPeakDetection(unittest.TestCase):
+    def test_kalpha_doublets(self):
+        """Test each Kalpha1/Kalpha2 doublet is reported once with its total intensity."""
+        peaks = detect_peaks_scipy(make_pattern(kalpha2=True), wavelength="Cu", min_snr=4)
+
+        self.assertEqual(list(peaks.columns), ["2theta", "intensity", "b1", "b2"])
+        self.assertEqual(len(peaks), len(PEAKS))
+        np.testing.assert_allclose(peaks["2theta"], PEAKS[:, 0], atol=0.01)
+        np.testing.assert_allclose(peaks["intensity"], PEAKS[:, 1], rtol=0.15)
+        self.assertTrue((peaks["b1"] >= 0).all())
+
+    def test_monochromatic(self):
+        """Test a numeric wavelength fits single peaks."""
+        peaks = detect_peaks_scipy(
+            make_pattern(kalpha2=False), wavelength=0.15406, min_snr=4
+        )
+        np.testing.assert_allclose(peaks["2theta"], PEAKS[:, 0], atol=0.01)
+        np.testing.assert_allclose(peaks["intensity"], PEAKS[:, 1], rtol=0.15)
+
+    def test_compare_peak_lists(self):
+        reference = pd.DataFrame({"2theta": PEAKS[:, 0], "intensity": PEAKS[:, 1]})
+        peaks = pd.DataFrame({"2theta": [25.01, 32.0, 47.0], "intensity": [150.0, 120.0, 10.0]})
+
+        metrics = compare_peak_lists(reference, peaks)
+        self.assertEqual(metrics["recall"], 0.5)
+        self.assertAlmostEqual(metrics["weighted_recall"], 420 / 680)
+        self.assertAlmostEqual(metrics["precision"], 2 / 3)
+        self.assertAlmostEqual(metrics["median_intensity_ratio"], 0.75)
+
+
+CONTROL_FILE = """VERZERR=instrument.geq
+LAMBDA=CU
+VAL[1]=pattern.xy
+NTHREADS=8
+OUTPUTMASK=output-$
+TITELMASK=output-$
+%teil has computed the following angular ranges: Teil 1
+WMIN[1]==10.0
+WMIN2[1]==10.0
+WMAX2[1]==20.0
+WMAX[1]==21.0
+VAL[1,1]=pattern.xy
+OUTPUT[1]=output-1
+TITEL[1]=output-1
+% Teil 2
+WMIN[2]==19.0
+WMIN2[2]==20.0
+WMAX2[2]==50.0
+WMAX[2]==50.0
+VAL[2,1]=pattern.xy
+OUTPUT[2]=output-2
+TITEL[2]=output-2
+%these constants have been notated by TEIL for internal use
+VALZAHL==2.0
+TEILZAHL==2.0
+"""
+
+
+def d_inv(two_theta: float) -> float:
+    return 2 * np.sin(np.radians(two_theta) / 2) / get_wavelength("Cu")
+
+
+def write_par_file(path: Path, wmin2: float, wmax2: float, peaks: list[tuple[float, float]]):
+    lines = [f"PEAKZAHL={len(peaks)} WMIN2={wmin2} WMAX2={wmax2} POL=1.0"]
+    lines += [f"3 {intensity} {d_inv(two_theta)} 0.01" for two_theta, intensity in peaks]
+    path.write_text("\n".join(lines) + "\n")
+
+
+class TestEflechSegments(unittest.TestCase):
+    def test_split_control_file(self):
+        """Test each teil range gets its own control file, widest first."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            control_file = Path(tmpdir) / "control.sav"
+            control_file.write_text(CONTROL_FILE)
+
+            paths = EflechWorker.split_control_file(control_file)
+            self.assertEqual([p.name for p in paths], ["control-2.sav", "control-1.sav"])
+            content = paths[0].read_text()
+            self.assertIn("VERZERR=instrument.geq", content)
+            self.assertIn("WMIN2[1]==20.0", content)
+            self.assertIn("VAL[1,1]=pattern.xy", content)
+            self.assertIn("OUTPUT[1]=output-2", content)
+            self.assertIn("TEILZAHL==1", content)
+            self.assertNotIn("[2]", content)
+
+    def test_merge_segment_peak_lists(self):
+        """Test peaks outside a range's core are dropped and shared-edge duplicates merged."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmpdir = Path(tmpdir)
+            # 21.0 lies in the overlap but outside the first range's core
+            write_par_file(tmpdir / "output-1.par", 10.0, 20.0, [(15.0, 10.0), (20.0, 5.0), (21.0, 3.0)])
+            write_par_file(tmpdir / "output-2.par", 20.0, 50.0, [(20.0, 8.0), (21.0, 4.0), (30.0, 1.0)])
+
+            peaks = EflechWorker().parse_segment_peak_lists(tmpdir, wavelength="Cu")
+            np.testing.assert_allclose(peaks["2theta"], [15.0, 20.0, 21.0, 30.0])
+            reference = EflechWorker().parse_peak_list(tmpdir, wavelength="Cu")
+            # the duplicate at the shared edge keeps the more intense peak of range 2
+            self.assertAlmostEqual(
+                peaks["intensity"][1], reference[reference["2theta"].round(6) == 20.0]["intensity"].max()
+            )
+
+
+class TestPeakListCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        """Test the least recently used peak list is evicted once the cache is full."""
+        peaks = pd.DataFrame(PEAKS[:, :3], columns=["2theta", "intensity", "b1"]).assign(b2=0.0)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = PeakListCache(tmpdir, max_entries=2)
+            keys = [PeakListCache.make_key("pattern", wmin=wmin) for wmin in (10, 20, 30)]
+            self.assertEqual(len(set(keys)), 3)
+            self.assertIsNone(cache.get(keys[0]))
+
+            cache.put(keys[0], peaks)
+            cache.put(keys[1], peaks)
+            # age the second entry deterministically; reading the first one refreshes it
+            os.utime(Path(tmpdir) / f"{keys[1]}.npy", ns=(0, 0))
+            pd.testing.assert_frame_equal(cache.get(keys[0]), peaks)
+
+            cache.put(keys[2], peaks)
+            self.assertIsNotNone(cache.get(keys[0]))
+            self.assertIsNone(cache.get(keys[1]))
+            self.assertIsNotNone(cache.get(keys[2]))
+
+    def test_detect_peaks_uses_cache(self):
+        """Test a repeated detection is served from the cache, keyed by the settings."""
+        pattern = make_pattern(kalpha2=True).astype(float)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = PeakListCache(tmpdir)
+            first = detect_peaks(pattern, method="scipy", cache=cache)
+            self.assertEqual(len(list(Path(tmpdir).glob("*.npy"))), 1)
+
+            second = detect_peaks(pattern.copy(), method="scipy", cache=cache)
+            pd.testing.assert_frame_equal(first, second)
+            self.assertEqual(len(list(Path(tmpdir).glob("*.npy"))), 1)
+
+            detect_peaks(pattern, method="scipy", wmax=50.0, cache=cache)
+            self.assertEqual(len(list(Path(tmpdir).glob("*.npy"))), 2)
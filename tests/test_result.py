@@ -0,0 +1,129 @@
+import pickle
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+from pymatgen.core import Composition
+
+from dara.eflech_worker import EflechWorker
+from dara.result import DiaResult, parse_dia, parse_lst, parse_par
+from dara.utils import get_wavelength
+
+REFINEMENT_DIR = Path(__file__).parent / "test_data" / "refinement"
+PHASE_NAMES = ["Bi2Fe4O9", "Bi25FeO39", "BiFeO3"]
+
+DIA_FILE = """TITEL=pattern L0=6.485273 M=3 STRUC[1]=PhaseA STRUC[2]=PhaseB
+ 10.0027  3196.00  3273.59  3272.93     0.19     0.09
+ 10.0081  3155.00  3269.73  3269.07     0.19     0.09
+ 10.0135  3187.00  3265.93  3265.26     0.19     0.10
+"""
+
+
+class TestDiaResult(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.dia_path = Path(self.tmpdir.name) / "pattern.dia"
+        self.dia_path.write_text(DIA_FILE)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_float32_curves(self):
+        """Test the curves are read-only float32 arrays owning their data."""
+        result = parse_dia(self.dia_path, phase_names=["PhaseA", "PhaseB"])
+
+        for curve in (result.x, result.y_obs, result.y_calc, *result.structs.values()):
+            self.assertEqual(curve.dtype, np.float32)
+            self.assertTrue(curve.flags.owndata)
+            self.assertFalse(curve.flags.writeable)
+        np.testing.assert_allclose(result.structs["PhaseB"], [0.09, 0.09, 0.10], rtol=1e-6)
+
+    def test_shared_curves(self):
+        """Test x and y_obs are shared between results of the same pattern, also after pickling."""
+        first = parse_dia(self.dia_path, phase_names=["PhaseA", "PhaseB"])
+        second = parse_dia(self.dia_path, phase_names=["PhaseA", "PhaseB"])
+        self.assertIs(first.x, second.x)
+        self.assertIs(first.y_obs, second.y_obs)
+        self.assertIsNot(first.y_calc, second.y_calc)
+
+        unpickled = pickle.loads(pickle.dumps(first))
+        self.assertIs(unpickled.x, first.x)
+        np.testing.assert_array_equal(unpickled.y_calc, first.y_calc)
+
+    def test_serialization(self):
+        """Test curves are still serialized as lists and can be validated back."""
+        result = parse_dia(self.dia_path, phase_names=["PhaseA", "PhaseB"])
+
+        data = result.model_dump()
+        self.assertIsInstance(data["x"], list)
+        self.assertIsInstance(data["structs"]["PhaseA"], list)
+
+        restored = DiaResult.model_validate_json(result.model_dump_json())
+        self.assertIs(restored.x, result.x)
+        np.testing.assert_array_equal(restored.y_bkg, result.y_bkg)
+        np.testing.assert_array_equal(restored.structs["PhaseB"], result.structs["PhaseB"])
+
+
+class TestLstResult(unittest.TestCase):
+    def test_parse_lst(self):
+        """Test the header values, global parameters and phase sections are all parsed."""
+        result = parse_lst(REFINEMENT_DIR / "BiFeO3.lst", phase_names=PHASE_NAMES)
+
+        self.assertEqual(result.pattern_name, "BiFeO3.xy")
+        self.assertEqual(result.num_steps, 17)
+        self.assertEqual((result.rp, result.rpb, result.r), (5.62, 36.49, 10.96))
+        self.assertEqual((result.rwp, result.rexp, result.d, result.rho), (7.97, 2.66, 0.23, 5.80))
+        self.assertEqual(result.EPS2, (-0.0027919, 0.0000051))
+        self.assertEqual(list(result.phases_results), PHASE_NAMES)
+        phase = result.phases_results["Bi2Fe4O9"]
+        self.assertEqual((phase.spacegroup_no, phase.a, phase.k1), (55, (0.79772, 0.00012), 0))
+        self.assertEqual(len(phase.atom_positions_string.split("\n")), 7)
+
+    def test_pattern_name_with_equals_sign(self):
+        """Test a pattern file name containing "=" is parsed as the pattern name, not as R values."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            lst_path = Path(tmpdir) / "BiFeO3.lst"
+            lst_path.write_text(
+                (REFINEMENT_DIR / "BiFeO3.lst")
+                .read_text()
+                .replace("file(s) BiFeO3.xy", "file(s) sample_T=600C.xy", 1)
+            )
+            result = parse_lst(lst_path, phase_names=PHASE_NAMES)
+
+        self.assertEqual(result.pattern_name, "sample_T=600C.xy")
+        self.assertEqual((result.num_steps, result.rwp), (17, 7.97))
+
+    def test_slim(self):
+        """Test the slim result keeps every number but drops the raw text and atomic positions."""
+        full = parse_lst(REFINEMENT_DIR / "BiFeO3.lst", phase_names=PHASE_NAMES)
+        slim = parse_lst(REFINEMENT_DIR / "BiFeO3.lst", phase_names=PHASE_NAMES, slim=True)
+
+        self.assertIsNotNone(full.raw_lst)
+        self.assertIsNone(slim.raw_lst)
+        exclude = {"raw_lst": True, "phases_results": {"__all__": {"atom_positions_string"}}}
+        self.assertEqual(slim.model_dump(exclude=exclude), full.model_dump(exclude=exclude))
+        self.assertLess(len(slim.model_dump_json()), len(full.model_dump_json()) / 2)
+
+        structure = full.phases_results["BiFeO3"].get_structure()
+        self.assertEqual(structure.composition.element_composition.reduced_composition, Composition("BiFeO3"))
+        with self.assertRaises(ValueError):
+            slim.phases_results["BiFeO3"].get_structure()
+
+
+class TestParResult(unittest.TestCase):
+    def test_parse_par(self):
+        """Test the hkl peak list is parsed and agrees with the eflech peak parser."""
+        peaks = parse_par(REFINEMENT_DIR / "BiFeO3.par", phase_names=PHASE_NAMES)
+
+        self.assertEqual(len(peaks), 710)
+        self.assertEqual(peaks["phase"].value_counts().to_dict(), {"Bi2Fe4O9": 424, "Bi25FeO39": 204, "BiFeO3": 82})
+        first = peaks.iloc[0]
+        self.assertEqual((first["h"], first["k"], first["l"], first["phase_idx"]), (0, 0, 1, 0))
+        self.assertAlmostEqual(first["b1"], 0.0061248)
+        self.assertTrue((peaks["intensity"] > 0).all())
+
+        eflech_peaks = np.array(
+            EflechWorker.parse_par_file(REFINEMENT_DIR / "BiFeO3.par", wavelength=get_wavelength("Cu"))
+        )
+        np.testing.assert_allclose(eflech_peaks[:, 1:], peaks[["intensity", "b1", "b2"]].values)
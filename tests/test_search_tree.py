@@ -0,0 +1,140 @@
+import queue
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+
+from dara.result import DiaResult
+from dara.search import progress as search_progress
+from dara.search.progress import (
+    ThrottledProgress,
+    emit_progress,
+    get_progress_sink,
+    report_progress_to,
+)
+from dara.search import tree as search_tree
+from dara.search.tree import batch_refinement, remove_unnecessary_phases
+from dara.utils import rpb
+
+
+class TestRemoveUnnecessaryPhases(unittest.TestCase):
+    def test_matches_per_phase_rpb(self):
+        """Test the batched leave-one-out check against removing each phase in turn."""
+        rng = np.random.default_rng(0)
+        x = np.linspace(10, 80, 2000)
+        y_bkg = np.full_like(x, 50.0)
+        structs = {
+            "major": 1000 * np.exp(-((x - 30) ** 2) / 0.01),
+            "minor": 40 * np.exp(-((x - 45) ** 2) / 0.01),
+            "absent": np.zeros_like(x),
+        }
+        y_calc = y_bkg + sum(structs.values())
+        y_obs = y_calc + rng.normal(0, 2, size=len(x))
+        result = SimpleNamespace(
+            plot_data=DiaResult(
+                x=x.tolist(),
+                y_obs=y_obs.tolist(),
+                y_calc=y_calc.tolist(),
+                y_bkg=y_bkg.tolist(),
+                structs={name: curve.tolist() for name, curve in structs.items()},
+            )
+        )
+        cif_paths = [Path(f"{name}.cif") for name in structs]
+
+        for threshold in (0.0, 1.0, 50.0):
+            expected = [
+                Path(f"{name}.cif")
+                for name, curve in structs.items()
+                if rpb(y_calc - curve, y_obs, y_bkg) > rpb(y_calc, y_obs, y_bkg) + threshold
+            ]
+            self.assertEqual(remove_unnecessary_phases(result, cif_paths, threshold), expected)
+        self.assertEqual(
+            remove_unnecessary_phases(result, cif_paths, 1.0), [Path("major.cif"), Path("minor.cif")]
+        )
+
+
+class TestBatchRefinement(unittest.TestCase):
+    def test_max_in_flight(self):
+        """Test no more than max_in_flight refinement tasks are submitted at the same time."""
+        in_flight = []
+        max_seen = []
+
+        def submit(pattern_path, cif_paths, **kwargs):
+            in_flight.append(cif_paths[0])
+            max_seen.append(len(in_flight))
+            return cif_paths[0]
+
+        def wait(refs):
+            in_flight.remove(refs[0])
+            return refs[:1], refs[1:]
+
+        callback = mock.Mock()
+        with (
+            mock.patch.object(search_tree, "remote_do_refinement_no_saving", SimpleNamespace(remote=submit)),
+            mock.patch.object(search_tree.ray, "is_initialized", return_value=True),
+            mock.patch.object(search_tree.ray, "wait", side_effect=wait),
+            mock.patch.object(search_tree.ray, "get", side_effect=list),
+        ):
+            results = batch_refinement(Path("pattern.xy"), [[i] for i in range(10)], callback=callback, max_in_flight=3)
+
+        self.assertEqual(results, list(range(10)))
+        self.assertEqual(max(max_seen), 3)
+        self.assertEqual(callback.call_args_list[-1], mock.call(10, 10))
+        self.assertEqual(callback.call_count, 10)
+
+
+class TestSearchProgress(unittest.TestCase):
+    def test_sinks(self):
+        """Test events reach callback and queue sinks, and a failing sink is ignored."""
+        events = []
+        emit_progress(events.append, "peaks_detected", num_peaks=12)
+        self.assertEqual(events[0].kind, "peaks_detected")
+        self.assertEqual(events[0].num_peaks, 12)
+
+        sink = queue.Queue()
+        emit_progress(sink, "candidates_refined", refinements_done=1, refinements_total=4)
+        self.assertEqual(sink.get_nowait().refinements_total, 4)
+
+        emit_progress(lambda event: 1 / 0, "node_expanded", nodes_expanded=1)
+        emit_progress(None, "node_expanded", nodes_expanded=1)
+
+    def test_context_sink(self):
+        """Test a sink installed for the context is used unless one is passed explicitly."""
+        sink = queue.Queue()
+        self.assertIsNone(get_progress_sink())
+        with report_progress_to(sink):
+            self.assertIs(get_progress_sink(), sink)
+            self.assertIs(get_progress_sink(print), print)
+        self.assertIsNone(get_progress_sink())
+
+    def test_throttled_progress(self):
+        """Test events are folded into one state that is forwarded at most once per interval."""
+        forwarded = []
+        progress = ThrottledProgress(forwarded.append, min_interval=10)
+        with mock.patch.object(search_progress.time, "monotonic", side_effect=[0, 1, 2, 11]):
+            emit_progress(progress, "peaks_detected", num_peaks=12)
+            emit_progress(progress, "candidates_refined", refinements_done=1, refinements_total=2)
+            emit_progress(progress, "candidates_refined", refinements_done=2, refinements_total=2)
+            emit_progress(progress, "best_rpb", best_rpb=20.5, best_rwp=10.0)
+        self.assertEqual(
+            forwarded,
+            [
+                {"num_peaks": 12, "stage": "peaks_detected"},
+                {
+                    "num_peaks": 12,
+                    "refinements_done": 2,
+                    "refinements_total": 2,
+                    "best_rpb": 20.5,
+                    "best_rwp": 10.0,
+                    "stage": "best_rpb",
+                },
+            ],
+        )
+        with mock.patch.object(search_progress.time, "monotonic", return_value=13):
+            progress.flush()
+            emit_progress(progress, "node_expanded", nodes_expanded=1, nodes_pending=3)
+            progress.flush()
+        self.assertEqual(len(forwarded), 3)
+        self.assertEqual(forwarded[-1]["nodes_expanded"], 1)
@@ -0,0 +1,94 @@
+import json
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from pymatgen.core import Composition
+
+from dara.server import results
+from dara.server.worker import summarize_job_output
+
+
+def make_refinement(rwp: float, phases: list[str]) -> SimpleNamespace:
+    return SimpleNamespace(lst_data=SimpleNamespace(rwp=rwp, phases_results=dict.fromkeys(phases)))
+
+
+def make_document(grouped_phases=None) -> SimpleNamespace:
+    cifs = [
+        [SimpleNamespace(filename=name) for name in ("BiFeO3_161", "BiFeO3_1")],
+        [SimpleNamespace(filename="Bi2Fe4O9_55")],
+    ]
+    return SimpleNamespace(
+        results=[
+            (cifs, make_refinement(8.5, ["BiFeO3_161", "Bi2Fe4O9_55"])),
+            (cifs[:1], make_refinement(12.0, ["BiFeO3_161"])),
+        ],
+        grouped_phases=grouped_phases,
+        final_result=make_refinement(8.1, ["BiFeO3_161", "Bi2Fe4O9_55"]),
+        best_rwp=8.5,
+        precursors=["Bi2O3", "Fe2O3"],
+        predict_kwargs={"temp": 973},
+        phase_predictor=None,
+        search_kwargs={"wavelength": "Cu"},
+    )
+
+
+class TestTaskSummary(unittest.TestCase):
+    def test_summarize_search_document(self):
+        """Test every result is summarized, with compositional clusters computed for old documents."""
+        summary = results.summarize_search_document(make_document())
+
+        self.assertEqual(json.loads(json.dumps(summary)), summary)
+        self.assertEqual([result["rwp"] for result in summary["all_results"]], [8.5, 12.0])
+        first = summary["all_results"][0]
+        self.assertEqual(first["phases"], [["BiFeO3_161", "BiFeO3_1"], ["Bi2Fe4O9_55"]])
+        self.assertEqual(
+            first["grouped_phases"],
+            [
+                [["BiFeO<sub>3</sub>", ["BiFeO3_161", "BiFeO3_1"]]],
+                [["Bi<sub>2</sub>Fe<sub>4</sub>O<sub>9</sub>", ["Bi2Fe4O9_55"]]],
+            ],
+        )
+        self.assertEqual(summary["final_result"], {"rwp": 8.1, "phases": ["BiFeO3_161", "Bi2Fe4O9_55"]})
+        self.assertEqual((summary["temperature"], summary["use_rxn_predictor"]), (700, False))
+
+        # stored clusters are used as they are
+        grouped_phases = [[[(Composition("Fe2O3"), ["Fe2O3_1"])]], [[(Composition("Fe2O3"), ["Fe2O3_2"])]]]
+        summary = results.summarize_search_document(make_document(grouped_phases))
+        self.assertEqual(summary["all_results"][1]["grouped_phases"], [[["Fe<sub>2</sub>O<sub>3</sub>", ["Fe2O3_2"]]]])
+
+    def test_summarize_job_output(self):
+        """Test the summary is made from the response of the job's last run, or skipped."""
+        responses = {"job-uuid": {1: SimpleNamespace(output=None), 2: SimpleNamespace(output=make_document())}}
+        self.assertEqual(summarize_job_output(responses, "job-uuid")["best_rwp"], 8.5)
+        self.assertIsNone(summarize_job_output(responses, "other-uuid"))
+
+
+class TestDocumentCache(unittest.TestCase):
+    def setUp(self):
+        results.load_search_document.cache_clear()
+        self.result_store = mock.MagicMock()
+        patcher = mock.patch.object(results, "get_result_store")
+        patcher.start().return_value.__enter__.return_value = self.result_store
+        self.addCleanup(patcher.stop)
+        self.addCleanup(results.load_search_document.cache_clear)
+
+    def test_decoded_once(self):
+        """Test a document is decoded once and evicted least recently used first."""
+        self.result_store.query_one.side_effect = lambda criteria: {"output": {"uuid": criteria["uuid"]}}
+        self.assertEqual(results.load_search_document("a"), {"uuid": "a"})
+        self.assertIs(results.load_search_document("a"), results.load_search_document("a"))
+        self.assertEqual(self.result_store.query_one.call_count, 1)
+
+        for uuid in range(results.DOCUMENT_CACHE_SIZE):
+            results.load_search_document(str(uuid))
+        results.load_search_document("a")
+        self.assertEqual(self.result_store.query_one.call_count, 2 + results.DOCUMENT_CACHE_SIZE)
+
+    def test_missing_result(self):
+        """Test a missing result raises a KeyError that is not cached."""
+        self.result_store.query_one.return_value = None
+        for _ in range(2):
+            with self.assertRaises(KeyError):
+                results.load_search_document("missing")
+        self.assertEqual(self.result_store.query_one.call_count, 2)
@@ -0,0 +1,216 @@
+import os
+import struct
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from dara.xrd import (
+    RawFile,
+    XRDMLFile,
+    XYFile,
+    get_xrdml_data,
+    load_pattern,
+    load_raw,
+    load_xrdml,
+)
+
+XRDML_PATH = (
+    Path(__file__).parents[1] / "notebooks" / "tutorial_data" / "GeO2-ZnO_700C_60min.xrdml"
+)
+
+MULTI_SCAN_XRDML = """<?xml version="1.0" encoding="UTF-8"?>
+<xrdMeasurements xmlns="http://www.xrdml.com/XRDMeasurement/2.2">
+  <xrdMeasurement measurementType="Scan" status="Completed">
+    <scan appendNumber="0">
+      <dataPoints>
+        <positions axis="Omega" unit="deg">
+          <startPosition>5.0</startPosition>
+          <endPosition>6.0</endPosition>
+        </positions>
+        <positions axis="2Theta" unit="deg">
+          <startPosition>10.0</startPosition>
+          <endPosition>12.0</endPosition>
+        </positions>
+        <counts unit="counts">1 2 3 4 5</counts>
+      </dataPoints>
+    </scan>
+    <scan appendNumber="1">
+      <dataPoints>
+        <positions axis="2Theta" unit="deg">
+          <listPositions>20.0 20.5 21.5</listPositions>
+        </positions>
+        <intensities unit="counts">7 8
+          9</intensities>
+      </dataPoints>
+    </scan>
+  </xrdMeasurement>
+</xrdMeasurements>
+"""
+
+
+class TestXRDMLFile(unittest.TestCase):
+    def test_streaming_matches_full_metadata(self):
+        """Test the opt-in streaming reader returns the same data as the default xmltodict path."""
+        streamed = XRDMLFile.from_file(XRDML_PATH, full_metadata=False)
+        full = XRDMLFile.from_file(XRDML_PATH)
+
+        self.assertIsNone(streamed.xrdml_dict)
+        self.assertIsNotNone(full.xrdml_dict)
+        np.testing.assert_array_equal(streamed.angles, full.angles)
+        np.testing.assert_array_equal(streamed.intensities, full.intensities)
+        self.assertAlmostEqual(streamed.angles[0], 9.90343322)
+        with self.assertRaises(ValueError):
+            streamed.to_xrdml_file(Path(tempfile.gettempdir()) / "unused.xrdml")
+
+    def test_multi_scan(self):
+        """Test every scan of a multi-scan file can be loaded."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "multi.xrdml"
+            path.write_text(MULTI_SCAN_XRDML, encoding="utf-8")
+
+            scans = XRDMLFile.scans_from_file(path)
+            self.assertEqual(len(scans), 2)
+            np.testing.assert_allclose(scans[0].angles, [10.0, 10.5, 11.0, 11.5, 12.0])
+            np.testing.assert_array_equal(scans[0].intensities, [1, 2, 3, 4, 5])
+            np.testing.assert_array_equal(scans[1].angles, [20.0, 20.5, 21.5])
+            np.testing.assert_array_equal(scans[1].intensities, [7, 8, 9])
+
+            for full_metadata in (True, False):
+                second = XRDMLFile.from_file(path, scan=1, full_metadata=full_metadata)
+                np.testing.assert_array_equal(second.intensities, [7, 8, 9])
+                with self.assertRaises(ValueError):
+                    XRDMLFile.from_file(path, scan=2, full_metadata=full_metadata)
+            angles, intensities = get_xrdml_data(load_xrdml(path), scan=1)
+            np.testing.assert_array_equal(angles, [20.0, 20.5, 21.5])
+            np.testing.assert_array_equal(intensities, [7, 8, 9])
+
+
+def make_rigaku_raw(start: float, end: float, counts: list[float]) -> bytes:
+    content = bytearray(3158 + 4 * len(counts))
+    struct.pack_into("<ff", content, 2962, start, end)
+    struct.pack_into("<i", content, 3154, len(counts))
+    struct.pack_into(f"<{len(counts)}f", content, 3158, *counts)
+    return bytes(content)
+
+
+def make_bruker_raw_v3(ranges: list[tuple[float, float, list[float], int]]) -> bytes:
+    """Ranges are (start 2theta, step size, counts, supplementary header length)."""
+    header = bytearray(712)
+    header[:7] = b"RAW1.01"
+    struct.pack_into("<I", header, 12, len(ranges))
+    blocks = [bytes(header)]
+    for start, step, counts, supplementary in ranges:
+        block = bytearray(304)
+        struct.pack_into("<II", block, 0, 304, len(counts))
+        struct.pack_into("<d", block, 16, start)
+        struct.pack_into("<d", block, 176, step)
+        struct.pack_into("<I", block, 256, supplementary)
+        blocks.append(bytes(block) + bytes(supplementary) + struct.pack(f"<{len(counts)}f", *counts))
+    return b"".join(blocks)
+
+
+class TestRawFile(unittest.TestCase):
+    def test_rigaku_raw(self):
+        """Test the vectorized decoder on the fixed-offset (Rigaku) layout."""
+        counts = [10.0, 20.5, 30.0, 40.25, 50.0]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "pattern.raw"
+            path.write_bytes(make_rigaku_raw(10.0, 12.0, counts))
+
+            (angles, intensities), content = load_raw(path)
+            np.testing.assert_allclose(angles, [10.0, 10.5, 11.0, 11.5, 12.0])
+            np.testing.assert_array_equal(intensities, counts)
+            self.assertEqual(content, path.read_bytes())
+            self.assertEqual(intensities.dtype, np.float64)
+
+    def test_bruker_raw_v3_multi_range(self):
+        """Test every range of a Bruker RAW v3 file is decoded."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "pattern.raw"
+            path.write_bytes(
+                make_bruker_raw_v3([(10.0, 0.02, [1.0, 2.0, 3.0], 0), (30.0, 0.5, [4.0, 5.0], 40)])
+            )
+
+            scans = RawFile.scans_from_file(path)
+            self.assertEqual(len(scans), 2)
+            np.testing.assert_allclose(scans[0].angles, [10.0, 10.02, 10.04])
+            np.testing.assert_array_equal(scans[0].intensities, [1.0, 2.0, 3.0])
+            np.testing.assert_allclose(scans[1].angles, [30.0, 30.5])
+            np.testing.assert_array_equal(scans[1].intensities, [4.0, 5.0])
+
+            np.testing.assert_array_equal(RawFile.from_file(path).intensities, [1.0, 2.0, 3.0])
+            np.testing.assert_array_equal(RawFile.from_file(path, scan=1).intensities, [4.0, 5.0])
+            with self.assertRaises(ValueError):
+                RawFile.from_file(path, scan=2)
+
+
+class TestPatternCache(unittest.TestCase):
+    def test_npz_round_trip(self):
+        """Test to_npz/from_npz keep the data and hash, with and without memory mapping."""
+        data = XYFile([10.0, 10.5, 11.0], [5.0, 6.0, 7.0], [1.0, 1.5, 2.0])
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "pattern.npz"
+            data.to_npz(path)
+
+            mapped = XYFile.from_npz(path)
+            self.assertIsInstance(mapped.intensities.base, np.memmap)
+            np.testing.assert_array_equal(mapped.angles, data.angles)
+            np.testing.assert_array_equal(mapped.intensities, data.intensities)
+            np.testing.assert_array_equal(mapped.errors, data.errors)
+            self.assertEqual(mapped.content_hash, data.content_hash)
+
+            loaded = XYFile.from_npz(path, mmap_mode=None)
+            self.assertEqual(loaded.content_hash, data.content_hash)
+            self.assertNotEqual(XYFile(data.angles, data.intensities).content_hash, data.content_hash)
+
+    def test_load_pattern_converts_once(self):
+        """Test a pattern is parsed once and served from the binary cache afterwards."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmpdir = Path(tmpdir)
+            cache_dir = tmpdir / "cache"
+            expected = XRDMLFile.from_file(XRDML_PATH)
+
+            first = load_pattern(XRDML_PATH, cache_dir=cache_dir)
+            self.assertEqual(len(list(cache_dir.glob("*.npz"))), 1)
+            self.assertEqual(first.content_hash, expected.content_hash)
+
+            copy = tmpdir / "copy.xrdml"
+            copy.write_bytes(XRDML_PATH.read_bytes())
+            second = load_pattern(copy, cache_dir=cache_dir)
+            self.assertEqual(len(list(cache_dir.glob("*.npz"))), 1)
+            np.testing.assert_array_equal(second.intensities, expected.intensities)
+
+            xy_path = tmpdir / "pattern.xy"
+            expected.to_xy_file(xy_path)
+            from_xy = XYFile.from_file(xy_path, cache_dir=cache_dir)
+            self.assertEqual(len(list(cache_dir.glob("*.npz"))), 2)
+            np.testing.assert_allclose(from_xy.intensities, expected.intensities)
+
+            with self.assertRaises(ValueError):
+                load_pattern(tmpdir / "pattern.csv", cache_dir=cache_dir)
+
+    def test_pattern_cache_eviction(self):
+        """Test the least recently used patterns are evicted beyond max_entries or max_bytes."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmpdir = Path(tmpdir)
+            cache_dir = tmpdir / "cache"
+            paths = []
+            for i in range(3):
+                paths.append(tmpdir / f"pattern_{i}.xy")
+                XYFile([10.0, 10.5, 11.0], [5.0, 6.0, float(i)]).to_xy_file(paths[-1])
+
+            load_pattern(paths[0], cache_dir=cache_dir, max_entries=2)
+            load_pattern(paths[1], cache_dir=cache_dir, max_entries=2)
+            first_cached = min(cache_dir.glob("*.npz"), key=lambda path: path.stat().st_mtime_ns)
+            os.utime(first_cached, ns=(0, 0))
+            # a hit makes the first pattern the most recently used
+            load_pattern(paths[0], cache_dir=cache_dir, max_entries=2)
+            load_pattern(paths[2], cache_dir=cache_dir, max_entries=2)
+            self.assertEqual(len(list(cache_dir.glob("*.npz"))), 2)
+            self.assertTrue(first_cached.exists())
+
+            size = first_cached.stat().st_size
+            load_pattern(paths[1], cache_dir=cache_dir, max_bytes=size)
+            self.assertEqual(len(list(cache_dir.glob("*.npz"))), 1)